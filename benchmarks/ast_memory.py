@@ -0,0 +1,50 @@
+"""Memory retained by the syntax tree, per node.
+
+Parses a synthetic program and reports the bytes still allocated once only
+the root of the tree is kept alive.
+
+    python -m benchmarks.ast_memory [functions]
+"""
+import gc
+import io
+import tracemalloc
+from sys import argv
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from benchmarks.node_ids import identifier
+
+FUNCTION = '''int {name}(int a, int b[]) {{
+    int i; int s;
+    i = 0; s = 0;
+    while (i < a) {{
+        if (b[i] >= s) s = s + b[i] * 2; else s = s - (b[i] / 3);
+        i = i + 1;
+    }}
+    return s;
+}}
+'''
+
+
+def synthetic_source(functions):
+    return ''.join(FUNCTION.format(name='fn' + identifier(i)) for i in range(functions))
+
+
+def run(functions=2000):
+    text = synthetic_source(functions)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    parser = Parser(Scanner(io.StringIO(text), verbose=False, engine='regex'))
+    root = parser.parse()
+    nodes = parser.nodeCount
+    del parser
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f'{nodes} nodes, {retained:,} bytes retained ({retained / nodes:.1f} bytes/node), source {len(text):,} chars.')
+    return root
+
+
+if __name__ == '__main__':
+    run(int(argv[1]) if len(argv) == 2 else 2000)
@@ -0,0 +1,70 @@
+"""Latency of incremental reparsing against parsing the whole file.
+
+The file is a run of similar functions. Each edit lands in the middle one:
+a digit changed inside an expression (the common keystroke), a newline
+inserted (which also moves every later declaration a line down) and the
+function renamed (a global name goes away and another appears, so scope
+checks of later declarations are reconsidered). Edits are undone before the
+next one, and the result is checked against a full parse at the end.
+Keystroke latency should stay flat as the file grows; the newline edit
+grows slowly, with the nodes whose line numbers move.
+
+    python -m benchmarks.incremental [max_functions]
+"""
+import io
+import time
+from sys import argv
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from compiler.incremental import IncrementalParse
+from benchmarks.ast_memory import synthetic_source
+
+EDITS = 50
+
+
+def full_parse(text):
+    parser = Parser(Scanner(io.StringIO(text), verbose=False), recover=True)
+    return parser.parse(), parser.nodeCount
+
+
+def time_edit(parse, offset, length, replacement):
+    # Best of EDITS edit-and-undo pairs, timing the edit only.
+    best = None
+    for _ in range(EDITS):
+        original = parse.text[offset:offset + length]
+        start = time.perf_counter()
+        parse.edit(offset, length, replacement)
+        elapsed = time.perf_counter() - start
+        parse.edit(offset, len(replacement), original)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(maxFunctions=3200):
+    print(f"""{'functions':>10}{'full ms':>10}{'digit ms':>10}{'newline ms':>12}{'rename ms':>11}""")
+    functions = 100
+    while functions <= maxFunctions:
+        text = synthetic_source(functions)
+        start = time.perf_counter()
+        full_parse(text)
+        full = time.perf_counter() - start
+        parse = IncrementalParse(text)
+        middle = text.index('int fn', len(text) // 2)
+        digit = text.index('* 2', middle) + 2
+        newline = text.index('\n', middle) + 1
+        name = middle + len('int ')
+        times = (
+            time_edit(parse, digit, 1, '7'),
+            time_edit(parse, newline, 0, '\n'),
+            time_edit(parse, name, 2, 'zz')
+        )
+        if parse.text != text or parse.nodeCount != full_parse(text)[1]:
+            raise AssertionError(f'incremental parse of {functions} functions differs')
+        print(f"""{functions:>10}{full * 1000:>10.2f}{times[0] * 1000:>10.3f}{times[1] * 1000:>12.3f}{times[2] * 1000:>11.3f}""")
+        functions *= 2
+    return None
+
+
+if __name__ == '__main__':
+    run(int(argv[1]) if len(argv) == 2 else 3200)
@@ -0,0 +1,265 @@
+"""Closure-compiled interpreter, bytecode VM and Python translation against a naive tree-walking evaluator.
+
+All of them run a correct selection sort (the examples/cms one only sorts by
+accident) of an n element global array, filled by input() with a seeded
+permutation and written back with output(). The walker dispatches on
+NodeKind at every node, keeps variables in dictionaries by name and returns
+with an exception, as a first interpreter would; the closure compiler does
+that work once, before the program runs, and so does the bytecode compiler.
+The Python translation turns the program into Python functions, compiled by
+CPython to its own bytecode; its time includes no translation.
+Every one must print the sorted array. For the VM the benchmark also counts
+the executed instructions (in a separate run) to report instructions/s.
+
+Selection sort takes about n * n / 2 comparisons, so n = 100000 means five
+billion loop iterations: hours for any Python interpreter. The default
+sizes keep a run under a minute.
+
+    python -m benchmarks.interpreter [--sizes 300 1000 ...] [--seed N] [--repeat N] [--no-walker]
+"""
+import argparse
+import random
+import time
+
+from compiler.globals import TokenType, NodeKind
+from compiler.cache import parse_source
+from compiler.interpreter import compile_program, ExecutionError
+from compiler.bytecode import compile_bytecode
+from compiler.vm import VM
+from compiler.translate import compile_python
+
+SORT = """
+int x[{size}];
+
+int minloc(int a[], int low, int high)
+{{  int i; int x; int k;
+    k = low;
+    x = a[low];
+    i = low + 1;
+    while (i < high)
+    {{  if (a[i] < x)
+        {{  x = a[i];
+            k = i; }}
+        i = i + 1;
+    }}
+    return k;
+}}
+
+void sort(int a[], int low, int high)
+{{  int i; int k;
+    i = low;
+    while (i < high - 1)
+    {{  int t;
+        k = minloc(a, i, high);
+        t = a[k];
+        a[k] = a[i];
+        a[i] = t;
+        i = i + 1;
+    }}
+}}
+
+void main(void)
+{{  int i;
+    i = 0;
+    while (i < {size})
+    {{  x[i] = input();
+        i = i + 1; }}
+    sort(x, 0, {size});
+    i = 0;
+    while (i < {size})
+    {{  output(x[i]);
+        i = i + 1; }}
+}}
+"""
+
+
+class Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class TreeWalker():
+
+    # Evaluates nodes as it meets them. A scope is a dictionary from names
+    # to values; functions are kept by name with their declaration node.
+
+    def __init__(self, root, inputs, write):
+        self.inputs = iter(inputs)
+        self.write = write
+        self.globals = {}
+        self.functions = {}
+        node = root
+        while node is not None:
+            if node.kind == NodeKind.FUN_DECLARATION:
+                self.functions[node.name] = node
+            elif node.size is not None:
+                self.globals[node.name] = [0] * node.size
+            else:
+                self.globals[node.name] = 0
+            node = node.sibling
+
+    def run(self):
+        return self.call('main', [])
+
+    def call(self, name, args):
+        if name == 'input':
+            return next(self.inputs)
+        if name == 'output':
+            self.write(args[0])
+            return 0
+        function = self.functions[name]
+        scopes = [{}]
+        body = None
+        for child in function.children:
+            if child.kind == NodeKind.PARAM_LIST:
+                params = [param for param in child.children if param.attribute != TokenType.VOID]
+                for param, value in zip(params, args):
+                    scopes[0][param.name] = value
+            else:
+                body = child
+        try:
+            self.statement(body, scopes)
+        except Return as result:
+            return result.value
+        return 0
+
+    def find(self, name, scopes):
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope
+        return self.globals
+
+    def statement(self, node, scopes):
+        while node is not None:
+            kind = node.kind
+            if kind == NodeKind.COMPOUND_STMT:
+                scopes.append({})
+                for child in node.children:
+                    if child is not None and child.kind == NodeKind.VAR_DECLARATION:
+                        declaration = child
+                        while declaration is not None:
+                            scopes[-1][declaration.name] = [] if declaration.size is not None else 0
+                            declaration = declaration.sibling
+                    else:
+                        self.statement(child, scopes)
+                scopes.pop()
+            elif kind == NodeKind.SELECTION_STMT:
+                if self.expression(node.children[0], scopes):
+                    self.statement(node.children[1], scopes)
+                elif len(node.children) > 2:
+                    self.statement(node.children[2], scopes)
+            elif kind == NodeKind.ITERATION_STMT:
+                while self.expression(node.children[0], scopes):
+                    self.statement(node.children[1], scopes)
+            elif kind == NodeKind.RETURN_STMT:
+                raise Return(self.expression(node.children[0], scopes) if node.children else 0)
+            else:
+                self.expression(node, scopes)
+            node = node.sibling
+        return None
+
+    def expression(self, node, scopes):
+        kind = node.kind
+        if kind == NodeKind.NUM:
+            return int(node.attribute)
+        if kind == NodeKind.ADDOP or kind == NodeKind.MULOP or kind == NodeKind.RELOP:
+            left = self.expression(node.children[0], scopes)
+            right = self.expression(node.children[1], scopes)
+            operator = node.attribute
+            if operator == TokenType.PLUS:
+                return left + right
+            if operator == TokenType.MINUS:
+                return left - right
+            if operator == TokenType.TIMES:
+                return left * right
+            if operator == TokenType.OVER:
+                if right == 0:
+                    raise ExecutionError(f"""ERROR: Runtime Error. Division by zero at line {node.lineno}.""")
+                quotient = abs(left) // abs(right)
+                return quotient if (left < 0) == (right < 0) else -quotient
+            if operator == TokenType.LT:
+                return int(left < right)
+            if operator == TokenType.LTEQ:
+                return int(left <= right)
+            if operator == TokenType.GT:
+                return int(left > right)
+            if operator == TokenType.GTEQ:
+                return int(left >= right)
+            if operator == TokenType.COMP:
+                return int(left == right)
+            return int(left != right)
+        if kind == NodeKind.ASSIGN:
+            value = self.expression(node.children[-1], scopes)
+            scope = self.find(node.name, scopes)
+            if len(node.children) == 2:
+                scope[node.name][self.expression(node.children[0], scopes)] = value
+            else:
+                scope[node.name] = value
+            return value
+        if kind == NodeKind.CALL or (node.name in self.functions or node.name in ('input', 'output')):
+            args = node.children[0].children if node.children else []
+            return self.call(node.name, [self.expression(arg, scopes) for arg in args])
+        value = self.find(node.name, scopes)[node.name]
+        if node.children:
+            return value[self.expression(node.children[0], scopes)]
+        return value
+
+
+def run_walker(root, inputs, write):
+    return TreeWalker(root, inputs, write).run()
+
+
+def measure(size, seed, repeat, walker=True):
+    root = parse_source(SORT.format(size=size).encode('utf-8')).root
+    values = list(range(size))
+    random.Random(seed).shuffle(values)
+    expected = sorted(values)
+    results = {}
+    program = compile_program(root)
+    vm = VM(compile_bytecode(root))
+    python = compile_python(root)
+    runners = [
+        ('closures', lambda write: program.run(values, write)),
+        ('vm', lambda write: vm.run(values, write)),
+        ('python', lambda write: python.run(values, write))
+    ]
+    if walker:
+        runners.append(('walker', lambda write: run_walker(root, values, write)))
+    for name, runner in runners:
+        best = None
+        for _ in range(repeat):
+            output = []
+            start = time.perf_counter()
+            runner(output.append)
+            elapsed = time.perf_counter() - start
+            if output != expected:
+                raise AssertionError(f'{name} did not sort {size} elements')
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best
+    results['instructions'] = vm.count(values, lambda value: None)
+    return results
+
+
+def run(sizes, seed=0, repeat=1, walker=True):
+    header = f"""{'n':>8}{'closures s':>12}{'vm s':>12}{'vm instr/s':>14}{'python s':>12}{'vs closures':>13}"""
+    if walker:
+        header += f"""{'walker s':>12}{'speedup':>10}"""
+    print(header)
+    for size in sizes:
+        results = measure(size, seed, repeat, walker)
+        line = f"""{size:>8}{results['closures']:>12.3f}{results['vm']:>12.3f}{results['instructions'] / results['vm']:>14,.0f}"""
+        line += f"""{results['python']:>12.3f}{results['closures'] / results['python']:>12.1f}x"""
+        if walker:
+            line += f"""{results['walker']:>12.3f}{results['walker'] / results['closures']:>9.1f}x"""
+        print(line)
+    return None
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.interpreter', description='Selection sort under each interpreter.')
+    argumentParser.add_argument('--sizes', type=int, nargs='+', default=[300, 1000, 3000], help='array lengths to sort')
+    argumentParser.add_argument('--seed', type=int, default=0, help='seed of the shuffled input')
+    argumentParser.add_argument('--repeat', type=int, default=1, help='runs per interpreter, the best one counts')
+    argumentParser.add_argument('--no-walker', action='store_true', help='skip the tree-walking evaluator')
+    options = argumentParser.parse_args()
+    run(options.sizes, options.seed, options.repeat, not options.no_walker)
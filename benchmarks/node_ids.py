@@ -0,0 +1,56 @@
+"""Regression benchmark for per-parse node numbering.
+
+Parses a synthetic program of about one million nodes, then parses it again
+in the same process and checks that numbering restarts at 1 and has no
+upper bound.
+
+    python -m benchmarks.node_ids [nodes]
+"""
+import io
+import time
+from sys import argv
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+
+TERMS_PER_FUNCTION = 50000
+
+
+def identifier(index):
+    # C-Minus identifiers are letters only.
+    name = ''
+    while True:
+        index, digit = divmod(index, 26)
+        name += chr(ord('a') + digit)
+        if index == 0:
+            return name
+
+
+def synthetic_source(nodes):
+    # Each function holds one long additive expression, which the parser
+    # builds iteratively, so the node count grows without deep recursion.
+    # Per function: FUN_DECLARATION, PARAM_LIST, PARAM, COMPOUND_STMT,
+    # RETURN_STMT, then 2 * terms - 1 VAR_REF/ADDOP nodes.
+    functions = max(1, -(-nodes // (2 * TERMS_PER_FUNCTION + 4)))
+    body = ' + '.join(['a'] * TERMS_PER_FUNCTION)
+    return '\n'.join(f'int f{identifier(i)}(int a) {{\n    return {body};\n}}' for i in range(functions))
+
+
+def parse(text):
+    parser = Parser(Scanner(io.StringIO(text), verbose=False, engine='regex'))
+    start = time.perf_counter()
+    root = parser.parse()
+    return parser, root, time.perf_counter() - start
+
+
+def run(nodes=10**6):
+    text = synthetic_source(nodes)
+    for attempt in (1, 2):
+        parser, root, elapsed = parse(text)
+        assert root.number == 1, f'Node numbering did not restart: root has ID {root.number}.'
+        print(f'Parse {attempt}: {parser.nodeCount} nodes in {elapsed:.2f}s ({parser.nodeCount / elapsed:,.0f} nodes/s).')
+    return None
+
+
+if __name__ == '__main__':
+    run(int(argv[1]) if len(argv) == 2 else 10**6)
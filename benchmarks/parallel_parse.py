@@ -0,0 +1,47 @@
+"""Serial parse against the process-pool parse of compiler.parallel.
+
+Parses one large generated program serially and then with a pool of each
+worker count, checking that every parallel parse created the same number
+of nodes. The pool is started before timing. Loading and linking the
+chunks' trees happens in the parent process and bounds the speedup; on a
+single CPU the pool is only overhead.
+
+    python -m benchmarks.parallel_parse [--functions N] [--workers 1 2 4 ...]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compiler.cache import parse_source
+from compiler.parallel import parse_parallel
+from benchmarks.workload import generate
+
+
+def run(functions=400, workerCounts=None, seed=0):
+    source = generate(seed=seed, functions=functions, statements=10, depth=3, globals_=40, expression=4).encode('utf-8')
+    start = time.perf_counter()
+    serial = parse_source(source)
+    elapsed = time.perf_counter() - start
+    print(f"""{len(source):,} bytes, {serial.nodeCount:,} nodes, {os.cpu_count()} CPUs""")
+    print(f"""{'workers':>8}{'seconds':>10}{'speedup':>10}""")
+    print(f"""{'serial':>8}{elapsed:>10.3f}{1:>9.2f}x""")
+    for workers in workerCounts or [2, 4]:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(abs, range(workers)))
+            start = time.perf_counter()
+            _, nodeCount = parse_parallel(source, workers=workers, executor=pool)
+            parallel = time.perf_counter() - start
+        if nodeCount != serial.nodeCount:
+            raise AssertionError(f'{workers} workers created {nodeCount} nodes, not {serial.nodeCount}')
+        print(f"""{workers:>8}{parallel:>10.3f}{elapsed / parallel:>9.2f}x""")
+    return None
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.parallel_parse', description='Serial and process-pool parses of one large program.')
+    argumentParser.add_argument('--functions', type=int, default=400, help='functions in the generated program')
+    argumentParser.add_argument('--workers', type=int, nargs='+', default=[2, 4], help='pool sizes to time')
+    argumentParser.add_argument('--seed', type=int, default=0)
+    options = argumentParser.parse_args()
+    run(options.functions, options.workers, options.seed)
@@ -0,0 +1,53 @@
+"""Serial scan against the process-pool scan of compiler.parallel_scan.
+
+Scans one large generated program with Scanner.scan_all and then with a
+pool of each worker count, checking that every parallel scan gave the same
+tokens, lines and columns. The pool is started before timing. Sending the
+chunks to the workers and merging their buffers happens in the parent
+process and bounds the speedup; on a single CPU the pool is only overhead.
+
+    python -m benchmarks.parallel_scan [--functions N] [--workers 1 2 4 ...]
+"""
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compiler.scanner import Scanner
+from compiler.parallel_scan import scan_parallel
+from benchmarks.workload import generate
+
+
+def same_tokens(buffer, other):
+    return (buffer.types, buffer.lines, buffer.columns) == (other.types, other.lines, other.columns) and \
+        [buffer.strings[lexeme] for lexeme in buffer.lexemes] == [other.strings[lexeme] for lexeme in other.lexemes]
+
+
+def run(functions=2000, workerCounts=None, seed=0):
+    text = generate(seed=seed, functions=functions, statements=10, depth=3, globals_=40, expression=4, comments=0.3)
+    start = time.perf_counter()
+    serial = Scanner(io.StringIO(text), verbose=False, engine='regex').scan_all()
+    elapsed = time.perf_counter() - start
+    print(f"""{len(text):,} chars, {len(serial):,} tokens, {os.cpu_count()} CPUs""")
+    print(f"""{'workers':>8}{'seconds':>10}{'speedup':>10}""")
+    print(f"""{'serial':>8}{elapsed:>10.3f}{1:>9.2f}x""")
+    for workers in workerCounts or [2, 4]:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(abs, range(workers)))
+            start = time.perf_counter()
+            buffer = scan_parallel(text, workers=workers, executor=pool)
+            parallel = time.perf_counter() - start
+        if not same_tokens(buffer, serial):
+            raise AssertionError(f'{workers} workers scanned other tokens')
+        print(f"""{workers:>8}{parallel:>10.3f}{elapsed / parallel:>9.2f}x""")
+    return None
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.parallel_scan', description='Serial and process-pool scans of one large program.')
+    argumentParser.add_argument('--functions', type=int, default=2000, help='functions in the generated program')
+    argumentParser.add_argument('--workers', type=int, nargs='+', default=[2, 4], help='pool sizes to time')
+    argumentParser.add_argument('--seed', type=int, default=0)
+    options = argumentParser.parse_args()
+    run(options.functions, options.workers, options.seed)
@@ -0,0 +1,65 @@
+"""Recursive descent Parser against the table-driven compiler.ll1 engine.
+
+Tokens/s of each engine over the benchmarks.suite workloads, parsing from
+already scanned tokens (a list of Token records for Parser, a TokenBuffer
+for the table engine, which reads tokens by index), with the trees of the
+timed parses compared. tests/test_parser_engines.py checks that both
+engines build the same trees and report the same errors.
+
+    python -m benchmarks.parser_engines [--repeat 3] [--workload NAME ...]
+"""
+import argparse
+import io
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from compiler.ll1 import TableParser
+from compiler.tokens import TokenBuffer
+from benchmarks.suite import WORKLOADS, best_time
+from benchmarks.workload import generate
+
+
+def fields(node):
+    return node.number, node.kind, node.attribute, node.name, node.lineno, node.size, len(node.children)
+
+
+def same_tree(root, other):
+    stack = [(root, other)]
+    while stack:
+        node, twin = stack.pop()
+        if node is None or twin is None:
+            if node is not twin:
+                return False
+            continue
+        if fields(node) != fields(twin):
+            return False
+        stack.append((node.sibling, twin.sibling))
+        stack.extend(zip(node.children, twin.children))
+    return True
+
+
+def parse(engine, tokens):
+    parser = engine(tokens)
+    parser.parse()
+    return parser
+
+
+def run(names=None, repeat=3):
+    print(f"""{'workload':<12}{'tokens':>9}{'descent tok/s':>15}{'table tok/s':>13}{'speedup':>9}""")
+    for name in names or list(WORKLOADS):
+        tokens = list(Scanner(io.StringIO(generate(**WORKLOADS[name])), verbose=False))
+        descent, parser = best_time(lambda: parse(Parser, tokens), repeat)
+        buffer = TokenBuffer.from_tokens(tokens)
+        table, tableParser = best_time(lambda: parse(TableParser, buffer), repeat)
+        if parser.nodeCount != tableParser.nodeCount or not same_tree(parser.root, tableParser.root):
+            raise AssertionError(f'The engines built different trees for {name}.')
+        print(f"""{name:<12}{len(tokens):>9,}{len(tokens) / descent:>15,.0f}{len(tokens) / table:>13,.0f}{descent / table:>8.2f}x""")
+    return None
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.parser_engines', description='Tokens/s of both parser engines.')
+    argumentParser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement, the best one counts')
+    argumentParser.add_argument('--workload', action='append', choices=list(WORKLOADS), help='time only this workload (repeatable)')
+    options = argumentParser.parse_args()
+    run(options.workload, options.repeat)
@@ -0,0 +1,38 @@
+"""Parse time against the number of global declarations.
+
+Every global is declared (and checked against the global scope) and then
+referenced from one function, so symbol lookups dominate. Time per global
+should stay flat as the count doubles.
+
+    python -m benchmarks.scope_scaling [max_globals]
+"""
+import io
+import time
+from sys import argv
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from benchmarks.node_ids import identifier
+
+
+def synthetic_source(globals_):
+    names = ['g' + identifier(i) for i in range(globals_)]
+    declarations = ''.join(f'int {name};\n' for name in names)
+    body = ' + '.join(names)
+    return f'{declarations}int main(void) {{\n    return {body};\n}}\n'
+
+
+def run(maxGlobals=32000):
+    count = 1000
+    while count <= maxGlobals:
+        parser = Parser(Scanner(io.StringIO(synthetic_source(count)), verbose=False, engine='regex'))
+        start = time.perf_counter()
+        parser.parse()
+        elapsed = time.perf_counter() - start
+        print(f'{count:>8} globals: {elapsed:.3f}s ({elapsed / count * 1e6:.1f} us/global)')
+        count *= 2
+    return None
+
+
+if __name__ == '__main__':
+    run(int(argv[1]) if len(argv) == 2 else 32000)
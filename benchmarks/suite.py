@@ -0,0 +1,167 @@
+"""Scanner, Parser and TreePrinter throughput and memory over generated workloads.
+
+Each workload is a program from benchmarks.workload with fixed settings. For
+every workload the suite reports tokens/s for both scanner engines, nodes/s
+for parsing (from already scanned tokens) and for printing the tree, and
+the peak traced memory of a whole scan, parse and print. Times are the best
+of several runs (at least MIN_SECONDS worth); memory is measured in a separate run, since tracemalloc
+slows everything down.
+
+Results are compared with saved baselines: a throughput more than the
+threshold below its baseline, or a peak more than the threshold above it,
+is a regression and makes the suite exit with status 1. Baselines depend on
+the machine; save new ones with --save before comparing changes.
+
+    python -m benchmarks.suite [--save] [--baseline FILE] [--threshold 0.15]
+        [--repeat 3] [--workload NAME ...]
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from compiler.print import TreePrinter
+from benchmarks.workload import generate
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+WORKLOADS = {
+    'small': dict(seed=1, functions=8, statements=8, depth=2, globals_=6, expression=3, comments=0.1),
+    'large': dict(seed=2, functions=60, statements=16, depth=3, globals_=40, expression=4, comments=0.1),
+    'deep': dict(seed=3, functions=12, statements=6, depth=40, globals_=6, expression=2, comments=0.05),
+    'globals': dict(seed=4, functions=10, statements=10, depth=2, globals_=4000, expression=3, comments=0.0),
+    'expressions': dict(seed=5, functions=30, statements=12, depth=2, globals_=20, expression=40, comments=0.0),
+    'comments': dict(seed=6, functions=40, statements=12, depth=3, globals_=20, expression=3, comments=0.9)
+}
+
+# Metric -> True when higher is better.
+METRICS = {
+    'scanFsmTokensPerSecond': True,
+    'scanRegexTokensPerSecond': True,
+    'parseNodesPerSecond': True,
+    'printNodesPerSecond': True,
+    'peakBytes': False
+}
+
+
+MIN_SECONDS = 0.5
+
+
+def best_time(function, repeat):
+    # Best of at least repeat runs, going on until MIN_SECONDS have been
+    # spent, with the garbage collector off as in timeit.
+    best = None
+    runs = total = 0
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while runs < repeat or total < MIN_SECONDS:
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+            runs += 1
+            total += elapsed
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        if enabled:
+            gc.enable()
+    return best, result
+
+
+def scan(text, engine):
+    return list(Scanner(io.StringIO(text), verbose=False, engine=engine))
+
+
+def parse(tokens):
+    parser = Parser(tokens)
+    parser.parse()
+    return parser
+
+
+def measure(text, repeat=3):
+    scanFsm, tokens = best_time(lambda: scan(text, 'fsm'), repeat)
+    scanRegex, tokens = best_time(lambda: scan(text, 'regex'), repeat)
+    parseTime, parser = best_time(lambda: parse(tokens), repeat)
+    printTime, _ = best_time(lambda: TreePrinter.write_tree(parser.root, io.StringIO()), repeat)
+    nodes = parser.nodeCount
+    del parser
+    tracemalloc.start()
+    root = parse(scan(text, 'regex')).root
+    TreePrinter.write_tree(root, io.StringIO())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'chars': len(text),
+        'tokens': len(tokens),
+        'nodes': nodes,
+        'scanFsmTokensPerSecond': len(tokens) / scanFsm,
+        'scanRegexTokensPerSecond': len(tokens) / scanRegex,
+        'parseNodesPerSecond': nodes / parseTime,
+        'printNodesPerSecond': nodes / printTime,
+        'peakBytes': peak
+    }
+
+
+def compare(results, baselines, threshold):
+    # Returns the report lines and the number of regressions.
+    lines = []
+    regressions = 0
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        lines.append(f"""{name}: {result['chars']:,} chars, {result['tokens']:,} tokens, {result['nodes']:,} nodes""")
+        if baseline is not None and (baseline['tokens'], baseline['nodes']) != (result['tokens'], result['nodes']):
+            lines.append('    workload differs from its baseline, not compared (save new baselines)')
+            baseline = None
+        for metric, higherIsBetter in METRICS.items():
+            value = result[metric]
+            text = f"""    {metric:<26}{value:>16,.0f}"""
+            if baseline is not None and baseline.get(metric):
+                ratio = value / baseline[metric]
+                regressed = ratio < 1 - threshold if higherIsBetter else ratio > 1 + threshold
+                regressions += regressed
+                text += f"""{ratio:>10.2f}x baseline{'  REGRESSION' if regressed else ''}"""
+            lines.append(text)
+    return lines, regressions
+
+
+def run(names=None, repeat=3, threshold=0.15, baselineFile=BASELINE, save=False):
+    names = names or list(WORKLOADS)
+    results = {name: measure(generate(**WORKLOADS[name]), repeat) for name in names}
+    baselines = {}
+    if os.path.exists(baselineFile):
+        with open(baselineFile, 'r') as file:
+            baselines = json.load(file)['workloads']
+    lines, regressions = compare(results, {} if save else baselines, threshold)
+    print('\n'.join(lines))
+    if save:
+        baselines.update(results)
+        with open(baselineFile, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'workloads': baselines
+            }, file, indent=2)
+            file.write('\n')
+        print(f'Baselines saved to {baselineFile}.')
+    elif regressions:
+        print(f'{regressions} regressions beyond {threshold:.0%}.')
+    return regressions
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.suite', description='Compiler throughput and memory benchmarks.')
+    argumentParser.add_argument('--workload', action='append', choices=list(WORKLOADS), help='run only this workload (repeatable)')
+    argumentParser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement, the best one counts')
+    argumentParser.add_argument('--threshold', type=float, default=0.15, help='allowed relative change before a regression')
+    argumentParser.add_argument('--baseline', default=BASELINE, help='baseline file')
+    argumentParser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    options = argumentParser.parse_args()
+    sys.exit(1 if run(options.workload, options.repeat, options.threshold, options.baseline, options.save) else 0)
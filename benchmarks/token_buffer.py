@@ -0,0 +1,71 @@
+"""Token records against the columnar compiler.tokens.TokenBuffer.
+
+For each benchmarks.suite workload, scans with the regex engine into a list
+of Token records and with Scanner.scan_all into a TokenBuffer, checks that
+both hold the same tokens, and reports tokens/s of the scan, of the scan
+followed by a parse (Parser over the list, the table engine over the
+buffer, which reads tokens by index), the memory the tokens take and their
+pickled size.
+
+    python -m benchmarks.token_buffer [--repeat 3] [--workload NAME ...]
+"""
+import argparse
+import io
+import pickle
+import tracemalloc
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser
+from compiler.ll1 import TableParser
+from benchmarks.suite import WORKLOADS, best_time
+from benchmarks.workload import generate
+
+
+def scan_list(text):
+    return list(Scanner(io.StringIO(text), verbose=False, engine='regex'))
+
+
+def scan_buffer(text):
+    return Scanner(io.StringIO(text), verbose=False, engine='regex').scan_all()
+
+
+def pipeline(text, scan, engine):
+    parser = engine(scan(text))
+    parser.parse()
+    return parser
+
+
+def traced_bytes(function, text):
+    tracemalloc.start()
+    result = function(text)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def run(names=None, repeat=3):
+    print(f"""{'workload':<12}{'tokens':>9}{'':>8}{'scan tok/s':>12}{'+parse tok/s':>14}{'bytes/token':>13}{'pickled':>11}""")
+    for name in names or list(WORKLOADS):
+        text = generate(**WORKLOADS[name])
+        tokens = scan_list(text)
+        buffer = scan_buffer(text)
+        if list(buffer) != tokens:
+            raise AssertionError(f'The buffer of {name} holds other tokens.')
+        count = len(tokens)
+        for label, scan, engine, result in (('list', scan_list, Parser, tokens), ('buffer', scan_buffer, TableParser, buffer)):
+            scanTime, _ = best_time(lambda: scan(text), repeat)
+            bothTime, _ = best_time(lambda: pipeline(text, scan, engine), repeat)
+            size = traced_bytes(scan, text)
+            pickled = len(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+            first = label == 'list'
+            print(f"""{name if first else '':<12}{f'{count:,}' if first else '':>9}{label:>8}{count / scanTime:>12,.0f}{count / bothTime:>14,.0f}{size / count:>13.1f}{pickled:>11,}""")
+    return None
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.token_buffer', description='Token records against the columnar token buffer.')
+    argumentParser.add_argument('--repeat', type=int, default=3, help='timed runs per measurement, the best one counts')
+    argumentParser.add_argument('--workload', action='append', choices=list(WORKLOADS), help='run only this workload (repeatable)')
+    options = argumentParser.parse_args()
+    run(options.workload, options.repeat)
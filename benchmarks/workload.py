@@ -0,0 +1,238 @@
+"""Seeded generator of valid C-Minus programs.
+
+The same seed and settings always give the same program. Programs parse
+and pass scope checking: every name is declared before use, functions only
+call functions defined before them, loops count a dedicated variable up to
+a small constant, divisors are non-zero constants and array elements are
+indexed with constants within bounds.
+
+    python -m benchmarks.workload [--seed N] [--functions N] [--statements N]
+        [--depth N] [--globals N] [--expression N] [--comments P]
+"""
+import argparse
+import random
+
+from benchmarks.node_ids import identifier
+
+WORDS = ('value', 'index', 'sum', 'loop', 'array', 'check', 'result', 'count', 'update', 'bound')
+ADDOPS = ('+', '-')
+MULOPS = ('*', '/')
+RELOPS = ('<', '<=', '>', '>=', '==', '!=')
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2}
+
+
+class Function():
+
+    def __init__(self, name, returnsInt, params):
+        self.name = name
+        self.returnsInt = returnsInt
+        # (name, isArray) pairs.
+        self.params = params
+
+
+class Generator():
+
+    def __init__(self, seed=0, functions=10, statements=10, depth=3, globals_=10, expression=3, comments=0.1):
+        self.random = random.Random(seed)
+        self.functionCount = max(1, functions)
+        self.statementCount = max(1, statements)
+        self.depth = max(0, depth)
+        self.globalCount = max(0, globals_)
+        self.expressionSize = max(0, expression)
+        self.commentDensity = comments
+        self.lines = []
+        self.globalScalars = []
+        # (name, length) pairs.
+        self.globalArrays = []
+        self.functions = []
+        self.scalars = []
+        self.targets = []
+        self.arrays = []
+        self.counters = []
+
+    def emit(self, indent, text):
+        self.lines.append('    ' * indent + text)
+        return None
+
+    def comment(self, indent):
+        if self.random.random() < self.commentDensity:
+            words = ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(2, 8)))
+            if self.random.random() < 0.2:
+                self.emit(indent, '/* ' + words)
+                self.emit(indent, '   ' + words + ' */')
+            else:
+                self.emit(indent, '/* ' + words + ' */')
+        return None
+
+    def number(self, low=0, high=99):
+        return str(self.random.randint(low, high))
+
+    def leaf(self, calls=True):
+        # A factor: a constant, a scalar, an array element, or (rarely) a call.
+        choice = self.random.random()
+        callable_ = [function for function in self.functions if function.returnsInt]
+        if calls and callable_ and choice < 0.05:
+            return ('call', self.call(self.random.choice(callable_)))
+        if self.arrays and choice < 0.25:
+            name, length = self.random.choice(self.arrays)
+            return ('leaf', f'{name}[{self.random.randrange(length)}]')
+        if self.scalars and choice < 0.75:
+            return ('leaf', self.random.choice(self.scalars))
+        return ('leaf', self.number())
+
+    def tree(self, size, calls=True):
+        # Random expression tree with size binary operators.
+        if size == 0:
+            return self.leaf(calls)
+        left = self.random.randint(0, size - 1)
+        operator = self.random.choice(ADDOPS + MULOPS)
+        if operator == '/':
+            # Right operand of a division is a non-zero constant.
+            return ('op', operator, self.tree(size - 1, calls), ('leaf', self.number(1, 9)))
+        return ('op', operator, self.tree(left, calls), self.tree(size - 1 - left, calls))
+
+    def render(self, node, parent=None, right=False):
+        if node[0] == 'leaf':
+            return node[1]
+        if node[0] == 'call':
+            # A call leading a longer expression ends the expression in the
+            # parser, so calls inside operators are parenthesized.
+            return node[1] if parent is None else f'({node[1]})'
+        _, operator, left, rightNode = node
+        text = f'{self.render(left, operator)} {operator} {self.render(rightNode, operator, True)}'
+        if parent is not None and (PRECEDENCE[operator] < PRECEDENCE.get(parent, 0) or (right and PRECEDENCE[operator] == PRECEDENCE.get(parent, 0))):
+            return f'({text})'
+        return text
+
+    def expression(self, calls=True):
+        return self.render(self.tree(self.random.randint(0, self.expressionSize), calls))
+
+    def condition(self):
+        left = self.render(self.tree(self.random.randint(0, self.expressionSize // 2)), 'relop')
+        right = self.render(self.tree(self.random.randint(0, self.expressionSize // 2)), 'relop')
+        return f'{left} {self.random.choice(RELOPS)} {right}'
+
+    def call(self, function):
+        args = []
+        for _, isArray in function.params:
+            if isArray:
+                args.append(self.random.choice(self.arrays)[0])
+            else:
+                args.append(self.render(self.tree(self.random.randint(0, 1), calls=False)))
+        return f'{function.name}({", ".join(args)})'
+
+    def target(self):
+        if self.arrays and self.random.random() < 0.3:
+            name, length = self.random.choice(self.arrays)
+            return f'{name}[{self.random.randrange(length)}]'
+        return self.random.choice(self.targets)
+
+    def statement(self, indent, depth, spine=False):
+        # A spine statement nests down to the maximum depth; other nested
+        # statements only appear at random, so that programs stay finite.
+        self.comment(indent)
+        choice = self.random.random() * (0.3 if spine and depth < self.depth else 1)
+        if depth < self.depth and choice < 0.15:
+            self.emit(indent, f'if ({self.condition()})')
+            self.block(indent, depth + 1, spine)
+            if self.random.random() < 0.5:
+                self.emit(indent, 'else')
+                self.block(indent, depth + 1)
+        elif depth < self.depth and choice < 0.3:
+            counter = self.counters[depth]
+            self.emit(indent, f'{counter} = 0;')
+            self.emit(indent, f'while ({counter} < {self.number(1, 4)})')
+            self.scalars.append(counter)
+            self.block(indent, depth + 1, spine, f'{counter} = {counter} + 1;')
+            self.scalars.pop()
+        elif choice < 0.38:
+            if self.functions and self.random.random() < 0.5:
+                self.emit(indent, self.call(self.random.choice(self.functions)) + ';')
+            else:
+                self.emit(indent, f'output({self.expression()});')
+        else:
+            self.emit(indent, f'{self.target()} = {self.expression()};')
+        return None
+
+    def block(self, indent, depth, spine=False, last=None):
+        self.emit(indent, '{')
+        count = self.random.randint(1, max(1, self.statementCount // 4))
+        spineAt = self.random.randrange(count) if spine else None
+        for i in range(count):
+            self.statement(indent + 1, depth, i == spineAt)
+        if last is not None:
+            self.emit(indent + 1, last)
+        self.emit(indent, '}')
+        return None
+
+    def function(self, index, main=False):
+        name = 'main' if main else 'fn' + identifier(index)
+        returnsInt = not main and self.random.random() < 0.7
+        params = []
+        if not main:
+            for i in range(self.random.randint(0, 3)):
+                params.append(('p' + identifier(i), bool(self.globalArrays) and self.random.random() < 0.25))
+        locals_ = ['l' + identifier(i) for i in range(self.random.randint(1, 4))]
+        counters = ['c' + identifier(i) for i in range(self.depth)]
+        self.comment(0)
+        header = ', '.join(f'int {param}[]' if isArray else f'int {param}' for param, isArray in params) or 'void'
+        self.emit(0, f'{"int" if returnsInt else "void"} {name}({header})')
+        self.emit(0, '{')
+        for local in locals_ + counters:
+            self.emit(1, f'int {local};')
+        scalarParams = [param for param, isArray in params if not isArray]
+        # Array parameters only ever receive global arrays, which have at least one element.
+        self.arrays = self.globalArrays + [(param, 1) for param, isArray in params if isArray]
+        self.targets = self.globalScalars + scalarParams + locals_
+        self.scalars = list(self.targets)
+        self.counters = counters
+        for local in locals_:
+            self.emit(1, f'{local} = {self.expression()};')
+        spineAt = self.random.randrange(self.statementCount)
+        for i in range(self.statementCount):
+            self.statement(1, 0, i == spineAt)
+        if returnsInt:
+            self.emit(1, f'return {self.expression()};')
+        self.emit(0, '}')
+        self.emit(0, '')
+        self.functions.append(Function(name, returnsInt, params))
+        return None
+
+    def program(self):
+        self.emit(0, f'/* Generated C-Minus program: {self.functionCount} functions, {self.globalCount} globals. */')
+        for i in range(self.globalCount):
+            name = 'g' + identifier(i)
+            self.comment(0)
+            if self.random.random() < 0.3:
+                length = self.random.randint(1, 16)
+                self.globalArrays.append((name, length))
+                self.emit(0, f'int {name}[{length}];')
+            else:
+                self.globalScalars.append(name)
+                self.emit(0, f'int {name};')
+        self.emit(0, '')
+        for i in range(self.functionCount - 1):
+            self.function(i)
+        self.function(self.functionCount - 1, main=True)
+        return '\n'.join(self.lines)
+
+
+def generate(seed=0, functions=10, statements=10, depth=3, globals_=10, expression=3, comments=0.1):
+    # functions counts main, which comes last; statements is the number of
+    # top-level statements per function; depth bounds if/while nesting;
+    # expression bounds the operators per expression; comments is the
+    # chance of a comment before each declaration and statement.
+    return Generator(seed, functions, statements, depth, globals_, expression, comments).program()
+
+
+if __name__ == '__main__':
+    argumentParser = argparse.ArgumentParser(prog='python -m benchmarks.workload', description='Print a generated C-Minus program.')
+    argumentParser.add_argument('--seed', type=int, default=0)
+    argumentParser.add_argument('--functions', type=int, default=10)
+    argumentParser.add_argument('--statements', type=int, default=10)
+    argumentParser.add_argument('--depth', type=int, default=3)
+    argumentParser.add_argument('--globals', type=int, default=10)
+    argumentParser.add_argument('--expression', type=int, default=3)
+    argumentParser.add_argument('--comments', type=float, default=0.1)
+    options = argumentParser.parse_args()
+    print(generate(options.seed, options.functions, options.statements, options.depth, options.globals, options.expression, options.comments))
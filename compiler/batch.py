@@ -0,0 +1,124 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .scanner import Scanner
+from .parser import Parser, ParseErrors
+from .print import TreePrinter
+
+
+def collect_sources(specs):
+    # Each spec is a .cm file, a directory (searched recursively for .cm
+    # files), a glob pattern, or @listfile naming one of those per line.
+    sources = []
+    for spec in specs:
+        if spec.startswith('@'):
+            with open(spec[1:], 'r') as listFile:
+                names = [line.strip() for line in listFile if line.strip()]
+            sources.extend(collect_sources(names))
+        elif os.path.isdir(spec):
+            sources.extend(sorted(glob.glob(os.path.join(spec, '**', '*.cm'), recursive=True)))
+        elif glob.has_magic(spec):
+            sources.extend(sorted(glob.glob(spec, recursive=True)))
+        else:
+            sources.append(spec)
+    unique = []
+    seen = set()
+    for source in sources:
+        if source not in seen:
+            seen.add(source)
+            unique.append(source)
+    return unique
+
+
+TRACE_SUFFIXES = {'text': '.trace', 'binary': '.btrace'}
+
+
+def output_root(sources):
+    # The deepest directory holding every source. Outputs under --out mirror
+    # each source's path below it, so equal file names in different
+    # directories do not overwrite each other.
+    return os.path.commonpath([os.path.dirname(os.path.abspath(source)) for source in sources])
+
+
+def output_names(source, outDir=None, traceMode='text', root=None):
+    if outDir is None:
+        base = os.path.splitext(source)[0]
+    elif root is None:
+        base = os.path.splitext(os.path.join(outDir, os.path.basename(source)))[0]
+    else:
+        base = os.path.splitext(os.path.join(outDir, os.path.relpath(os.path.abspath(source), root)))[0]
+    traceName = base + TRACE_SUFFIXES[traceMode] if traceMode in TRACE_SUFFIXES else None
+    return traceName, base + '.tree'
+
+
+def compile_file(job):
+    # Runs in a worker process. Never raises: failures are reported in the result.
+    source, outDir, engine, traceMode, root = job
+    traceName, treeName = output_names(source, outDir, traceMode, root)
+    result = {'source': source, 'nodes': 0, 'error': None}
+    start = time.perf_counter()
+    traceFile = None
+    try:
+        with open(source, 'r') as sourceFile:
+            if traceName is not None:
+                traceFile = open(traceName, 'wb' if traceMode == 'binary' else 'w')
+            scanner = Scanner(sourceFile=sourceFile, traceFile=traceFile, verbose=False, engine=engine, traceMode=traceMode)
+            parser = Parser(scanner, recover=True)
+            try:
+                parser.parse()
+            finally:
+                result['nodes'] = parser.nodeCount
+                scanner.flush()
+            if parser.diagnostics:
+                raise ParseErrors(parser.diagnostics)
+        TreePrinter.save_tree(parser.root, filename=treeName)
+    except Exception as exc:
+        result['error'] = str(exc) or type(exc).__name__
+    finally:
+        if traceFile is not None:
+            traceFile.close()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def compile_batch(sources, workers=None, outDir=None, engine='fsm', traceMode='text'):
+    root = None
+    if outDir is not None:
+        os.makedirs(outDir, exist_ok=True)
+        if sources:
+            root = output_root(sources)
+            for source in sources:
+                os.makedirs(os.path.dirname(output_names(source, outDir, traceMode, root)[1]), exist_ok=True)
+    jobs = [(source, outDir, engine, traceMode, root) for source in sources]
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [compile_file(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (4 * workers))
+            results = list(executor.map(compile_file, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+    return {
+        'files': len(results),
+        'failed': sum(1 for result in results if result['error'] is not None),
+        'nodes': sum(result['nodes'] for result in results),
+        'seconds': elapsed,
+        'filesPerSecond': len(results) / elapsed if elapsed > 0 else 0.0,
+        'results': results
+    }
+
+
+def format_summary(summary):
+    lines = []
+    for result in summary['results']:
+        if result['error'] is not None:
+            for error in result['error'].split('\n'):
+                lines.append(f"""{result['source']}: {error}""")
+    lines.append(
+        f"""Compiled {summary['files']} files ({summary['failed']} failed) in {summary['seconds']:.2f}s, """
+        f"""{summary['filesPerSecond']:.1f} files/s. Number of created nodes: {summary['nodes']}."""
+    )
+    return '\n'.join(lines)
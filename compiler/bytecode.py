@@ -0,0 +1,536 @@
+import struct
+from array import array
+from sys import argv, byteorder
+
+from .globals import TokenType, NodeKind
+from .util import dumps_strings, loads_strings, array_from
+from .interpreter import ExecutionError
+
+# Register bytecode for the VM in vm.py. Every function has a frame of
+# registers: its parameters first, then its locals, then temporaries. An
+# instruction is four int32 (opcode, a, b, c) in one array('i') for the
+# whole program; unused operands are 0.
+#
+# Global scalars and arrays share one flat memory, arrays as runs of cells.
+# An array value is the address of its first cell, and the VM checks every
+# index against the length recorded for that address. Local arrays are
+# declared without a length, so they all get EMPTY, address 0, which has no
+# cells; globals start at address 1.
+#
+# Bytecode file layout, all integers little-endian:
+#
+#   header     magic "CMBC", version (u16), flags (u16), instruction count,
+#              function count, array count, constant count, memory size,
+#              main function index (u32 each)
+#   code       instruction count * 4 int32
+#   lines      instruction count int32, the source line of each instruction
+#   functions  function count * (entry, parameters, registers) int32
+#   arrays     array count * (address, length) int32
+#   strings    string table (see util.dumps_strings): function names, then
+#              constants in decimal
+
+MAGIC = b'CMBC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIIIII')
+INT_MIN, INT_MAX = -(1 << 31), (1 << 31) - 1
+EMPTY = 0
+
+(
+    MOVE,       # r[a] = r[b]
+    LOADI,      # r[a] = b
+    LOADK,      # r[a] = constants[b]
+    GETG,       # r[a] = memory[b]
+    SETG,       # memory[a] = r[b]
+    GETE,       # r[a] = memory[r[b] + r[c]], checked
+    SETE,       # memory[r[a] + r[b]] = r[c], checked
+    ADD,        # r[a] = r[b] + r[c]
+    SUB,
+    MUL,
+    DIV,        # truncating toward zero
+    ADDI,       # r[a] = r[b] + c
+    LT,         # r[a] = 1 if r[b] < r[c] else 0
+    LTEQ,
+    GT,
+    GTEQ,
+    COMP,
+    DIFF,
+    JUMP,       # go to a
+    JUMPT,      # go to b if r[a] != 0
+    JUMPF,      # go to b if r[a] == 0
+    JLT,        # go to c if r[a] < r[b]
+    JLTEQ,
+    JGT,
+    JGTEQ,
+    JCOMP,
+    JDIFF,
+    CALL,       # r[a] = function b called with the registers from c on as arguments
+    RET,        # return r[a]
+    RET0,       # return 0
+    INPUT,      # r[a] = input()
+    OUTPUT      # output(r[a])
+) = range(32)
+
+OPCODES = (
+    'MOVE', 'LOADI', 'LOADK', 'GETG', 'SETG', 'GETE', 'SETE', 'ADD', 'SUB', 'MUL', 'DIV', 'ADDI',
+    'LT', 'LTEQ', 'GT', 'GTEQ', 'COMP', 'DIFF', 'JUMP', 'JUMPT', 'JUMPF',
+    'JLT', 'JLTEQ', 'JGT', 'JGTEQ', 'JCOMP', 'JDIFF', 'CALL', 'RET', 'RET0', 'INPUT', 'OUTPUT'
+)
+
+BINARY = {
+    TokenType.PLUS: ADD, TokenType.MINUS: SUB, TokenType.TIMES: MUL, TokenType.OVER: DIV,
+    TokenType.LT: LT, TokenType.LTEQ: LTEQ, TokenType.GT: GT,
+    TokenType.GTEQ: GTEQ, TokenType.COMP: COMP, TokenType.DIFF: DIFF
+}
+
+JUMPS = {
+    TokenType.LT: JLT, TokenType.LTEQ: JLTEQ, TokenType.GT: JGT,
+    TokenType.GTEQ: JGTEQ, TokenType.COMP: JCOMP, TokenType.DIFF: JDIFF
+}
+
+# Jumping when a comparison is false is jumping on the opposite comparison.
+NEGATED = {
+    TokenType.LT: TokenType.GTEQ, TokenType.LTEQ: TokenType.GT, TokenType.GT: TokenType.LTEQ,
+    TokenType.GTEQ: TokenType.LT, TokenType.COMP: TokenType.DIFF, TokenType.DIFF: TokenType.COMP
+}
+
+
+class BytecodeFormatError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class FunctionInfo():
+
+    def __init__(self, name, entry=0, params=0, registers=0):
+        self.name = name
+        self.entry = entry
+        self.params = params
+        self.registers = registers
+
+
+class Bytecode():
+
+    def __init__(self, code=None, lines=None, functions=None, arrays=None, constants=None, memorySize=EMPTY + 1, main=0):
+        self.code = array('i') if code is None else code
+        self.lines = array('i') if lines is None else lines
+        self.functions = [] if functions is None else functions
+        # (address, length) of every global array.
+        self.arrays = [] if arrays is None else arrays
+        self.constants = [] if constants is None else constants
+        self.memorySize = memorySize
+        self.main = main
+
+
+class Symbol():
+
+    def __init__(self, kind, index, isArray=False):
+        # kind is 'register', 'global', 'function' or 'builtin'; index is the
+        # register, memory address or function index.
+        self.kind = kind
+        self.index = index
+        self.isArray = isArray
+
+
+def siblings(node):
+    while node is not None:
+        yield node
+        node = node.sibling
+    return None
+
+
+class BytecodeCompiler():
+
+    def __init__(self):
+        self.program = Bytecode()
+        self.scopes = [{'input': Symbol('builtin', 0), 'output': Symbol('builtin', 1)}]
+        self.constantIds = {}
+        self.lineno = 0
+        # Next free register and the most used so far in the current function.
+        self.top = 0
+        self.registers = 0
+
+    def lookup(self, name, lineno):
+        for scope in reversed(self.scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        raise ExecutionError(f"""ERROR: Runtime Error. Symbol "{name}" at line {lineno} has not been declared.""")
+
+    def emit(self, op, a=0, b=0, c=0):
+        self.program.code.extend((op, a, b, c))
+        self.program.lines.append(self.lineno)
+        return len(self.program.lines) - 1
+
+    def here(self):
+        return len(self.program.lines)
+
+    def patch(self, instruction, operand, target):
+        # Points a jump emitted before its target was known to target.
+        self.program.code[4 * instruction + operand] = target
+        return None
+
+    def temp(self):
+        register = self.top
+        self.top += 1
+        self.registers = max(self.registers, self.top)
+        return register
+
+    def constant(self, value, target):
+        if INT_MIN <= value <= INT_MAX:
+            self.emit(LOADI, target, value)
+        else:
+            index = self.constantIds.setdefault(value, len(self.program.constants))
+            if index == len(self.program.constants):
+                self.program.constants.append(value)
+            self.emit(LOADK, target, index)
+        return None
+
+    def compile(self, root):
+        program = self.program
+        for node in siblings(root):
+            self.lineno = node.lineno
+            if node.kind == NodeKind.FUN_DECLARATION:
+                self.function(node)
+            elif node.size is not None:
+                self.scopes[0][node.name] = Symbol('global', program.memorySize, True)
+                program.arrays.append((program.memorySize, node.size))
+                program.memorySize += node.size
+            else:
+                self.scopes[0][node.name] = Symbol('global', program.memorySize)
+                program.memorySize += 1
+        for index, function in enumerate(program.functions):
+            if function.name == 'main':
+                program.main = index
+                return program
+        raise ExecutionError('ERROR: Runtime Error. The program has no main function.')
+
+    def function(self, node):
+        params = []
+        body = None
+        for child in node.children:
+            if child.kind == NodeKind.PARAM_LIST:
+                params = [param for param in child.children if param.attribute != TokenType.VOID]
+            elif child.kind == NodeKind.COMPOUND_STMT:
+                body = child
+        info = FunctionInfo(node.name, self.here(), len(params))
+        self.scopes[0][node.name] = Symbol('function', len(self.program.functions))
+        self.program.functions.append(info)
+        self.top = self.registers = 0
+        self.scopes.append({})
+        for param in params:
+            self.scopes[-1][param.name] = Symbol('register', self.temp(), param.size is not None)
+        self.compound(body, ownScope=False)
+        self.scopes.pop()
+        self.emit(RET0)
+        info.registers = self.registers
+        return None
+
+    # Statements
+
+    def compound(self, node, ownScope=True):
+        # Declared locals keep their registers for the rest of the function,
+        # so each one is 0 when the function is entered and is not shared
+        # with a later block, as in the other backends. Temporaries are
+        # allocated above them.
+        if ownScope:
+            self.scopes.append({})
+        for child in node.children:
+            if child is None:
+                continue
+            if child.kind == NodeKind.VAR_DECLARATION:
+                for declaration in siblings(child):
+                    register = self.temp()
+                    isArray = declaration.size is not None
+                    self.scopes[-1][declaration.name] = Symbol('register', register, isArray)
+                    if isArray:
+                        self.lineno = declaration.lineno
+                        self.emit(LOADI, register, EMPTY)
+            else:
+                for statement in siblings(child):
+                    self.statement(statement)
+        if ownScope:
+            self.scopes.pop()
+        return None
+
+    def statement(self, node):
+        if node is None:
+            return None
+        self.lineno = node.lineno
+        kind = node.kind
+        if kind == NodeKind.COMPOUND_STMT:
+            self.compound(node)
+        elif kind == NodeKind.SELECTION_STMT:
+            skip = self.branch(node.children[0], False)
+            self.statement(node.children[1])
+            if len(node.children) > 2 and node.children[2] is not None:
+                end = self.emit(JUMP)
+                self.patch_branch(skip, self.here())
+                self.statement(node.children[2])
+                self.patch(end, 1, self.here())
+            else:
+                self.patch_branch(skip, self.here())
+        elif kind == NodeKind.ITERATION_STMT:
+            # The condition is tested at the bottom: one jump per iteration.
+            test = self.emit(JUMP)
+            body = self.here()
+            self.statement(node.children[1])
+            self.patch(test, 1, self.here())
+            self.lineno = node.lineno
+            self.patch_branch(self.branch(node.children[0], True), body)
+        elif kind == NodeKind.RETURN_STMT:
+            if node.children:
+                top = self.top
+                self.emit(RET, self.operand(node.children[0]))
+                self.top = top
+            else:
+                self.emit(RET0)
+        else:
+            top = self.top
+            self.into(node, None)
+            self.top = top
+        return None
+
+    def branch(self, node, when):
+        # Emits a jump taken when node's truth equals when, with its target
+        # left to patch_branch.
+        top = self.top
+        if node.kind == NodeKind.RELOP:
+            operator = node.attribute if when else NEGATED[node.attribute]
+            left = self.operand(node.children[0])
+            right = self.operand(node.children[1])
+            instruction = self.emit(JUMPS[operator], left, right)
+        else:
+            instruction = self.emit(JUMPT if when else JUMPF, self.operand(node))
+        self.top = top
+        return instruction
+
+    def patch_branch(self, instruction, target):
+        op = self.program.code[4 * instruction]
+        return self.patch(instruction, 2 if op in (JUMPT, JUMPF) else 3, target)
+
+    # Expressions
+
+    def local(self, node):
+        # The register of a local variable read as a whole, or None.
+        if node.kind != NodeKind.VAR_REF or node.children:
+            return None
+        symbol = self.lookup(node.name, node.lineno)
+        return symbol.index if symbol.kind == 'register' else None
+
+    def operand(self, node):
+        # A register holding node's value: a local's own register, or a new
+        # temporary. Temporaries are freed by the caller restoring self.top.
+        register = self.local(node)
+        if register is not None:
+            return register
+        register = self.temp()
+        self.into(node, register)
+        return register
+
+    def into(self, node, target):
+        # Emits code leaving node's value in target, or dropping it when
+        # target is None.
+        kind = node.kind
+        if kind == NodeKind.NUM:
+            if target is not None:
+                self.constant(int(node.attribute), target)
+        elif kind == NodeKind.VAR_REF or kind == NodeKind.CALL:
+            self.reference(node, target)
+        elif kind == NodeKind.ASSIGN:
+            self.assign(node, target)
+        elif kind in (NodeKind.ADDOP, NodeKind.MULOP, NodeKind.RELOP):
+            self.binary(node, target)
+        else:
+            raise ExecutionError(f"""ERROR: Runtime Error. Unexpected {kind} at line {node.lineno}.""")
+        return None
+
+    def binary(self, node, target):
+        top = self.top
+        if target is None:
+            target = self.temp()
+        leftNode, rightNode = node.children
+        left = self.operand(leftNode)
+        if node.attribute in (TokenType.PLUS, TokenType.MINUS) and rightNode.kind == NodeKind.NUM:
+            value = int(rightNode.attribute)
+            value = value if node.attribute == TokenType.PLUS else -value
+            if INT_MIN <= value <= INT_MAX:
+                self.emit(ADDI, target, left, value)
+                self.top = top
+                return None
+        self.emit(BINARY[node.attribute], target, left, self.operand(rightNode))
+        self.top = top
+        return None
+
+    def array_base(self, symbol, target):
+        # The address of an array variable: a register, or a global's address.
+        if symbol.kind == 'register':
+            return symbol.index
+        register = self.temp() if target is None else target
+        self.emit(LOADI, register, symbol.index)
+        return register
+
+    def reference(self, node, target):
+        symbol = self.lookup(node.name, node.lineno)
+        if symbol.kind in ('function', 'builtin'):
+            # The parser makes a call without arguments inside an expression
+            # a plain VAR_REF, so calls are told apart by what the name is.
+            args = node.children[0].children if node.children else []
+            return self.call(symbol, node, args, target)
+        top = self.top
+        if node.children:
+            if target is None:
+                target = self.temp()
+            base = self.array_base(symbol, None)
+            self.emit(GETE, target, base, self.operand(node.children[0]))
+        elif target is None:
+            pass
+        elif symbol.kind == 'register':
+            if symbol.index != target:
+                self.emit(MOVE, target, symbol.index)
+        elif symbol.isArray:
+            self.array_base(symbol, target)
+        else:
+            self.emit(GETG, target, symbol.index)
+        self.top = top
+        return None
+
+    def assign(self, node, target):
+        # Scalar: one child, the value. Element: the index, then the value.
+        symbol = self.lookup(node.name, node.lineno)
+        if symbol.kind not in ('register', 'global'):
+            raise ExecutionError(f"""ERROR: Runtime Error. Cannot assign to "{node.name}" at line {node.lineno}.""")
+        top = self.top
+        if len(node.children) == 2:
+            base = self.array_base(symbol, None)
+            index = self.operand(node.children[0])
+            value = self.operand(node.children[1])
+            self.emit(SETE, base, index, value)
+        elif symbol.kind == 'register':
+            value = symbol.index
+            self.into(node.children[0], value)
+        else:
+            value = self.operand(node.children[0])
+            self.emit(SETG, symbol.index, value)
+        if target is not None and target != value:
+            self.emit(MOVE, target, value)
+        self.top = top
+        return None
+
+    def call(self, symbol, node, args, target):
+        top = self.top
+        if symbol.kind == 'builtin':
+            if symbol.index == 0:
+                self.emit(INPUT, self.temp() if target is None else target)
+            elif len(args) != 1:
+                raise ExecutionError(f"""ERROR: Runtime Error. output() takes one argument at line {node.lineno}.""")
+            else:
+                self.emit(OUTPUT, self.operand(args[0]))
+                if target is not None:
+                    self.emit(LOADI, target, 0)
+            self.top = top
+            return None
+        function = self.program.functions[symbol.index]
+        if len(args) != function.params:
+            raise ExecutionError(f"""ERROR: Runtime Error. Function "{function.name}" at line {node.lineno} takes {function.params} arguments, not {len(args)}.""")
+        # Arguments go to consecutive temporaries, copied into the callee's first registers.
+        first = self.top
+        for arg in args:
+            register = self.temp()
+            self.into(arg, register)
+            self.top = register + 1
+        self.emit(CALL, first if target is None else target, symbol.index, first)
+        self.top = top
+        return None
+
+
+def compile_bytecode(root) -> Bytecode:
+    return BytecodeCompiler().compile(root)
+
+
+def dumps_bytecode(program) -> bytes:
+    code, lines = array('i', program.code), array('i', program.lines)
+    functions = array('i', [value for info in program.functions for value in (info.entry, info.params, info.registers)])
+    arrays = array('i', [value for pair in program.arrays for value in pair])
+    if byteorder != 'little':
+        for values in (code, lines, functions, arrays):
+            values.byteswap()
+    strings = [info.name for info in program.functions] + [str(value) for value in program.constants]
+    return b''.join((
+        HEADER.pack(MAGIC, VERSION, 0, len(program.lines), len(program.functions), len(program.arrays),
+                    len(program.constants), program.memorySize, program.main),
+        code.tobytes(),
+        lines.tobytes(),
+        functions.tobytes(),
+        arrays.tobytes(),
+        dumps_strings(strings)
+    ))
+
+
+def loads_bytecode(data) -> Bytecode:
+    if len(data) < HEADER.size:
+        raise BytecodeFormatError('ERROR: Bytecode file is truncated.')
+    magic, version, _, count, functionCount, arrayCount, constantCount, memorySize, main = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BytecodeFormatError('ERROR: Not a bytecode file.')
+    if version != VERSION:
+        raise BytecodeFormatError(f"""ERROR: Unsupported bytecode version {version}.""")
+    stringCount = functionCount + constantCount
+    sizes = (16 * count, 4 * count, 12 * functionCount, 8 * arrayCount, 4 * (stringCount + 1))
+    if len(data) < HEADER.size + sum(sizes):
+        raise BytecodeFormatError('ERROR: Bytecode file is truncated.')
+    sections = []
+    offset = HEADER.size
+    for size in sizes:
+        sections.append(array_from('i', data[offset:offset + size]))
+        offset += size
+    code, lines, functions, arrays, offsets = sections
+    offset -= sizes[-1]
+    if len(data) < offset + sizes[-1] + offsets[-1]:
+        raise BytecodeFormatError('ERROR: Bytecode file is truncated.')
+    strings = loads_strings(data[offset:], stringCount)
+    return Bytecode(
+        code=code,
+        lines=lines,
+        functions=[FunctionInfo(strings[i], *functions[3 * i:3 * i + 3]) for i in range(functionCount)],
+        arrays=[(arrays[2 * i], arrays[2 * i + 1]) for i in range(arrayCount)],
+        constants=[int(text) for text in strings[functionCount:]],
+        memorySize=memorySize,
+        main=main
+    )
+
+
+def save_bytecode(program, filename):
+    with open(filename, 'wb') as file:
+        file.write(dumps_bytecode(program))
+    return None
+
+
+def load_bytecode(filename) -> Bytecode:
+    with open(filename, 'rb') as file:
+        return loads_bytecode(file.read())
+
+
+def disassemble(program) -> str:
+    entries = {info.entry: info.name for info in program.functions}
+    lines = []
+    for i in range(len(program.lines)):
+        if i in entries:
+            lines.append(f'{entries[i]}:')
+        op, a, b, c = program.code[4 * i:4 * i + 4]
+        lines.append(f"""{i:>6}  {OPCODES[op]:<7}{a:>6}{b:>6}{c:>6}    ; line {program.lines[i]}""")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # python -m compiler.bytecode input.cm [output.cmbc]
+    # Without an output file, prints the disassembly.
+    from .cache import parse_source
+    if len(argv) not in (2, 3):
+        print('Usage: python -m compiler.bytecode input.cm [output.cmbc]')
+    else:
+        with open(argv[1], 'rb') as sourceFile:
+            program = compile_bytecode(parse_source(sourceFile.read()).root)
+        if len(argv) == 2:
+            print(disassemble(program))
+        else:
+            save_bytecode(program, argv[2])
@@ -0,0 +1,149 @@
+import hashlib
+import io
+import os
+import struct
+from collections import OrderedDict
+
+from .globals import COMPILER_VERSION
+from .scanner import Scanner
+from .parser import Parser, ParseErrors
+from .serialize import VERSION, TOKENS_VERSION, dumps_tree, load_tree, dumps_tokens, loads_tokens
+
+# Entry file: magic "CMPC", node count (u32), token section size (u32), then
+# the binary token stream and the binary tree from serialize.
+ENTRY_MAGIC = b'CMPC'
+ENTRY_HEADER = struct.Struct('<4sII')
+ENTRY_SUFFIX = '.cmc'
+
+
+class CacheEntry():
+
+    def __init__(self, tokens, root, nodeCount):
+        self.tokens = tokens
+        self.root = root
+        self.nodeCount = nodeCount
+
+
+class ParseCache():
+
+    # On-disk cache of token streams and trees, keyed by a hash of the source
+    # bytes and the compiler version. Least recently used entries are evicted
+    # once the entries take more than maxBytes. Subclasses caching something
+    # else override suffix, key, get and put.
+
+    suffix = ENTRY_SUFFIX
+
+    def __init__(self, directory, maxBytes=256 * 2**20):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        # key -> entry size, least recently used first.
+        self.entries = OrderedDict()
+        self.size = 0
+        files = []
+        for filename in os.listdir(directory):
+            if filename.endswith(self.suffix):
+                stat = os.stat(os.path.join(directory, filename))
+                files.append((stat.st_mtime, filename[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.size += size
+        self.evict()
+
+    def key(self, source: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{COMPILER_VERSION}:{VERSION}:{TOKENS_VERSION}:'.encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, source: bytes):
+        key = self.key(source)
+        if key in self.entries:
+            try:
+                with open(self.path(key), 'rb') as file:
+                    data = file.read()
+                magic, nodeCount, tokensSize = ENTRY_HEADER.unpack_from(data)
+                if magic == ENTRY_MAGIC:
+                    body = memoryview(data)[ENTRY_HEADER.size:]
+                    entry = CacheEntry(loads_tokens(body[:tokensSize]), load_tree(body[tokensSize:]), nodeCount)
+                    self.entries.move_to_end(key)
+                    os.utime(self.path(key))
+                    self.hits += 1
+                    return entry
+            except Exception:
+                pass
+            self.remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, source: bytes, entry: CacheEntry):
+        tokensData = dumps_tokens(entry.tokens)
+        data = b''.join((ENTRY_HEADER.pack(ENTRY_MAGIC, entry.nodeCount, len(tokensData)), tokensData, dumps_tree(entry.root)))
+        return self.store(self.key(source), data)
+
+    def store(self, key, data: bytes):
+        # Writes an entry file atomically and evicts what no longer fits.
+        if len(data) > self.maxBytes:
+            return None
+        self.remove(key)
+        temporary = self.path(key) + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, self.path(key))
+        self.entries[key] = len(data)
+        self.size += len(data)
+        self.evict()
+        return None
+
+    def evict(self):
+        while self.size > self.maxBytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+        return None
+
+    def remove(self, key):
+        size = self.entries.pop(key, None)
+        if size is not None:
+            self.size -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+        return None
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.size
+        }
+
+
+def parse_source(source: bytes, cache=None, traceFile=None, engine='fsm', recover=False):
+    # Returns a CacheEntry. A cache hit never builds a Scanner or a Parser;
+    # on a miss, a successful parse is stored. Parse errors propagate: the
+    # first one, or with recover a ParseErrors holding all of them.
+    if cache is not None:
+        entry = cache.get(source)
+        if entry is not None:
+            return entry
+    scanner = Scanner(io.TextIOWrapper(io.BytesIO(source)), traceFile=traceFile, verbose=False, engine=engine, record=True)
+    parser = Parser(scanner, recover=recover)
+    try:
+        parser.parse()
+    finally:
+        scanner.flush()
+    if parser.diagnostics:
+        raise ParseErrors(parser.diagnostics)
+    entry = CacheEntry(scanner.tokens, parser.root, parser.nodeCount)
+    if cache is not None:
+        cache.put(source, entry)
+    return entry
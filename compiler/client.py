@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Thin client of compiler.server. It only imports the standard library
+# modules it needs, not the compiler, so that it starts fast; all requests
+# are sent before the first response is read.
+
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), f'cminus-{os.getuid()}.sock')
+
+
+class ServerError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(message)
+
+
+class Client():
+
+    def __init__(self, socketPath=SOCKET_PATH):
+        self.socketPath = socketPath
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.connection.connect(socketPath)
+        except OSError:
+            self.connection.close()
+            raise ServerError(f"""ERROR: No compile server at {socketPath}.""") from None
+        self.reader = self.connection.makefile('rb')
+        self.nextId = 0
+
+    def send(self, request):
+        # Sends a request and returns its id.
+        self.nextId += 1
+        request = dict(request, id=self.nextId)
+        self.connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        return self.nextId
+
+    def receive(self):
+        line = self.reader.readline()
+        if not line:
+            raise ServerError('ERROR: The compile server closed the connection.')
+        return json.loads(line)
+
+    def request(self, requests):
+        # Sends every request, then returns the responses in request order.
+        try:
+            ids = [self.send(request) for request in requests]
+            responses = {}
+            while len(responses) < len(ids):
+                response = self.receive()
+                responses[response['id']] = response
+        except OSError as exc:
+            raise ServerError(f"""ERROR: Lost the compile server: {exc.strerror or exc}.""") from None
+        return [responses[id] for id in ids]
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+        return None
+
+
+def start(args=None):
+    # python -m compiler.client [--socket PATH] [--tree] [--engine fsm|regex] [--stats] [--shutdown] [file.cm ...]
+    argumentParser = argparse.ArgumentParser(prog='python -m compiler.client', description='Compile cm files on a running compile server.')
+    argumentParser.add_argument('sources', nargs='*', help='cm files')
+    argumentParser.add_argument('--socket', default=SOCKET_PATH, help=f'socket path (default: {SOCKET_PATH})')
+    argumentParser.add_argument('--tree', action='store_true', help='print the syntax tree of each file')
+    argumentParser.add_argument('--engine', choices=('fsm', 'regex'), default='fsm', help='scanner engine')
+    argumentParser.add_argument('--stats', action='store_true', help="print the server's counters")
+    argumentParser.add_argument('--shutdown', action='store_true', help='stop the server')
+    options = argumentParser.parse_args(args)
+    requests = [{'op': 'compile', 'path': os.path.abspath(source), 'tree': options.tree, 'engine': options.engine} for source in options.sources]
+    if options.stats:
+        requests.append({'op': 'stats'})
+    if options.shutdown:
+        requests.append({'op': 'shutdown'})
+    failed = 0
+    try:
+        client = Client(options.socket)
+        try:
+            responses = client.request(requests)
+        finally:
+            client.close()
+    except ServerError as exc:
+        print(exc.message)
+        return 2
+    for request, response in zip(requests, responses):
+        if not response['ok']:
+            failed += 1
+            print(response['error'])
+        elif request['op'] == 'stats':
+            print(json.dumps(response['stats']))
+        elif request['op'] == 'compile':
+            source = os.path.relpath(request['path'])
+            for error in response['errors']:
+                print(f"""{source}: {error}""")
+            failed += bool(response['errors'])
+            if options.tree and 'tree' in response:
+                print(response['tree'], end='')
+            if not response['errors']:
+                print(f"""{source}: Number of created nodes: {response['nodes']}.""")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(start())
@@ -1,5 +1,10 @@
+from collections import namedtuple
 from enum import Enum
 
+# Part of every cache key: bump it whenever the scanner's or the parser's
+# output (tokens, trees, node IDs or diagnostics) changes.
+COMPILER_VERSION = '1.1'
+
 class TokenType(Enum):
     # reserved words
 
@@ -62,6 +67,17 @@ class NodeKind(Enum):
     VAR_REF = 17
 
 
+RESERVED_WORDS = {
+    'if': TokenType.IF,
+    'else': TokenType.ELSE,
+    'int': TokenType.INT,
+    'return': TokenType.RETURN,
+    'void': TokenType.VOID,
+    'while': TokenType.WHILE
+}
 
+RESERVED_TOKENS = frozenset(RESERVED_WORDS.values())
 
-
+# Immutable token record. line is the scanner's line once the token has been
+# read, column is the 1-based column of its first character.
+Token = namedtuple('Token', ('type', 'lexeme', 'line', 'column'))
@@ -0,0 +1,357 @@
+from bisect import bisect_left, bisect_right
+
+from .globals import TokenType
+from .scanner import Scanner
+from .parser import Parser, ParseErrors, TokenError
+from .scope import ScopeStack
+
+# Incremental parsing for editors. The source is split into segments, one
+# per top-level declaration the parser attempted: a segment runs from the
+# first token of its declaration up to the first token of the next one (the
+# first segment from offset 0, the last to the end of the text), so the
+# segments tile the text and every boundary is a token start. A segment
+# keeps its declaration node (None when the declaration could not be
+# parsed), its diagnostics, the names it looked up and the global names it
+# declared.
+#
+# An edit rescans and reparses from the first segment it touches, one
+# declaration at a time, until a declaration ends at an old boundary past
+# the edit: the text from there on is unchanged and so are its tokens, and
+# the old segments are reused. A reused segment is parsed again only when
+# its scope checks may now differ (a name it looks up was declared or
+# undeclared by the edit) or when it has diagnostics and the edit moved its
+# lines, since messages embed line numbers. Reused nodes keep their IDs;
+# new nodes get IDs past the largest one given so far.
+#
+# Offsets index the source text (for ASCII sources, the bytes). Moving
+# reused declarations down or up renumbers the lines of their nodes, the
+# one cost that grows with the rest of the file; edits that keep the
+# number of lines do not pay it.
+
+PREDEFINED = ('input', 'output')
+
+
+# Characters the scanner reads at a time: a reparse only reads as far as the
+# declarations it parses.
+BLOCK_SIZE = 4096
+
+
+class TextReader():
+
+    # File-like view of text from offset start on, without copying it.
+
+    def __init__(self, text, start):
+        self.text = text
+        self.position = start
+
+    def read(self, size=-1):
+        end = len(self.text) if size < 0 else self.position + size
+        block = self.text[self.position:end]
+        self.position += len(block)
+        return block
+
+
+class PrefixNames():
+
+    # The global names declared before offset limit: by a segment in
+    # declarers (name -> segments declaring it) starting before limit, or
+    # predefined. Asked name by name, so that nothing is copied per edit.
+
+    def __init__(self, declarers, limit):
+        self.declarers = declarers
+        self.limit = limit
+
+    def __contains__(self, name):
+        if name in PREDEFINED:
+            return True
+        return any(segment.start < self.limit for segment in self.declarers.get(name, ()))
+
+
+class PrefixScopeStack(ScopeStack):
+
+    # A ScopeStack whose global scope also holds the names in prefix.
+
+    def __init__(self, prefix):
+        super().__init__()
+        self.prefix = prefix
+
+    def check_symbol(self, symbol, currentScopeOnly=False):
+        if ScopeStack.check_symbol(self, symbol, currentScopeOnly):
+            return True
+        return (not currentScopeOnly or self.topIndex == 0) and symbol in self.prefix
+
+
+class Segment():
+
+    __slots__ = ('start', 'line', 'node', 'diagnostics', 'names', 'declared', 'nodes', 'failed')
+
+    def __init__(self, start, line, node, diagnostics, names, declared, nodes, failed):
+        self.start = start
+        self.line = line
+        self.node = node
+        self.diagnostics = diagnostics
+        self.names = names
+        self.declared = declared
+        self.nodes = nodes
+        # Whether the declaration raised and the parser skipped ahead.
+        self.failed = failed
+
+
+class SegmentParser(Parser):
+
+    # A recovering Parser that records the names each declaration looks up
+    # and declares globally, and parses one declaration at a time.
+
+    def __init__(self, scanner, prefix, resume=False):
+        super().__init__(scanner, recover=True)
+        self.scopeStack = PrefixScopeStack(prefix)
+        self.names = set()
+        self.declared = set()
+        # Diagnostics already given to a segment. Those reported while
+        # reading the first token go to the first segment.
+        self.assigned = 0
+        self.advance()
+        if resume:
+            # The previous declaration failed and the parser resumed here.
+            self.resumeToken = self.current
+
+    def declare_symbol(self, node, currentScopeOnly=False):
+        if self.scopeStack.topIndex == 0:
+            self.names.add(node.name)
+            self.declared.add(node.name)
+        return Parser.declare_symbol(self, node, currentScopeOnly)
+
+    def assert_symbol(self):
+        self.names.add(self.tokenStringBackup[0])
+        return Parser.assert_symbol(self)
+
+    def declaration_attempt(self, start, line):
+        # Parses the next top-level declaration as declaration_list does and
+        # returns its Segment.
+        self.names = set()
+        self.declared = set()
+        nodes = self.nodeCount
+        first = self.current
+        failed = False
+        try:
+            node = self.declaration()
+        except (SyntaxError, TokenError) as error:
+            self.synchronize_declaration(error, first)
+            node = None
+            failed = True
+        diagnostics = self.diagnostics[self.assigned:]
+        self.assigned = len(self.diagnostics)
+        return Segment(start, line, node, diagnostics, self.names, self.declared, self.nodeCount - nodes, failed)
+
+
+class IncrementalParse():
+
+    def __init__(self, text: str, engine='fsm'):
+        self.text = text
+        self.engine = engine
+        self.segments = []
+        self.nextNumber = 0
+        self.nodeCount = 0
+        self.root = None
+        # Name -> segments declaring it globally, and segments looking it up.
+        self.declarers = {}
+        self.users = {}
+        # Segments parsed by the last edit (or the first parse), for callers
+        # measuring how much work an edit took.
+        self.reparsed = 0
+        segments, _ = self.parse_from(0, 1, PrefixNames(self.declarers, 0), False, None)
+        self.splice(0, 0, segments)
+
+    # Parsing
+
+    def parse_from(self, start, line, prefix, resume, stop):
+        # Parses declarations from offset start (at line) of self.text, with
+        # prefix the global names declared before it. stop(offset, segment)
+        # is asked after each declaration whether the next one starting at
+        # offset can be reused; returns the new segments and the index stop
+        # returned, or None when parsing reached the end of the text.
+        scanner = Scanner(TextReader(self.text, start), verbose=False, engine=self.engine, blockSize=BLOCK_SIZE)
+        scanner.lineIndex = line
+        parser = SegmentParser(scanner, prefix, resume)
+        parser.nodeCount = self.nextNumber
+        # Offset of the first character of line anchorLine, to turn token
+        # lines and columns into offsets.
+        anchorLine, anchorOffset = line, start
+        segments = []
+        segmentStart, segmentLine = start, line
+        try:
+            while True:
+                segment = parser.declaration_attempt(segmentStart, segmentLine)
+                segments.append(segment)
+                self.reparsed += 1
+                if parser.token == TokenType.ENDOFFILE:
+                    return segments, None
+                token = parser.current
+                while anchorLine < token.line:
+                    anchorOffset = self.text.index('\n', anchorOffset) + 1
+                    anchorLine += 1
+                # Columns on the first scanned line count from start.
+                segmentStart = anchorOffset + token.column - 1
+                segmentLine = token.line
+                if stop is not None:
+                    index = stop(segmentStart, segment)
+                    if index is not None:
+                        return segments, index
+        finally:
+            self.nextNumber = parser.nodeCount
+
+    def parse_segment(self, index):
+        # Parses segment index again in place, with the same extent.
+        segment = self.segments[index]
+        prefix = PrefixNames(self.declarers, segment.start)
+        resume = index > 0 and self.segments[index - 1].failed
+        # The tokens are those parsed before, so the declaration ends at the
+        # same boundary: stop after it.
+        segments, _ = self.parse_from(segment.start, segment.line, prefix, resume, lambda offset, segment: index)
+        self.splice(index, index + 1, segments)
+        return None
+
+    # Edits
+
+    def edit(self, offset, length, replacement):
+        # Replaces length characters at offset with replacement and updates
+        # the tree. Returns the root.
+        if offset < 0 or length < 0 or offset + length > len(self.text):
+            raise ValueError(f"""Edit of {length} characters at {offset} is outside the text.""")
+        segments = self.segments
+        oldEnd = offset + length
+        newEnd = offset + len(replacement)
+        delta = len(replacement) - length
+        lineDelta = replacement.count('\n') - self.text.count('\n', offset, oldEnd)
+        self.text = self.text[:offset] + replacement + self.text[oldEnd:]
+        self.reparsed = 0
+        # Segments touching the edit, boundaries included: an insertion at
+        # a boundary may extend the token before it.
+        first = max(bisect_right(segments, offset, key=segment_start) - 1, 0)
+        if first > 0 and segments[first].start == offset:
+            first -= 1
+        # A declaration that failed skipped ahead up to the first token of
+        # the next one, which the edit may change.
+        if first > 0 and segments[first - 1].failed:
+            first -= 1
+        prefix = PrefixNames(self.declarers, segments[first].start)
+        resume = first > 0 and segments[first - 1].failed
+
+        def stop(position, segment):
+            # Until the splice, segments holds the old segments and offsets.
+            if position < newEnd:
+                return None
+            index = bisect_left(segments, position - delta, key=segment_start)
+            if index > first and index < len(segments) and segments[index].start == position - delta >= oldEnd:
+                if segments[index - 1].failed == segment.failed:
+                    return index
+            return None
+
+        parsed, reuse = self.parse_from(segments[first].start, segments[first].line, prefix, resume, stop)
+        if reuse is None:
+            reuse = len(segments)
+        oldNames = set().union(*(segment.declared for segment in segments[first:reuse]))
+        self.splice(first, reuse, parsed)
+        newNames = set().union(*(segment.declared for segment in parsed))
+        reused = first + len(parsed)
+        # Reused segments whose scope checks or messages may have changed:
+        # those looking up a name the edit declared or undeclared, and with
+        # lines moved, those with diagnostics.
+        stale = set()
+        for name in oldNames ^ newNames:
+            if name not in prefix:
+                stale.update(self.users.get(name, ()))
+        for segment in segments[reused:]:
+            segment.start += delta
+            if lineDelta:
+                segment.line += lineDelta
+                if segment.node is not None:
+                    shift_lines(segment.node, lineDelta)
+                if segment.diagnostics:
+                    stale.add(segment)
+        stale.difference_update(parsed)
+        for segment in sorted(stale, key=segment_start):
+            # Declarations before the edit do not see what it declares.
+            if segment.start > prefix.limit:
+                self.parse_segment(bisect_left(segments, segment.start, key=segment_start))
+        return self.root
+
+    def splice(self, low, high, segments):
+        # Replaces self.segments[low:high] with segments, updating the name
+        # indexes, and relinks the sibling chain around them.
+        for segment in self.segments[low:high]:
+            self.nodeCount -= segment.nodes
+            for name in segment.declared:
+                self.declarers[name].discard(segment)
+            for name in segment.names:
+                self.users[name].discard(segment)
+        for segment in segments:
+            self.nodeCount += segment.nodes
+            for name in segment.declared:
+                self.declarers.setdefault(name, set()).add(segment)
+            for name in segment.names:
+                self.users.setdefault(name, set()).add(segment)
+        self.segments[low:high] = segments
+        previous = None
+        index = low - 1
+        while index >= 0 and previous is None:
+            previous = self.segments[index].node
+            index -= 1
+        index = low
+        end = low + len(segments)
+        while index < len(self.segments):
+            node = self.segments[index].node
+            if node is not None:
+                if previous is None:
+                    self.root = node
+                else:
+                    previous.sibling = node
+                previous = node
+                if index >= end:
+                    break
+            index += 1
+        else:
+            if previous is None:
+                self.root = None
+            else:
+                previous.sibling = None
+        return None
+
+    # Results
+
+    @property
+    def diagnostics(self):
+        return [diagnostic for segment in self.segments for diagnostic in segment.diagnostics]
+
+    def declarations(self):
+        # Yields (start, end, node) for every top-level declaration node: the
+        # source range of its segment.
+        for index, segment in enumerate(self.segments):
+            if segment.node is not None:
+                end = self.segments[index + 1].start if index + 1 < len(self.segments) else len(self.text)
+                yield segment.start, end, segment.node
+        return None
+
+    def check(self):
+        # Raises ParseErrors with every diagnostic, as parse_source does.
+        diagnostics = self.diagnostics
+        if diagnostics:
+            raise ParseErrors(diagnostics)
+        return self.root
+
+
+def segment_start(segment):
+    return segment.start
+
+
+def shift_lines(node, delta):
+    # Moves a declaration's nodes delta lines, not following its sibling.
+    node.lineno += delta
+    stack = [child for child in node.children if child is not None]
+    while stack:
+        node = stack.pop()
+        node.lineno += delta
+        if node.sibling is not None:
+            stack.append(node.sibling)
+        stack.extend(child for child in node.children if child is not None)
+    return None
@@ -0,0 +1,655 @@
+import sys
+
+from .globals import TokenType, NodeKind
+
+# Runs a syntax tree by compiling it ahead of time into nested Python
+# closures. Every name is resolved to a slot while compiling: globals live in
+# one list for the whole run, locals and parameters in a list per call (a
+# frame). Each closure takes the current frame; expressions return their
+# value, statements return None to go on or the function's result once a
+# return statement ran. Nothing looks at a node's kind at run time.
+#
+# Integers are Python ints, arrays are lists passed by reference, and a
+# relational operator gives 1 or 0. Division truncates toward zero, as in C.
+
+
+class ExecutionError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class Function():
+
+    def __init__(self, name, params, lineno):
+        self.name = name
+        self.params = params
+        self.lineno = lineno
+        self.frameSize = 0
+        # Set once the function's body is compiled, so that calls compiled
+        # inside the body (recursion) find it at run time.
+        self.body = None
+
+
+class Variable():
+
+    def __init__(self, slot, isGlobal, size=None):
+        self.slot = slot
+        self.isGlobal = isGlobal
+        self.size = size
+
+
+class Builtin():
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Console():
+
+    # input() reads from read, output() calls write. By default, numbers
+    # are read from stdin one per line and written to stdout.
+
+    def __init__(self, inputs=None, write=None):
+        if inputs is None:
+            self.read = self.read_stdin
+        else:
+            values = iter(inputs)
+            self.read = lambda: next(values)
+        self.write = print if write is None else write
+
+    def read_stdin(self):
+        line = sys.stdin.readline()
+        if not line:
+            raise ExecutionError('ERROR: Runtime Error. input() reached the end of the input.')
+        try:
+            return int(line)
+        except ValueError:
+            raise ExecutionError(f"""ERROR: Runtime Error. input() read "{line.strip()}", which is not an integer.""")
+
+
+def index_error(name, index, lineno):
+    return ExecutionError(f"""ERROR: Runtime Error. Index {index} is out of the bounds of "{name}" at line {lineno}.""")
+
+
+def divide(a, b, lineno):
+    if b == 0:
+        raise ExecutionError(f"""ERROR: Runtime Error. Division by zero at line {lineno}.""")
+    quotient = a // b
+    if quotient < 0 and quotient * b != a:
+        quotient += 1
+    return quotient
+
+
+# Binary operators: one closure factory per operator and operand shape, so
+# a running operator is a single closure call with the operation inlined.
+
+def make_plus(left, right):
+    def plus(frame):
+        return left(frame) + right(frame)
+    return plus
+
+def make_plus_constant(left, constant):
+    def plus_constant(frame):
+        return left(frame) + constant
+    return plus_constant
+
+def make_plus_local_constant(slot, constant):
+    def plus_local_constant(frame):
+        return frame[slot] + constant
+    return plus_local_constant
+
+def make_minus(left, right):
+    def minus(frame):
+        return left(frame) - right(frame)
+    return minus
+
+def make_minus_constant(left, constant):
+    def minus_constant(frame):
+        return left(frame) - constant
+    return minus_constant
+
+def make_minus_local_constant(slot, constant):
+    def minus_local_constant(frame):
+        return frame[slot] - constant
+    return minus_local_constant
+
+def make_times(left, right):
+    def times(frame):
+        return left(frame) * right(frame)
+    return times
+
+def make_times_constant(left, constant):
+    def times_constant(frame):
+        return left(frame) * constant
+    return times_constant
+
+def make_times_local_constant(slot, constant):
+    def times_local_constant(frame):
+        return frame[slot] * constant
+    return times_local_constant
+
+def make_over(left, right, lineno):
+    def over(frame):
+        return divide(left(frame), right(frame), lineno)
+    return over
+
+def make_lt(left, right):
+    def lt(frame):
+        return left(frame) < right(frame)
+    return lt
+
+def make_lt_locals(left, right):
+    def lt_locals(frame):
+        return frame[left] < frame[right]
+    return lt_locals
+
+def make_lteq(left, right):
+    def lteq(frame):
+        return left(frame) <= right(frame)
+    return lteq
+
+def make_lteq_locals(left, right):
+    def lteq_locals(frame):
+        return frame[left] <= frame[right]
+    return lteq_locals
+
+def make_gt(left, right):
+    def gt(frame):
+        return left(frame) > right(frame)
+    return gt
+
+def make_gt_locals(left, right):
+    def gt_locals(frame):
+        return frame[left] > frame[right]
+    return gt_locals
+
+def make_gteq(left, right):
+    def gteq(frame):
+        return left(frame) >= right(frame)
+    return gteq
+
+def make_gteq_locals(left, right):
+    def gteq_locals(frame):
+        return frame[left] >= frame[right]
+    return gteq_locals
+
+def make_comp(left, right):
+    def comp(frame):
+        return left(frame) == right(frame)
+    return comp
+
+def make_comp_locals(left, right):
+    def comp_locals(frame):
+        return frame[left] == frame[right]
+    return comp_locals
+
+def make_diff(left, right):
+    def diff(frame):
+        return left(frame) != right(frame)
+    return diff
+
+def make_diff_locals(left, right):
+    def diff_locals(frame):
+        return frame[left] != frame[right]
+    return diff_locals
+
+# Operator -> factories for closure operands, a constant right operand and
+# a local scalar left operand with a constant right one.
+ARITHMETIC = {
+    TokenType.PLUS: (make_plus, make_plus_constant, make_plus_local_constant),
+    TokenType.MINUS: (make_minus, make_minus_constant, make_minus_local_constant),
+    TokenType.TIMES: (make_times, make_times_constant, make_times_local_constant)
+}
+
+# Operator -> factories for closure operands and for two local scalars.
+# These give a bool; as values they are turned into 1 or 0.
+RELATIONAL = {
+    TokenType.LT: (make_lt, make_lt_locals),
+    TokenType.LTEQ: (make_lteq, make_lteq_locals),
+    TokenType.GT: (make_gt, make_gt_locals),
+    TokenType.GTEQ: (make_gteq, make_gteq_locals),
+    TokenType.COMP: (make_comp, make_comp_locals),
+    TokenType.DIFF: (make_diff, make_diff_locals)
+}
+
+
+def as_integer(condition):
+    def integer(frame):
+        return 1 if condition(frame) else 0
+    return integer
+
+
+def siblings(node):
+    while node is not None:
+        yield node
+        node = node.sibling
+    return None
+
+
+class ClosureCompiler():
+
+    def __init__(self):
+        # Innermost scope last; each maps a name to a Variable, Function or Builtin.
+        self.scopes = [{'input': Builtin('input'), 'output': Builtin('output')}]
+        # Filled in by Program.run; closures keep a reference to the list.
+        self.globals = []
+        self.globalSize = 0
+        self.globalArrays = []
+        self.functions = {}
+        self.function = None
+        self.console = Console()
+
+    def lookup(self, name, lineno):
+        for scope in reversed(self.scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        raise ExecutionError(f"""ERROR: Runtime Error. Symbol "{name}" at line {lineno} has not been declared.""")
+
+    def declare(self, node):
+        # Globals and locals get the next free slot of their storage.
+        if self.function is None:
+            variable = Variable(self.globalSize, True, node.size)
+            self.globalSize += 1
+            if node.size is not None:
+                self.globalArrays.append((variable.slot, node.size))
+        else:
+            variable = Variable(self.function.frameSize, False, node.size)
+            self.function.frameSize += 1
+        self.scopes[-1][node.name] = variable
+        return variable
+
+    def compile(self, root):
+        for node in siblings(root):
+            if node.kind == NodeKind.FUN_DECLARATION:
+                self.compile_function(node)
+            else:
+                self.declare(node)
+        main = self.functions.get('main')
+        if main is None:
+            raise ExecutionError('ERROR: Runtime Error. The program has no main function.')
+        return Program(self, main)
+
+    def compile_function(self, node):
+        params = []
+        body = None
+        for child in node.children:
+            if child.kind == NodeKind.PARAM_LIST:
+                params = [param for param in child.children if param.attribute != TokenType.VOID]
+            elif child.kind == NodeKind.COMPOUND_STMT:
+                body = child
+        function = Function(node.name, len(params), node.lineno)
+        self.scopes[-1][node.name] = function
+        self.functions[node.name] = function
+        self.function = function
+        self.scopes.append({})
+        for param in params:
+            # Array parameters hold the caller's list; nothing to allocate.
+            self.declare(param)
+        statements = self.compound(body, ownScope=False)
+        self.scopes.pop()
+        self.function = None
+        function.body = self.sequence(statements)
+        return function
+
+    # Statements
+
+    def compound(self, node, ownScope=True):
+        # Closures for the statements of a compound statement, starting with
+        # the allocation of its local arrays.
+        statements = []
+        if ownScope:
+            self.scopes.append({})
+        for child in node.children:
+            if child is None:
+                continue
+            if child.kind == NodeKind.VAR_DECLARATION:
+                for declaration in siblings(child):
+                    variable = self.declare(declaration)
+                    if variable.size is not None:
+                        statements.append(self.allocate(variable.slot, variable.size))
+            else:
+                for statement in siblings(child):
+                    statements.extend(self.statement(statement))
+        if ownScope:
+            self.scopes.pop()
+        return statements
+
+    def allocate(self, slot, size):
+        def allocate(frame):
+            frame[slot] = [0] * size
+        return allocate
+
+    def sequence(self, statements):
+        statements = tuple(statements)
+        if len(statements) == 1:
+            return statements[0]
+        def sequence(frame):
+            for statement in statements:
+                result = statement(frame)
+                if result is not None:
+                    return result
+            return None
+        return sequence
+
+    def statement(self, node):
+        # A list of closures: compound statements are flattened into the
+        # enclosing list, and empty statements disappear.
+        if node is None:
+            return []
+        kind = node.kind
+        if kind == NodeKind.COMPOUND_STMT:
+            return self.compound(node)
+        if kind == NodeKind.SELECTION_STMT:
+            return [self.selection(node)]
+        if kind == NodeKind.ITERATION_STMT:
+            return [self.iteration(node)]
+        if kind == NodeKind.RETURN_STMT:
+            return [self.return_statement(node)]
+        return [self.expression_statement(node)]
+
+    def selection(self, node):
+        condition = self.condition(node.children[0])
+        then = self.statement(node.children[1])
+        then = self.sequence(then) if then else None
+        other = self.statement(node.children[2]) if len(node.children) > 2 else []
+        other = self.sequence(other) if other else None
+        if other is None:
+            if then is None:
+                def selection(frame):
+                    condition(frame)
+                    return None
+            else:
+                def selection(frame):
+                    if condition(frame):
+                        return then(frame)
+                    return None
+        elif then is None:
+            def selection(frame):
+                if not condition(frame):
+                    return other(frame)
+                return None
+        else:
+            def selection(frame):
+                if condition(frame):
+                    return then(frame)
+                return other(frame)
+        return selection
+
+    def iteration(self, node):
+        condition = self.condition(node.children[0])
+        # The loop runs the body's statements itself, without a sequence closure.
+        statements = tuple(self.statement(node.children[1]))
+        if not statements:
+            def iteration(frame):
+                while condition(frame):
+                    pass
+                return None
+        elif len(statements) == 1:
+            body = statements[0]
+            def iteration(frame):
+                while condition(frame):
+                    result = body(frame)
+                    if result is not None:
+                        return result
+                return None
+        else:
+            def iteration(frame):
+                while condition(frame):
+                    for statement in statements:
+                        result = statement(frame)
+                        if result is not None:
+                            return result
+                return None
+        return iteration
+
+    def return_statement(self, node):
+        if not node.children:
+            def return_void(frame):
+                return 0
+            return return_void
+        value = self.expression(node.children[0])
+        return value
+
+    def expression_statement(self, node):
+        # Statement closures must return None, so expressions are wrapped;
+        # assignments, the usual case, are compiled as stores instead.
+        if node.kind == NodeKind.ASSIGN:
+            return self.assign(node, statement=True)
+        value = self.expression(node)
+        def expression_statement(frame):
+            value(frame)
+            return None
+        return expression_statement
+
+    # Expressions
+
+    def condition(self, node):
+        # Conditions may give a bool instead of 1 or 0.
+        if node.kind == NodeKind.RELOP:
+            return self.relop(node)
+        return self.expression(node)
+
+    def expression(self, node):
+        kind = node.kind
+        if kind == NodeKind.NUM:
+            return self.constant(int(node.attribute))
+        if kind == NodeKind.VAR_REF or kind == NodeKind.CALL:
+            return self.reference(node)
+        if kind == NodeKind.ASSIGN:
+            return self.assign(node)
+        if kind == NodeKind.RELOP:
+            return as_integer(self.relop(node))
+        if kind == NodeKind.ADDOP or kind == NodeKind.MULOP:
+            return self.arithmetic(node)
+        raise ExecutionError(f"""ERROR: Runtime Error. Unexpected {kind} at line {node.lineno}.""")
+
+    def constant(self, value):
+        def constant(frame):
+            return value
+        return constant
+
+    def arithmetic(self, node):
+        leftNode, rightNode = node.children
+        left = self.expression(leftNode)
+        if node.attribute == TokenType.OVER:
+            return make_over(left, self.expression(rightNode), node.lineno)
+        general, withConstant, localWithConstant = ARITHMETIC[node.attribute]
+        if rightNode.kind == NodeKind.NUM:
+            slot = self.local_slot(leftNode)
+            if slot is not None:
+                return localWithConstant(slot, int(rightNode.attribute))
+            return withConstant(left, int(rightNode.attribute))
+        return general(left, self.expression(rightNode))
+
+    def relop(self, node):
+        leftNode, rightNode = node.children
+        general, locals_ = RELATIONAL[node.attribute]
+        leftSlot, rightSlot = self.local_slot(leftNode), self.local_slot(rightNode)
+        if leftSlot is not None and rightSlot is not None:
+            return locals_(leftSlot, rightSlot)
+        return general(self.expression(leftNode), self.expression(rightNode))
+
+    def local_slot(self, node):
+        # The frame slot of a local scalar read, or None for anything else.
+        if node.kind != NodeKind.VAR_REF or node.children:
+            return None
+        symbol = self.lookup(node.name, node.lineno)
+        if isinstance(symbol, Variable) and not symbol.isGlobal:
+            return symbol.slot
+        return None
+
+    def reference(self, node):
+        symbol = self.lookup(node.name, node.lineno)
+        if not isinstance(symbol, Variable):
+            # The parser makes a call without arguments inside an expression
+            # a plain VAR_REF, so calls are told apart by what the name is.
+            args = node.children[0].children if node.children else []
+            return self.call(symbol, args, node.lineno)
+        slot = symbol.slot
+        if node.children:
+            return self.element(symbol, node.name, self.expression(node.children[0]), node.lineno)
+        if symbol.isGlobal:
+            storage = self.globals
+            def load_global(frame):
+                return storage[slot]
+            return load_global
+        def load_local(frame):
+            return frame[slot]
+        return load_local
+
+    def element(self, symbol, name, index, lineno):
+        # A negative position would count from the end of the list, so it
+        # takes the same path as one past the end.
+        slot = symbol.slot
+        if symbol.isGlobal:
+            storage = self.globals
+            def global_element(frame):
+                position = index(frame)
+                try:
+                    if position < 0:
+                        raise IndexError
+                    return storage[slot][position]
+                except (IndexError, TypeError):
+                    raise index_error(name, position, lineno) from None
+            return global_element
+        def local_element(frame):
+            position = index(frame)
+            try:
+                if position < 0:
+                    raise IndexError
+                return frame[slot][position]
+            except (IndexError, TypeError):
+                raise index_error(name, position, lineno) from None
+        return local_element
+
+    def assign(self, node, statement=False):
+        # Scalar: one child, the value. Element: the index, then the value.
+        symbol = self.lookup(node.name, node.lineno)
+        if not isinstance(symbol, Variable):
+            raise ExecutionError(f"""ERROR: Runtime Error. Cannot assign to "{node.name}" at line {node.lineno}.""")
+        slot = symbol.slot
+        value = self.expression(node.children[-1])
+        if len(node.children) == 2:
+            index = self.expression(node.children[0])
+            name, lineno = node.name, node.lineno
+            if symbol.isGlobal:
+                storage = self.globals
+                def store_global_element(frame):
+                    position = index(frame)
+                    result = value(frame)
+                    try:
+                        if position < 0:
+                            raise IndexError
+                        storage[slot][position] = result
+                    except (IndexError, TypeError):
+                        raise index_error(name, position, lineno) from None
+                    return None if statement else result
+                return store_global_element
+            def store_local_element(frame):
+                position = index(frame)
+                result = value(frame)
+                try:
+                    if position < 0:
+                        raise IndexError
+                    frame[slot][position] = result
+                except (IndexError, TypeError):
+                    raise index_error(name, position, lineno) from None
+                return None if statement else result
+            return store_local_element
+        if symbol.isGlobal:
+            storage = self.globals
+            if statement:
+                def store_global_statement(frame):
+                    storage[slot] = value(frame)
+                return store_global_statement
+            def store_global(frame):
+                storage[slot] = result = value(frame)
+                return result
+            return store_global
+        if statement:
+            def store_local_statement(frame):
+                frame[slot] = value(frame)
+            return store_local_statement
+        def store_local(frame):
+            frame[slot] = result = value(frame)
+            return result
+        return store_local
+
+    def call(self, symbol, argNodes, lineno):
+        args = tuple(self.expression(arg) for arg in argNodes)
+        console = self.console
+        if isinstance(symbol, Builtin):
+            if symbol.name == 'input':
+                def call_input(frame):
+                    return console.read()
+                return call_input
+            if len(args) != 1:
+                raise ExecutionError(f"""ERROR: Runtime Error. output() takes one argument at line {lineno}.""")
+            value = args[0]
+            def call_output(frame):
+                console.write(value(frame))
+                return 0
+            return call_output
+        function = symbol
+        if len(args) != function.params:
+            raise ExecutionError(f"""ERROR: Runtime Error. Function "{function.name}" at line {lineno} takes {function.params} arguments, not {len(args)}.""")
+        # The frame size is only known once the callee is compiled, which
+        # for a recursive call is after this call.
+        if not args:
+            def call_none(frame):
+                result = function.body([0] * function.frameSize)
+                return 0 if result is None else result
+            return call_none
+        if len(args) == 1:
+            first, = args
+            def call_one(frame):
+                callee = [0] * function.frameSize
+                callee[0] = first(frame)
+                result = function.body(callee)
+                return 0 if result is None else result
+            return call_one
+        def call_many(frame):
+            callee = [0] * function.frameSize
+            callee[:len(args)] = [arg(frame) for arg in args]
+            result = function.body(callee)
+            return 0 if result is None else result
+        return call_many
+
+
+class Program():
+
+    def __init__(self, compiler, main):
+        self.compiler = compiler
+        self.main = main
+
+    def run(self, inputs=None, write=None, recursionLimit=20000):
+        # inputs: numbers for input() (default: stdin); write: called with
+        # every output() value (default: print). Returns main's result.
+        compiler = self.compiler
+        storage = compiler.globals
+        storage[:] = [0] * compiler.globalSize
+        for slot, size in compiler.globalArrays:
+            storage[slot] = [0] * size
+        console = Console(inputs, write)
+        compiler.console.read, compiler.console.write = console.read, console.write
+        previousLimit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previousLimit, recursionLimit))
+        try:
+            result = self.main.body([0] * self.main.frameSize)
+        except RecursionError:
+            raise ExecutionError('ERROR: Runtime Error. Too many nested calls.') from None
+        except StopIteration:
+            raise ExecutionError('ERROR: Runtime Error. input() reached the end of the input.') from None
+        finally:
+            sys.setrecursionlimit(previousLimit)
+        return 0 if result is None else result
+
+
+def compile_program(root):
+    # Compiles the tree once; the Program can then be run any number of times.
+    return ClosureCompiler().compile(root)
+
+
+def run_program(root, inputs=None, write=None):
+    return compile_program(root).run(inputs, write)
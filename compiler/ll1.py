@@ -0,0 +1,515 @@
+import sys
+
+from .globals import TokenType, NodeKind, RESERVED_TOKENS
+from .scanner import Scanner
+from .parser import Parser, TreeNode, TokenError
+from .tokens import TokenBuffer
+from .print import TreePrinter
+
+# A table-driven LL(1) engine for the same language as Parser. The grammar
+# below is read once, its FIRST and FOLLOW sets are computed and compiled
+# into a parse table of integer symbols: terminals are TokenType values,
+# then come nonterminals, then semantic actions. TableParser runs the table
+# with an explicit stack; the actions build the tree with Parser's own
+# new_node, scope checks and quirks, so nodes, IDs, lines and error messages
+# are those of Parser without recover.
+#
+# Notation: one rule per line (a line starting with | continues the one
+# above), UPPERCASE names are TokenTypes, @names are actions, ε is the empty
+# sequence. An alternative marked ! is the default: it takes every token no
+# other alternative takes, as the recursive descent's final else does, and
+# the error is left to the next terminal not matching. A rule with a single
+# alternative always takes it. Without a default, a token no alternative
+# takes is a syntax error; of the rules without one, only factor can be
+# reached with such a token, as in Parser.
+GRAMMAR_TEXT = '''
+program            → @list declaration @append declarations @root
+declarations       → ε | !declaration @append declarations
+declaration        → @declaration type ID @declare declaration_tail
+type               → INT @attribute | VOID @attribute | !ε
+declaration_tail   → SEMI @var_declaration
+                   | LBRACKETS NUM @size RBRACKETS SEMI @var_declaration
+                   | LPAREN params RPAREN compound_stmt @child @fun_declaration
+                   | !ε
+params             → @param_list @param typed_param @promise more_params @child | !ε
+more_params        → COMMA @param param_body @promise more_params | !ε
+param_body         → typed_param | !ID @param_name brackets
+typed_param        → VOID @attribute | INT @attribute ID @param_name brackets
+brackets           → LBRACKETS RBRACKETS @empty_size | !ε
+compound_stmt      → @compound LCBRACES local_declarations @list statements @chain RCBRACES @close
+local_declarations → @list local_declaration @append more_locals @chain | !ε
+more_locals        → local_declaration @append more_locals | !ε
+local_declaration  → @local local_type ID @declare_local brackets SEMI
+local_type         → INT @attribute | VOID @attribute
+statements         → ε | !statement @append statements
+statement          → compound_stmt
+                   | @selection IF LPAREN expression @child RPAREN statement @child else
+                   | @iteration WHILE LPAREN expression @child RPAREN statement @child
+                   | @return RETURN return_value
+                   | !expression_stmt
+else               → ELSE statement @child | !ε
+return_value       → SEMI | !expression @child SEMI
+expression_stmt    → SEMI @none | !expression SEMI
+expression         → @reference ID @lookup reference | !simple_expression
+reference          → LPAREN arguments RPAREN @call
+                   | LBRACKETS expression @child RBRACKETS @var_ref operand
+                   | !@var_ref operand
+operand            → ASSIGN @assign expression @child | !terms sums relations
+simple_expression  → term sums relations
+additive           → term sums
+term               → factor terms
+relations          → @relop relop @attribute additive @child relations | !ε
+sums               → @addop addop @attribute term @child sums | !ε
+terms              → @mulop mulop @attribute factor @child terms | !ε
+relop              → LT | LTEQ | GT | GTEQ | COMP | DIFF
+addop              → PLUS | MINUS
+mulop              → TIMES | OVER
+factor             → LPAREN expression RPAREN
+                   | NUM @number
+                   | ID @variable factor_tail
+factor_tail        → LBRACKETS expression @child RBRACKETS
+                   | LPAREN arguments RPAREN
+                   | !ε
+arguments          → ε | !@arg_list expression @child more_arguments @child
+more_arguments     → COMMA expression @child more_arguments | !ε
+'''
+
+TERMINALS = len(TokenType)
+TOKENS = list(TokenType)
+RESERVED_CODES = frozenset(token.value for token in RESERVED_TOKENS)
+EMPTY = 'ε'
+
+
+def is_nonterminal(symbol):
+    return symbol.islower() and not symbol.startswith('@')
+
+
+class GrammarError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(message)
+
+
+class Grammar():
+
+    def __init__(self, text):
+        # rules: nonterminal -> list of alternatives (lists of symbol names);
+        # defaults: nonterminal -> index of its default alternative.
+        self.rules = {}
+        self.defaults = {}
+        self.actions = []
+        self.read(text)
+        self.start = next(iter(self.rules))
+        self.nullable = set()
+        self.first = {name: set() for name in self.rules}
+        self.follow = {name: set() for name in self.rules}
+        self.compute_first()
+        self.compute_follow()
+        self.compile()
+
+    def read(self, text):
+        name = None
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('|'):
+                if name is None:
+                    raise GrammarError(f"""ERROR: Grammar line "{line}" continues no rule.""")
+                body = line[1:]
+            else:
+                name, arrow, body = line.partition('→')
+                name = name.strip()
+                if not arrow or not name.islower() or name in self.rules:
+                    raise GrammarError(f"""ERROR: Grammar line "{line}" is not a new rule.""")
+                self.rules[name] = []
+            for alternative in body.split('|'):
+                symbols = alternative.split()
+                if symbols and symbols[0].startswith('!'):
+                    if name in self.defaults:
+                        raise GrammarError(f"""ERROR: Rule {name} has two defaults.""")
+                    self.defaults[name] = len(self.rules[name])
+                    symbols[0] = symbols[0][1:]
+                if symbols == [EMPTY]:
+                    symbols = []
+                for symbol in symbols:
+                    if symbol.startswith('@'):
+                        if symbol[1:] not in self.actions:
+                            self.actions.append(symbol[1:])
+                    elif not is_nonterminal(symbol) and symbol not in TokenType.__members__:
+                        raise GrammarError(f"""ERROR: Unknown symbol {symbol} in rule {name}.""")
+                self.rules[name].append(symbols)
+        for name, alternatives in self.rules.items():
+            for symbols in alternatives:
+                for symbol in symbols:
+                    if is_nonterminal(symbol) and symbol not in self.rules:
+                        raise GrammarError(f"""ERROR: Rule {name} uses undefined {symbol}.""")
+            if len(alternatives) == 1:
+                self.defaults[name] = 0
+        return None
+
+    def sequence_first(self, symbols):
+        # FIRST of a sequence of symbols, and whether it derives ε.
+        first = set()
+        for symbol in symbols:
+            if symbol.startswith('@'):
+                continue
+            if not is_nonterminal(symbol):
+                first.add(symbol)
+                return first, False
+            first |= self.first[symbol]
+            if symbol not in self.nullable:
+                return first, False
+        return first, True
+
+    def compute_first(self):
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.rules.items():
+                for symbols in alternatives:
+                    first, nullable = self.sequence_first(symbols)
+                    if not first <= self.first[name]:
+                        self.first[name] |= first
+                        changed = True
+                    if nullable and name not in self.nullable:
+                        self.nullable.add(name)
+                        changed = True
+        return None
+
+    def compute_follow(self):
+        # The end of the program is the ENDOFFILE token.
+        self.follow[self.start].add(TokenType.ENDOFFILE.name)
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.rules.items():
+                for symbols in alternatives:
+                    for position, symbol in enumerate(symbols):
+                        if not is_nonterminal(symbol):
+                            continue
+                        follow, nullable = self.sequence_first(symbols[position + 1:])
+                        if nullable:
+                            follow |= self.follow[name]
+                        if not follow <= self.follow[symbol]:
+                            self.follow[symbol] |= follow
+                            changed = True
+        return None
+
+    def compile(self):
+        # Symbol codes, and table: code -> row of TERMINALS right-hand sides,
+        # each a tuple of codes reversed for the stack, or None for an error.
+        self.nonterminals = list(self.rules)
+        codes = {token.name: token.value for token in TokenType}
+        codes.update((name, TERMINALS + index) for index, name in enumerate(self.nonterminals))
+        self.firstAction = TERMINALS + len(self.nonterminals)
+        codes.update(('@' + name, self.firstAction + index) for index, name in enumerate(self.actions))
+        self.codes = codes
+        self.table = [None] * TERMINALS
+        for name in self.nonterminals:
+            right = [tuple(codes[symbol] for symbol in reversed(self.expand(symbols))) for symbols in self.rules[name]]
+            entries = {}
+            for index, symbols in enumerate(self.rules[name]):
+                if index == self.defaults.get(name):
+                    continue
+                lookaheads, nullable = self.sequence_first(symbols)
+                if nullable:
+                    lookaheads |= self.follow[name]
+                for token in lookaheads:
+                    if token in entries:
+                        raise GrammarError(f"""ERROR: Rule {name} is not LL(1): alternatives {entries[token] + 1} and {index + 1} both start with {token}.""")
+                    entries[token] = index
+            default = right[self.defaults[name]] if name in self.defaults else None
+            row = [default] * TERMINALS
+            for token, index in entries.items():
+                row[codes[token]] = right[index]
+            self.table.append(row)
+        return None
+
+    def expand(self, symbols):
+        # Rules with a single alternative are substituted where they are
+        # used, saving the table lookup; they must not be left recursive.
+        expanded = []
+        for symbol in symbols:
+            if is_nonterminal(symbol) and len(self.rules[symbol]) == 1:
+                expanded.extend(self.expand(self.rules[symbol][0]))
+            else:
+                expanded.append(symbol)
+        return expanded
+
+
+GRAMMAR = Grammar(GRAMMAR_TEXT)
+
+
+class TableParser(Parser):
+
+    # Parses as Parser(scanner) does, raising the first error. The tokens
+    # are read by index from a TokenBuffer: scanner can be one, or a Scanner
+    # or an iterable of Token records, which are scanned into one first.
+
+    def __init__(self, scanner):
+        super().__init__(scanner)
+        self.values = []
+        self.position = 0
+        self.handlers = [getattr(self, 'on_' + name) for name in GRAMMAR.actions]
+
+    def parse(self):
+        if isinstance(self.scanner, TokenBuffer):
+            self.buffer = self.scanner
+        elif isinstance(self.scanner, Scanner):
+            self.buffer = self.scanner.scan_all()
+        else:
+            self.buffer = TokenBuffer.from_tokens(self.scanner)
+        try:
+            return self.run_table()
+        finally:
+            self.current = self.buffer.token(self.position)
+            self.token = self.current.type
+
+    def run_table(self):
+        table = GRAMMAR.table
+        handlers = self.handlers
+        firstAction = GRAMMAR.firstAction
+        types = self.types = self.buffer.types
+        lines = self.lines = self.buffer.lines
+        self.lexemes = self.buffer.lexemes
+        self.strings = self.buffer.strings
+        last = len(types) - 1
+        error = TokenType.ERROR.value
+        stack = [GRAMMAR.codes[GRAMMAR.start]]
+        pop = stack.pop
+        push = stack.extend
+        position = self.position = 0
+        code = types[0]
+        while stack:
+            symbol = pop()
+            if symbol < TERMINALS:
+                if symbol != code:
+                    raise SyntaxError(f"""ERROR: Syntax Error. Expected token {TOKENS[symbol]} at line {lines[position]}, but got {TOKENS[code]}.""")
+                if position < last:
+                    position += 1
+                self.position = position
+                code = types[position]
+                if code == error:
+                    raise TokenError(f"""ERROR: Token Error. Symbol "{self.buffer.lexeme(position).strip()}" at line {lines[position]} does not represent anything.""")
+            elif symbol < firstAction:
+                right = table[symbol][code]
+                if right is None:
+                    raise SyntaxError(f"""ERROR: Syntax Error at line {lines[position]}.""")
+                push(right)
+            else:
+                handlers[symbol - firstAction]()
+        if code != TokenType.ENDOFFILE.value:
+            raise SyntaxError("ERROR: Code ends before file.")
+        return self.root
+
+    def new_node(self, name : str = None, kind : NodeKind = None, attribute=None):
+        # Parser.new_node, at the token at self.position.
+        self.nodeCount += 1
+        position = self.position
+        lexeme = None if self.types[position] in RESERVED_CODES else self.strings[self.lexemes[position]]
+        return TreeNode(name=lexeme, kind=kind, lineno=self.lines[position], attribute=attribute, number=self.nodeCount)
+
+    def matched(self):
+        # The lexeme of the token matched last, also kept in
+        # tokenStringBackup as Parser.match does, for the scope checks.
+        position = self.position - 1
+        lexeme = self.strings[self.lexemes[position]]
+        self.tokenStringBackup = lexeme, self.lines[position]
+        return lexeme
+
+    # Actions. values holds the nodes under construction, innermost last,
+    # and the lists of nodes a sibling chain is made of.
+
+    def on_list(self):
+        self.values.append([])
+        return None
+
+    def on_append(self):
+        node = self.values.pop()
+        if node is not None:
+            self.values[-1].append(node)
+        return None
+
+    def link(self):
+        nodes = self.values.pop()
+        for node, sibling in zip(nodes, nodes[1:]):
+            node.sibling = sibling
+        return nodes[0] if nodes else None
+
+    def on_chain(self):
+        head = self.link()
+        if head is not None:
+            self.values[-1].add_child(head)
+        return None
+
+    def on_root(self):
+        self.root = self.link()
+        return None
+
+    def on_child(self):
+        child = self.values.pop()
+        self.values[-1].add_child(child)
+        return None
+
+    def on_none(self):
+        self.values.append(None)
+        return None
+
+    def on_attribute(self):
+        self.values[-1].attribute = TOKENS[self.types[self.position - 1]]
+        return None
+
+    def on_declaration(self):
+        self.values.append(self.new_node())
+        return None
+
+    def on_declare(self):
+        self.values[-1].name = self.matched()
+        self.declare_symbol(self.values[-1])
+        return None
+
+    def on_size(self):
+        self.values[-1].size = int(self.matched())
+        return None
+
+    def on_var_declaration(self):
+        self.values[-1].kind = NodeKind.VAR_DECLARATION
+        return None
+
+    def on_fun_declaration(self):
+        self.values[-1].kind = NodeKind.FUN_DECLARATION
+        return None
+
+    def on_param_list(self):
+        self.values.append(self.new_node(kind=NodeKind.PARAM_LIST))
+        return None
+
+    def on_param(self):
+        self.values.append(self.new_node(kind=NodeKind.PARAM))
+        return None
+
+    def on_param_name(self):
+        self.values[-1].name = self.matched()
+        return None
+
+    def on_promise(self):
+        param = self.values.pop()
+        self.values[-1].add_child(param)
+        self.scopeStack.add_promise(param.name)
+        return None
+
+    def on_empty_size(self):
+        self.values[-1].size = 0
+        return None
+
+    def on_compound(self):
+        self.scopeStack.push_scope()
+        self.values.append(self.new_node(kind=NodeKind.COMPOUND_STMT))
+        return None
+
+    def on_close(self):
+        self.scopeStack.pop_scope()
+        return None
+
+    def on_local(self):
+        self.values.append(self.new_node(kind=NodeKind.VAR_DECLARATION))
+        return None
+
+    def on_declare_local(self):
+        self.values[-1].name = self.matched()
+        self.declare_symbol(self.values[-1], currentScopeOnly=True)
+        return None
+
+    def on_selection(self):
+        self.values.append(self.new_node(kind=NodeKind.SELECTION_STMT))
+        return None
+
+    def on_iteration(self):
+        self.values.append(self.new_node(kind=NodeKind.ITERATION_STMT))
+        return None
+
+    def on_return(self):
+        self.values.append(self.new_node(kind=NodeKind.RETURN_STMT))
+        return None
+
+    def on_reference(self):
+        # As reference_exp: the node is made at the ID, which names it.
+        self.values.append(self.new_node())
+        return None
+
+    def on_lookup(self):
+        self.matched()
+        self.assert_symbol()
+        self.values[-1].attribute = TokenType.ID.name
+        return None
+
+    def on_call(self):
+        self.values[-1].kind = NodeKind.CALL
+        return None
+
+    def on_var_ref(self):
+        self.values[-1].kind = NodeKind.VAR_REF
+        return None
+
+    def on_assign(self):
+        self.values[-1].kind = NodeKind.ASSIGN
+        return None
+
+    def operator(self, kind):
+        node = self.new_node(kind=kind)
+        node.add_child(self.values.pop())
+        self.values.append(node)
+        return None
+
+    def on_relop(self):
+        return self.operator(NodeKind.RELOP)
+
+    def on_addop(self):
+        return self.operator(NodeKind.ADDOP)
+
+    def on_mulop(self):
+        return self.operator(NodeKind.MULOP)
+
+    def on_number(self):
+        # As factor: NUM and ID nodes are made past the token, at the next one.
+        node = self.new_node(kind=NodeKind.NUM)
+        node.attribute = self.matched()
+        node.name = TokenType.NUM.name
+        self.values.append(node)
+        return None
+
+    def on_variable(self):
+        node = self.new_node(kind=NodeKind.VAR_REF)
+        node.attribute = TokenType.ID.name
+        node.name = self.matched()
+        self.assert_symbol()
+        self.values.append(node)
+        return None
+
+    def on_arg_list(self):
+        self.values.append(self.new_node(kind=NodeKind.ARG_LIST))
+        return None
+
+
+def print_sets(grammar):
+    for name in grammar.nonterminals:
+        nullable = ' ε' if name in grammar.nullable else ''
+        print(f"""{name}: FIRST {{{' '.join(sorted(grammar.first[name]))}{nullable}}} FOLLOW {{{' '.join(sorted(grammar.follow[name]))}}}""")
+    return None
+
+
+if __name__ == '__main__':
+    # python -m compiler.ll1 [--sets] [input.cm]
+    # Prints the FIRST and FOLLOW sets, or the tree of input.cm parsed with the table.
+    if len(sys.argv) == 2 and sys.argv[1] == '--sets':
+        print_sets(GRAMMAR)
+    elif len(sys.argv) == 2:
+        with open(sys.argv[1], 'r') as sourceFile:
+            parser = TableParser(Scanner(sourceFile, verbose=False))
+            try:
+                TreePrinter.show_tree(parser.parse())
+            except (SyntaxError, TokenError) as exc:
+                print(exc)
+    else:
+        print('Usage: python -m compiler.ll1 [--sets] [input.cm]')
@@ -0,0 +1,358 @@
+from .globals import TokenType, NodeKind
+
+# Optimization passes over the syntax tree. Each pass rewrites the tree in
+# place and returns its (possibly new) root; replaced nodes are reused where
+# possible, so node IDs stay those the parser gave. Every pass keeps the
+# program's behaviour, runtime errors included: divisions by zero are left
+# to run, and only expressions without side effects or errors are dropped.
+#
+#   fold         folds operators whose operands are both constants
+#   simplify     x * 1, 1 * x, x / 1, x + 0, 0 + x, x - 0 -> x;
+#                x * 0, 0 * x -> 0 for pure x; x * 2, 2 * x -> x + x for a variable x
+#   branches     if and while statements with constant conditions
+#   unreachable  statements after a return in the same block
+#
+# Level 1 runs fold, branches and unreachable; level 2 adds simplify.
+
+LEVELS = {
+    0: (),
+    1: ('fold', 'branches', 'unreachable'),
+    2: ('fold', 'simplify', 'branches', 'unreachable')
+}
+
+OPERATORS = frozenset((NodeKind.ADDOP, NodeKind.MULOP, NodeKind.RELOP))
+
+
+def count_nodes(root):
+    count = 0
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        count += 1
+        if node.sibling is not None:
+            stack.append(node.sibling)
+        stack.extend(child for child in node.children if child is not None)
+    return count
+
+
+def rewrite(node, visit):
+    # Rewrites the chain starting at node bottom-up: children first, then
+    # visit(node), which returns the node to keep in its place or None to
+    # drop it. Returns the new head of the chain. Chains are collected
+    # with an explicit stack and rewritten in reverse, so that every chain
+    # below a node is rewritten before the node is visited.
+    if node is None:
+        return None
+    chains = []
+    stack = [node]
+    while stack:
+        first = stack.pop()
+        chains.append(first)
+        member = first
+        while member is not None:
+            stack.extend(child for child in member.children if child is not None)
+            member = member.sibling
+    # Original chain head -> rewritten head.
+    heads = {}
+    for first in reversed(chains):
+        head = tail = None
+        member = first
+        while member is not None:
+            following = member.sibling
+            if member.children:
+                children = [None if child is None else heads.pop(id(child)) for child in member.children]
+                if member.kind == NodeKind.COMPOUND_STMT:
+                    # A compound statement's children are its declaration and
+                    # statement chains; an emptied chain goes away.
+                    children = [child for child in children if child is not None]
+                member.children = children
+            replacement = visit(member)
+            if replacement is not None:
+                replacement.sibling = None
+                if head is None:
+                    head = replacement
+                else:
+                    tail.sibling = replacement
+                tail = replacement
+            member = following
+        heads[id(first)] = head
+    return heads[id(node)]
+
+
+def number(node):
+    # The value of a constant, or None.
+    return int(node.attribute) if node.kind == NodeKind.NUM else None
+
+
+def make_constant(node, value):
+    # Turns node into a NUM node holding value.
+    node.kind = NodeKind.NUM
+    node.name = TokenType.NUM.name
+    node.attribute = str(value)
+    node.children = ()
+    return node
+
+
+def divide(a, b):
+    # C division, truncating toward zero.
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def evaluate(operator, a, b):
+    # None when the operation has to be left to run (division by zero).
+    if operator == TokenType.PLUS:
+        return a + b
+    if operator == TokenType.MINUS:
+        return a - b
+    if operator == TokenType.TIMES:
+        return a * b
+    if operator == TokenType.OVER:
+        return None if b == 0 else divide(a, b)
+    if operator == TokenType.LT:
+        return int(a < b)
+    if operator == TokenType.LTEQ:
+        return int(a <= b)
+    if operator == TokenType.GT:
+        return int(a > b)
+    if operator == TokenType.GTEQ:
+        return int(a >= b)
+    if operator == TokenType.COMP:
+        return int(a == b)
+    return int(a != b)
+
+
+class Pass():
+
+    name = None
+
+    def __init__(self, functions):
+        # Names that are functions: a VAR_REF without children with one of
+        # these names is a call, not a variable.
+        self.functions = functions
+
+    def run(self, root):
+        return rewrite(root, self.visit)
+
+    def visit(self, node):
+        return node
+
+    def is_variable(self, node):
+        return node.kind == NodeKind.VAR_REF and not node.children and node.name not in self.functions
+
+    def is_pure(self, node):
+        # Constants, variables and operators on them, except division (which
+        # may fail); array elements may be out of bounds.
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.kind == NodeKind.NUM or self.is_variable(node):
+                continue
+            if node.kind in OPERATORS and node.attribute != TokenType.OVER:
+                stack.extend(node.children)
+                continue
+            return False
+        return True
+
+
+class ConstantFolding(Pass):
+
+    name = 'fold'
+
+    def visit(self, node):
+        if node.kind in OPERATORS:
+            left, right = (number(child) for child in node.children)
+            if left is not None and right is not None:
+                value = evaluate(node.attribute, left, right)
+                if value is not None:
+                    return make_constant(node, value)
+        return node
+
+
+class AlgebraicSimplification(ConstantFolding):
+
+    # Also folds, so that constants it creates (x * 0) fold further up.
+
+    name = 'simplify'
+
+    def visit(self, node):
+        node = ConstantFolding.visit(self, node)
+        if node.kind not in (NodeKind.ADDOP, NodeKind.MULOP):
+            return node
+        leftNode, rightNode = node.children
+        left, right = number(leftNode), number(rightNode)
+        operator = node.attribute
+        if operator == TokenType.TIMES:
+            if right == 1:
+                return leftNode
+            if left == 1:
+                return rightNode
+            if (right == 0 and self.is_pure(leftNode)) or (left == 0 and self.is_pure(rightNode)):
+                return make_constant(node, 0)
+            if right == 2 and self.is_variable(leftNode):
+                return self.double(node, leftNode, rightNode)
+            if left == 2 and self.is_variable(rightNode):
+                return self.double(node, rightNode, leftNode)
+        elif operator == TokenType.OVER:
+            if right == 1:
+                return leftNode
+        elif right == 0:
+            return leftNode
+        elif left == 0 and operator == TokenType.PLUS:
+            return rightNode
+        return node
+
+    def double(self, node, variable, two):
+        # x * 2 -> x + x; the constant's node becomes the second x.
+        two.kind = NodeKind.VAR_REF
+        two.name = variable.name
+        two.attribute = variable.attribute
+        node.kind = NodeKind.ADDOP
+        node.attribute = TokenType.PLUS
+        node.children = [variable, two]
+        return node
+
+
+class ConstantBranches(Pass):
+
+    # if (constant) keeps only the branch taken, while (0) goes away.
+
+    name = 'branches'
+
+    def visit(self, node):
+        if node.kind == NodeKind.SELECTION_STMT:
+            value = number(node.children[0])
+            if value is None:
+                return node
+            if value != 0:
+                return node.children[1]
+            return node.children[2] if len(node.children) > 2 else None
+        if node.kind == NodeKind.ITERATION_STMT and number(node.children[0]) == 0:
+            return None
+        return node
+
+
+def deciding_statements(node):
+    # The statements whose always_returns decides node's.
+    if node.kind == NodeKind.SELECTION_STMT:
+        return node.children[1:3]
+    statements = []
+    if node.kind == NodeKind.COMPOUND_STMT:
+        for child in node.children:
+            statement = child
+            while statement is not None and child.kind != NodeKind.VAR_DECLARATION:
+                statements.append(statement)
+                statement = statement.sibling
+    return statements
+
+
+def always_returns(node, results=None):
+    # Whether running the statement always ends in a return statement: an
+    # if with an else whose branches both do, or a block with a statement
+    # that does. Evaluated bottom-up with an explicit stack; results maps
+    # statements already decided to their answer, and gets the new ones.
+    if node is None:
+        return False
+    if results is None:
+        results = {}
+    stack = [(node, False)]
+    while stack:
+        statement, ready = stack.pop()
+        if statement in results:
+            continue
+        if not ready:
+            stack.append((statement, True))
+            stack.extend((part, False) for part in deciding_statements(statement) if part is not None)
+        elif statement.kind == NodeKind.RETURN_STMT:
+            results[statement] = True
+        elif statement.kind == NodeKind.SELECTION_STMT:
+            results[statement] = len(statement.children) > 2 and all(
+                part is not None and results[part] for part in statement.children[1:3]
+            )
+        else:
+            results[statement] = any(results[part] for part in deciding_statements(statement))
+    return results[node]
+
+
+class UnreachableCode(Pass):
+
+    name = 'unreachable'
+
+    def __init__(self, functions):
+        super().__init__(functions)
+        # Statements are visited bottom-up, so a block's statements are
+        # decided before the block and are not walked again.
+        self.returns = {}
+
+    def visit(self, node):
+        if node.kind == NodeKind.COMPOUND_STMT:
+            for child in node.children:
+                if child.kind == NodeKind.VAR_DECLARATION:
+                    continue
+                statement = child
+                while statement is not None:
+                    if always_returns(statement, self.returns):
+                        statement.sibling = None
+                    statement = statement.sibling
+        return node
+
+
+PASSES = {
+    cls.name: cls for cls in (ConstantFolding, AlgebraicSimplification, ConstantBranches, UnreachableCode)
+}
+
+
+class PassResult():
+
+    def __init__(self, name, nodesBefore, nodesAfter):
+        self.name = name
+        self.nodesBefore = nodesBefore
+        self.nodesAfter = nodesAfter
+
+    @property
+    def removed(self):
+        return self.nodesBefore - self.nodesAfter
+
+
+class PassManager():
+
+    # Runs passes in order, by name, and keeps a PassResult per pass run.
+
+    def __init__(self, level=1, passes=None):
+        if passes is None:
+            if level not in LEVELS:
+                raise ValueError(f"""Unknown optimization level {level}.""")
+            passes = LEVELS[level]
+        unknown = [name for name in passes if name not in PASSES]
+        if unknown:
+            raise ValueError(f"""Unknown optimization pass {unknown[0]}.""")
+        self.passes = list(passes)
+        self.results = []
+
+    def run(self, root):
+        # Optimizes the tree in place and returns its new root.
+        functions = {'input', 'output'}
+        functions.update(node.name for node in self.declarations(root) if node.kind == NodeKind.FUN_DECLARATION)
+        nodes = count_nodes(root)
+        for name in self.passes:
+            root = PASSES[name](functions).run(root)
+            after = count_nodes(root)
+            self.results.append(PassResult(name, nodes, after))
+            nodes = after
+        return root
+
+    def declarations(self, root):
+        while root is not None:
+            yield root
+            root = root.sibling
+        return None
+
+    def format(self):
+        lines = [f"""{'pass':<12}{'nodes':>8}{'removed':>9}"""]
+        for result in self.results:
+            lines.append(f"""{result.name:<12}{result.nodesAfter:>8}{result.removed:>9}""")
+        return '\n'.join(lines)
+
+
+def optimize(root, level=1):
+    return PassManager(level).run(root)
@@ -0,0 +1,163 @@
+import io
+import os
+import re
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from .scanner import Scanner
+from .parser import Parser
+from .serialize import dumps_tree, load_tree
+from .cache import parse_source
+
+# Parses the top-level declarations of one program in a process pool.
+#
+# A pre-scan over the text (regular expressions, no tokens) finds where each
+# top-level declaration ends: a ';' or a '}' at brace depth 0, outside
+# comments. It also reads each declaration's name from its header, so that
+# the global names declared before any declaration are known up front.
+# Consecutive declarations are grouped into chunks; a worker scans and
+# parses a chunk starting at the right line, with the globals declared
+# before it already in scope, and sends back the binary tree. Node IDs are
+# shifted by the nodes created in earlier chunks and the chunks are linked
+# in source order, which gives the tree the serial parse builds.
+#
+# The split only holds for a program that parses: as soon as the pre-scan
+# finds something unexpected or a chunk fails, the whole source is parsed
+# serially instead, so errors are those the serial parser reports.
+
+# Comments, and the characters the pre-scan follows.
+BOUNDARY_PATTERN = re.compile(r'/\*.*?(?:\*/|\Z)|[{};]', re.DOTALL)
+# Whitespace and comments, as the scanner skips them.
+SKIP = r'(?:[ \t\n\r]+|/\*.*?(?:\*/|\Z))'
+# The type and name of a declaration; names as the scanner's TOKEN_PATTERN.
+HEADER_PATTERN = re.compile(SKIP + r'*(?:int|void)' + SKIP + r'+([A-Za-z\u0131\u017f\ufb05\ufb06]+)', re.DOTALL)
+TRAILING_PATTERN = re.compile(SKIP + r'*\Z', re.DOTALL)
+# Below this, the pool costs more than it saves.
+MIN_PARALLEL_CHARS = 1 << 16
+
+
+class Declaration():
+
+    __slots__ = ('start', 'end', 'line', 'name')
+
+    def __init__(self, start, end, line, name):
+        self.start = start
+        self.end = end
+        self.line = line
+        self.name = name
+
+
+def find_declarations(text):
+    # Top-level declarations in order, or None when the text does not split
+    # cleanly (unbalanced braces, a header without a name, trailing text).
+    declarations = []
+    depth = 0
+    start = 0
+    line = 1
+    for match in BOUNDARY_PATTERN.finditer(text):
+        symbol = match.group()
+        if symbol == '{':
+            depth += 1
+            continue
+        if symbol == '}':
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth > 0:
+                continue
+        elif symbol != ';' or depth > 0:
+            # A comment, or a ';' inside a body.
+            continue
+        header = HEADER_PATTERN.match(text, start)
+        if header is None:
+            return None
+        end = match.end()
+        declarations.append(Declaration(start, end, line, header.group(1)))
+        line += text.count('\n', start, end)
+        start = end
+    if depth != 0 or TRAILING_PATTERN.match(text, start) is None:
+        return None
+    return declarations
+
+
+def parse_chunk(job):
+    # Runs in a worker process. Returns the chunk's binary tree and the
+    # number of nodes its parse created, or None if it does not parse or
+    # its tree cannot be encoded. Never raises, so that one chunk cannot
+    # abort the others.
+    text, line, names, engine = job
+    scanner = Scanner(io.StringIO(text), verbose=False, engine=engine)
+    scanner.lineIndex = line
+    parser = Parser(scanner)
+    parser.scopeStack.add_symbols(names)
+    try:
+        return dumps_tree(parser.parse()), parser.nodeCount
+    except Exception:
+        return None
+
+
+def make_chunks(text, declarations, chunks, engine):
+    # Groups declarations into about chunks jobs of similar length.
+    jobs = []
+    target = max(1, len(text) // chunks)
+    names = []
+    first = 0
+    for index, declaration in enumerate(declarations):
+        last = index == len(declarations) - 1
+        if declaration.end - declarations[first].start >= target or last:
+            # The last chunk also takes the comments after the last declaration.
+            end = len(text) if last else declaration.end
+            jobs.append((text[declarations[first].start:end], declarations[first].line, list(names), engine))
+            names.extend(other.name for other in declarations[first:index + 1])
+            first = index + 1
+    return jobs
+
+
+def renumber(root, offset):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node.number += offset
+        if node.sibling is not None:
+            stack.append(node.sibling)
+        stack.extend(child for child in node.children if child is not None)
+    return None
+
+
+def parse_parallel(source: bytes, workers=None, executor=None, engine='fsm', recover=False, chunks=None):
+    # Returns (root, nodeCount) as the serial parse would. Errors propagate
+    # as from parse_source. An executor can be shared between calls; by
+    # default a pool of workers processes is made for this one.
+    text = source.decode('utf-8')
+    workers = workers or os.cpu_count() or 1
+    declarations = find_declarations(text) if len(text) >= MIN_PARALLEL_CHARS else None
+    if not declarations or len(declarations) < 2 or (workers == 1 and executor is None):
+        entry = parse_source(source, engine=engine, recover=recover)
+        return entry.root, entry.nodeCount
+    jobs = make_chunks(text, declarations, chunks or 4 * workers, engine)
+    try:
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(parse_chunk, jobs))
+        else:
+            results = list(executor.map(parse_chunk, jobs))
+    except BrokenExecutor:
+        # A worker died: the serial parse gives the same result.
+        results = [None]
+    if any(result is None for result in results):
+        entry = parse_source(source, engine=engine, recover=recover)
+        return entry.root, entry.nodeCount
+    root = tail = None
+    nodeCount = 0
+    for data, count in results:
+        head = load_tree(data)
+        if nodeCount:
+            renumber(head, nodeCount)
+        nodeCount += count
+        if tail is None:
+            root = head
+        else:
+            tail.sibling = head
+        tail = head
+        while tail.sibling is not None:
+            tail = tail.sibling
+    return root, nodeCount
@@ -0,0 +1,123 @@
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from .globals import TokenType
+from .scanner import Scanner
+from .tokens import TokenBuffer
+
+# Scans one large text in a process pool, into the TokenBuffer a sequential
+# Scanner.scan_all gives.
+#
+# The text is cut into chunks at whitespace, which no token holds, so no
+# token is split; a lone '!' takes the character after it into its lexeme,
+# so each chunk is sent with the first character of the next one, always
+# whitespace. Lines and columns are absolute: the line each chunk starts at
+# is a prefix sum of the newlines in the chunks before it, and its first
+# column is counted back to the last newline before it.
+#
+# Whitespace inside a comment is also a place to cut, and whether a chunk
+# starts inside a comment depends on everything before it. Workers guess
+# that it does not and scan the chunk that way, and also report whether the
+# chunk ends inside a comment for either start, which only takes a search
+# for the comment delimiters ('/*' always opens a comment outside one, and
+# the first '*/' closes it). Walking those answers in order gives the true
+# start of every chunk; chunks guessed wrong are scanned again, in parallel,
+# from the end of the comment they start in.
+
+# Below this, the pool costs more than it saves.
+MIN_PARALLEL_CHARS = 1 << 20
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]')
+
+
+def ends_in_comment(text, position):
+    # Whether text from position on, outside a comment there, ends inside one.
+    while True:
+        opening = text.find('/*', position)
+        if opening < 0:
+            return False
+        closing = text.find('*/', opening + 2)
+        if closing < 0:
+            return True
+        position = closing + 2
+
+
+def scan_chunk(job):
+    # Runs in a worker process. Returns the chunk's tokens, without the
+    # ENDOFFILE of the chunk, and whether it ends inside a comment when it
+    # starts outside of one and when it starts inside one.
+    text, lookahead, line, column, inComment, engine = job
+    closing = text.find('*/')
+    endings = ends_in_comment(text, 0), closing < 0 or ends_in_comment(text, closing + 2)
+    start = 0
+    if inComment:
+        if closing < 0:
+            return TokenBuffer(), endings
+        start = closing + 2
+        newlines = text.count('\n', 0, start)
+        if newlines:
+            line += newlines
+            column = start - text.rfind('\n', 0, start)
+        else:
+            column += start
+    scanner = Scanner(io.StringIO(text[start:] + lookahead), verbose=False, engine=engine)
+    scanner.start_at(line, column)
+    buffer = scanner.scan_all()
+    for values in (buffer.types, buffer.lines, buffer.columns, buffer.lexemes):
+        values.pop()
+    return buffer, endings
+
+
+def make_jobs(text, chunks, engine):
+    # About chunks pieces of similar length, each starting at whitespace
+    # (but the first), with the line and column they start at.
+    target = max(1, len(text) // chunks)
+    jobs = []
+    start = 0
+    line = 1
+    while start < len(text):
+        found = WHITESPACE_PATTERN.search(text, start + target)
+        end = len(text) if found is None else found.start()
+        column = start - text.rfind('\n', 0, start)
+        jobs.append((text[start:end], text[end:end + 1], line, column, False, engine))
+        line += text.count('\n', start, end)
+        start = end
+    return jobs
+
+
+def scan_parallel(text: str, workers=None, executor=None, engine='regex', chunks=None):
+    # Returns the TokenBuffer of text, as Scanner(...).scan_all() would. An
+    # executor can be shared between calls; by default a pool of workers
+    # processes is made for this one.
+    workers = workers or os.cpu_count() or 1
+    if len(text) < MIN_PARALLEL_CHARS or (workers == 1 and executor is None):
+        return Scanner(io.StringIO(text), verbose=False, engine=engine).scan_all()
+    jobs = make_jobs(text, chunks or 4 * workers, engine)
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return scan_jobs(text, jobs, pool)
+    return scan_jobs(text, jobs, executor)
+
+
+def scan_jobs(text, jobs, executor):
+    results = list(executor.map(scan_chunk, jobs))
+    # The comment state each chunk really starts in; the first starts outside.
+    inComment = False
+    rescans = []
+    for index, (_, endings) in enumerate(results):
+        if inComment:
+            rescans.append(index)
+        inComment = endings[inComment]
+    retried = executor.map(scan_chunk, [jobs[index][:4] + (True,) + jobs[index][5:] for index in rescans])
+    for index, result in zip(rescans, retried):
+        results[index] = result
+    buffer = TokenBuffer()
+    for chunk, _ in results:
+        buffer.extend(chunk)
+    # ENDOFFILE past the last whitespace and comments, as the scanner puts it.
+    buffer.types.append(TokenType.ENDOFFILE.value)
+    buffer.lines.append(text.count('\n') + 1)
+    buffer.columns.append(len(text) - text.rfind('\n'))
+    buffer.lexemes.append(buffer.string_id(''))
+    return buffer
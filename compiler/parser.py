@@ -1,25 +1,61 @@
+import ast
+import inspect
+
 from .globals import *
 from .util import *
 from .scanner import *
 from .scope import ScopeStack
 
-IDGenerator = IDGenerator()
-
 class TokenError(Exception):
     def __init__(self, message):
         self.message = message
 
 
+class Diagnostic():
+
+    # One lexical, syntax or scope error found by a recovering parse.
+
+    def __init__(self, line, message):
+        self.line = line
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class ParseErrors(Exception):
+
+    # Raised with every diagnostic of a recovering parse that found any.
+
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+        self.message = '\n'.join(str(diagnostic) for diagnostic in diagnostics)
+        super().__init__(self.message)
+
+
+# Panic-mode recovery: after an error in a statement, tokens are skipped up
+# to and including a SEMI, or up to a closing brace or the start of the next
+# if, while or return statement. Braced blocks (and an else right after one)
+# are skipped whole.
+STATEMENT_STARTS = frozenset((TokenType.IF, TokenType.WHILE, TokenType.RETURN))
+
+
 class TreeNode():
 
-    def __init__(self, name : str = None, kind : NodeKind = NodeKind.UNDEFINED, lineno : int = None, attribute=None):
-        self.children = []
+    # No per-node __dict__, and leaves share one empty tuple until a first child is added.
+    # size is only set on array declarations and parameters: the declared
+    # length, or 0 when the brackets are empty.
+    __slots__ = ('children', 'sibling', 'kind', 'number', 'attribute', 'lineno', 'name', 'size')
+
+    def __init__(self, name : str = None, kind : NodeKind = NodeKind.UNDEFINED, lineno : int = None, attribute=None, number : int = None, size : int = None):
+        self.children = ()
         self.sibling = None
         self.kind = kind
-        self.number = next(IDGenerator)
+        self.number = number
         self.attribute = attribute
         self.lineno = lineno
         self.name = name
+        self.size = size
 
     def to_string(self, spaces):
         text = ' ' * spaces + f"""<ID: {self.number}, kind: {self.kind}"""
@@ -30,44 +66,151 @@ class TreeNode():
         return text + f""", line: {self.lineno}>"""
     
     def add_child(self, child):
-        self.children.append(child)
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
         return None
 
 
 class Parser():
 
-    def __init__(self, scanner: Scanner):
-        self.token = self.root = None
+    def __init__(self, scanner, recover=False):
+        # scanner is a Scanner or any other iterable of Token records ending
+        # with ENDOFFILE, e.g. tokens recorded or scanned ahead of time.
+        # Without recover, the first error is raised. With it, every error is
+        # added to diagnostics, the parse goes on past it and parse() returns
+        # whatever tree could be built.
+        self.token = self.root = self.current = None
         self.scanner = scanner
+        self.stream = iter(scanner)
         self.tokenBackup = (None, None)
         self.scopeStack = ScopeStack()
         self.scopeStack.add_symbols(['input', 'output'])
         self.nodeCount = 0
+        self.recover = recover
+        self.diagnostics = []
+        # Token the parse resumed at after the last error. Errors found
+        # there again are consequences of the first one and are not reported.
+        self.resumeToken = None
+        if recover:
+            self.advance = self.advance_recovering
 
     def new_node(self, name : str = None, kind : NodeKind = None, attribute=None):
-        node = TreeNode(name=self.scanner.tokenString, kind=kind, lineno=self.scanner.lineIndex, attribute=attribute)
+        # Nodes are numbered per parse: the node count doubles as the ID of the newest node.
         self.nodeCount += 1
-        return node
+        return TreeNode(name=trace_lexeme(self.current), kind=kind, lineno=self.current.line, attribute=attribute, number=self.nodeCount)
+
+    def advance(self):
+        # Past ENDOFFILE, the last token is repeated.
+        self.current = next(self.stream, self.current)
+        self.token = self.current.type
+        return None
+
+    def advance_recovering(self):
+        # Lexical errors are reported and dropped from the token stream.
+        self.current = next(self.stream, self.current)
+        while self.current.type == TokenType.ERROR:
+            self.report(TokenError(f"""ERROR: Token Error. Symbol "{self.current.lexeme.strip()}" at line {self.current.line} does not represent anything."""), self.current.line)
+            self.current = next(self.stream, self.current)
+        self.token = self.current.type
+        return None
+
+    def report(self, error, line):
+        # Raises error, or records it when recovering.
+        if not self.recover:
+            raise error
+        self.diagnostics.append(Diagnostic(line, str(error)))
+        return None
+
+    def synchronize(self, error, start, scopes):
+        # Recovers from an error raised while parsing from token start on:
+        # reports it, skips ahead (see STATEMENT_STARTS) and closes the
+        # scopes opened since, leaving scopes of them open.
+        if not self.recover:
+            raise error
+        if self.current is not self.resumeToken:
+            self.diagnostics.append(Diagnostic(self.current.line, str(error)))
+        if self.current is start and self.token != TokenType.ENDOFFILE:
+            self.advance()
+        depth = 0
+        while self.token != TokenType.ENDOFFILE:
+            if self.token == TokenType.LCBRACES:
+                depth += 1
+            elif self.token == TokenType.RCBRACES:
+                if depth == 0:
+                    break
+                depth -= 1
+                if depth == 0:
+                    self.advance()
+                    if self.token != TokenType.ELSE:
+                        break
+                    continue
+            elif depth == 0:
+                if self.token == TokenType.SEMI:
+                    self.advance()
+                    break
+                if self.token in STATEMENT_STARTS:
+                    break
+            self.advance()
+        self.close_scopes(scopes)
+        self.resumeToken = self.current
+        return None
+
+    def synchronize_declaration(self, error, start):
+        # Same for a top-level declaration: skips to the next int or void
+        # outside braces, past a SEMI, or past the closing brace of a body.
+        if not self.recover:
+            raise error
+        if self.current is not self.resumeToken:
+            self.diagnostics.append(Diagnostic(self.current.line, str(error)))
+        if self.current is start and self.token != TokenType.ENDOFFILE:
+            self.advance()
+        depth = 0
+        while self.token != TokenType.ENDOFFILE:
+            if self.token == TokenType.LCBRACES:
+                depth += 1
+            elif self.token == TokenType.RCBRACES:
+                depth -= 1
+                if depth <= 0:
+                    self.advance()
+                    break
+            elif depth == 0:
+                if self.token == TokenType.SEMI:
+                    self.advance()
+                    break
+                if self.token == TokenType.INT or self.token == TokenType.VOID:
+                    break
+            self.advance()
+        self.scopeStack.promiseSymbols = None
+        self.close_scopes(1)
+        self.resumeToken = self.current
+        return None
+
+    def close_scopes(self, scopes):
+        while len(self.scopeStack.stack) > scopes:
+            self.scopeStack.pop_scope()
+        return None
 
     def match(self, token):
         if self.token == token:
-            self.tokenStringBackup = self.scanner.tokenString, self.scanner.lineIndex
-            self.token = self.scanner.get_token()
+            self.tokenStringBackup = self.current.lexeme, self.current.line
+            self.advance()
             if self.token == TokenType.ERROR:
-                raise TokenError(f"""ERROR: Token Error. Symbol "{self.scanner.tokenString.strip()}" at line {self.scanner.lineIndex} does not represent anything.""")
+                raise TokenError(f"""ERROR: Token Error. Symbol "{self.current.lexeme.strip()}" at line {self.current.line} does not represent anything.""")
             return True
-        raise SyntaxError(f"""ERROR: Syntax Error. Expected token {token} at line {self.scanner.lineIndex}, but got {self.token}.""")
+        raise SyntaxError(f"""ERROR: Syntax Error. Expected token {token} at line {self.current.line}, but got {self.token}.""")
 
     def declare_symbol(self, node, currentScopeOnly=False):
         if self.scopeStack.check_symbol(node.name, currentScopeOnly):
-            raise SyntaxError(f"""ERROR: Scope Error. Symbol "{node.name}" at line {node.lineno} has already been declared.""")
+            self.report(SyntaxError(f"""ERROR: Scope Error. Symbol "{node.name}" at line {node.lineno} has already been declared."""), node.lineno)
         else:
             self.scopeStack.add_symbol(node.name)
         return None
 
     def assert_symbol(self):
         if not self.scopeStack.check_symbol(self.tokenStringBackup[0]):
-            raise SyntaxError(f"""ERROR: Scope Error. Symbol "{self.tokenStringBackup[0]}" at line {self.tokenStringBackup[1]} isn't global and also has not been locally declarated.""")
+            self.report(SyntaxError(f"""ERROR: Scope Error. Symbol "{self.tokenStringBackup[0]}" at line {self.tokenStringBackup[1]} isn't global and also has not been locally declarated."""), self.tokenStringBackup[1])
         return None
 
     def reference_exp(self):
@@ -233,7 +376,7 @@ class Parser():
                     t.add_child(self.arg_list())
                 self.match(TokenType.RPAREN)
         else:
-            raise SyntaxError(f"""ERROR: Syntax Error at line {self.scanner.lineIndex}.""")
+            raise SyntaxError(f"""ERROR: Syntax Error at line {self.current.line}.""")
         return t
 
     def arg_list(self):
@@ -310,22 +453,38 @@ class Parser():
         if self.token == TokenType.LBRACKETS:
             self.match(TokenType.LBRACKETS)
             self.match(TokenType.RBRACKETS)
+            t.size = 0
         return t
 
     def local_declarations(self):
-        if self.token == TokenType.INT or self.token == TokenType.VOID:
-            t = self.new_node(kind=NodeKind.VAR_DECLARATION)
-            t.attribute = self.match_type_specifier()
-            self.match(TokenType.ID)
-            t.name = self.tokenStringBackup[0]
-            self.declare_symbol(t, currentScopeOnly=True)
-            if self.token == TokenType.LBRACKETS:
-                self.match(TokenType.LBRACKETS)
-                self.match(TokenType.RBRACKETS)
-            self.match(TokenType.SEMI)
-            t.sibling = self.local_declarations()
-            return t
-        return None
+        t = p = None
+        scopes = len(self.scopeStack.stack)
+        while self.token == TokenType.INT or self.token == TokenType.VOID:
+            start = self.current
+            try:
+                q = self.local_declaration()
+            except (SyntaxError, TokenError) as error:
+                self.synchronize(error, start, scopes)
+                continue
+            if t is None:
+                t = q
+            else:
+                p.sibling = q
+            p = q
+        return t
+
+    def local_declaration(self):
+        t = self.new_node(kind=NodeKind.VAR_DECLARATION)
+        t.attribute = self.match_type_specifier()
+        self.match(TokenType.ID)
+        t.name = self.tokenStringBackup[0]
+        self.declare_symbol(t, currentScopeOnly=True)
+        if self.token == TokenType.LBRACKETS:
+            self.match(TokenType.LBRACKETS)
+            self.match(TokenType.RBRACKETS)
+            t.size = 0
+        self.match(TokenType.SEMI)
+        return t
 
     def compound_stmt(self):
         self.scopeStack.push_scope()
@@ -335,7 +494,9 @@ class Parser():
             if self.token == TokenType.INT or self.token == TokenType.VOID:
                 t.add_child(self.local_declarations())
             if self.token != TokenType.RCBRACES:
-                t.add_child(self.stmt_list())
+                stmts = self.stmt_list()
+                if stmts is not None:
+                    t.add_child(stmts)
         self.match(TokenType.RCBRACES)
         self.scopeStack.pop_scope()
         return t
@@ -353,10 +514,35 @@ class Parser():
         return self.expression_stmt()
 
     def stmt_list(self):
-        if self.token != TokenType.RCBRACES:
-            t = self.stmt()
-            t.sibling = self.stmt_list()
-            return t
+        # Empty statements make no node and are left out of the sibling chain.
+        t = p = None
+        scopes = len(self.scopeStack.stack)
+        while self.token != TokenType.RCBRACES:
+            start = self.current
+            try:
+                if self.recover and (self.token == TokenType.INT or self.token == TokenType.VOID):
+                    self.misplaced_declarations()
+                    continue
+                q = self.stmt()
+            except (SyntaxError, TokenError) as error:
+                self.synchronize(error, start, scopes)
+                if self.token == TokenType.ENDOFFILE:
+                    break
+                continue
+            if q is None:
+                continue
+            if t is None:
+                t = q
+            else:
+                p.sibling = q
+            p = q
+        return t
+
+    def misplaced_declarations(self):
+        # Declarations after a statement are an error, but their symbols are
+        # still declared so that later uses do not add scope errors.
+        self.report(SyntaxError(f"""ERROR: Syntax Error at line {self.current.line}."""), self.current.line)
+        self.local_declarations()
         return None
 
     def declaration(self):
@@ -371,6 +557,7 @@ class Parser():
         elif self.token == TokenType.LBRACKETS:
             self.match(TokenType.LBRACKETS)
             self.match(TokenType.NUM)
+            t.size = int(self.tokenStringBackup[0])
             self.match(TokenType.RBRACKETS)
             self.match(TokenType.SEMI)
             t.kind = NodeKind.VAR_DECLARATION
@@ -384,23 +571,118 @@ class Parser():
         return t
 
     def declaration_list(self):
-        t = self.declaration()
-        p = t
-        while self.token != TokenType.ENDOFFILE:
-            p.sibling = self.declaration()
-            p = p.sibling
-        return t
+        t = p = None
+        while True:
+            start = self.current
+            try:
+                q = self.declaration()
+            except (SyntaxError, TokenError) as error:
+                self.synchronize_declaration(error, start)
+                q = None
+            if q is not None:
+                if t is None:
+                    t = q
+                else:
+                    p.sibling = q
+                p = q
+            if self.token == TokenType.ENDOFFILE:
+                return t
 
     def parse(self):
-        self.token = self.scanner.get_token()
+        self.advance()
         self.root = self.declaration_list()
         if self.token != TokenType.ENDOFFILE:
             raise SyntaxError("ERROR: Code ends before file.")
         return self.root
 
 
-
-
-
-
-
+# The productions that can nest. IterativeParser runs them as generators
+# made from Parser's source when this module loads, so the grammar is only
+# written once: in a nested production, a call of another one becomes a
+# yield of it, self.stmt() say becoming (yield self.stmt()); in any other
+# method calling one, such as declaration_list, self.run(self.stmt()).
+NESTED_PRODUCTIONS = frozenset((
+    'reference_exp', 'expression_stmt', 'expression', 'simple_expression', 'additive_expression', 'term',
+    'factor', 'arg_list', 'selection_stmt', 'iteration_stmt', 'return_stmt', 'compound_stmt', 'stmt',
+    'stmt_list', 'declaration'
+))
+
+
+class YieldProductions(ast.NodeTransformer):
+
+    def __init__(self, nested):
+        self.nested = nested
+        self.calls = 0
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        function = node.func
+        if not (isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name)
+                and function.value.id == 'self' and function.attr in NESTED_PRODUCTIONS):
+            return node
+        self.calls += 1
+        if self.nested:
+            return ast.copy_location(ast.Yield(value=node), node)
+        run = ast.Attribute(value=ast.Name(id='self', ctx=ast.Load()), attr='run', ctx=ast.Load())
+        return ast.copy_location(ast.Call(func=run, args=[node], keywords=[]), node)
+
+
+def iterative_methods(cls):
+    # The methods of cls that call a nested production, rewritten as above.
+    # Their code keeps the file and line numbers of cls's source.
+    lines, start = inspect.getsourcelines(cls)
+    classNode = ast.parse(''.join(lines)).body[0]
+    ast.increment_lineno(classNode, start - 1)
+    functions = []
+    for node in classNode.body:
+        if isinstance(node, ast.FunctionDef):
+            transformer = YieldProductions(node.name in NESTED_PRODUCTIONS)
+            transformer.visit(node)
+            if transformer.calls:
+                functions.append(node)
+            elif node.name in NESTED_PRODUCTIONS:
+                raise TypeError(f"""Production {node.name} calls no other production.""")
+    module = ast.fix_missing_locations(ast.Module(body=functions, type_ignores=[]))
+    methods = {}
+    exec(compile(module, inspect.getsourcefile(cls), 'exec'), globals(), methods)
+    return methods
+
+
+class IterativeParser(Parser):
+
+    # Builds the same trees as Parser without Python recursion. Every
+    # production that can nest is a generator: it yields the generator of a
+    # sub-production and is sent back its node. run() drives them with an
+    # explicit stack, so nesting depth is bounded by memory instead of the
+    # interpreter recursion limit.
+
+    def run(self, production):
+        # An error raised by a production is thrown into the one that asked
+        # for it, as a raise would propagate through recursive calls.
+        stack = [production]
+        value = error = None
+        while True:
+            try:
+                if error is None:
+                    child = stack[-1].send(value)
+                else:
+                    raised, error = error, None
+                    child = stack[-1].throw(raised)
+            except StopIteration as stop:
+                stack.pop()
+                if not stack:
+                    return stop.value
+                value = stop.value
+                continue
+            except (SyntaxError, TokenError) as raised:
+                stack.pop()
+                if not stack:
+                    raise
+                error = raised
+                continue
+            stack.append(child)
+            value = None
+
+
+for name, method in iterative_methods(Parser).items():
+    setattr(IterativeParser, name, method)
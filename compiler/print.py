@@ -1,53 +1,68 @@
+import sys
+
 from .globals import TokenType, NodeKind
+from .util import is_binary_stream
 
 class TreePrinter():
 
-    spaces = 0
     spaceUnit = 4
+    chunkSize = 1 << 16
 
-    def grow_identation():
-        TreePrinter.spaces += TreePrinter.spaceUnit
+    def iter_lines(root, spaces=0):
+        # Pre-order walk with an explicit stack: a node, then its children one
+        # indentation level deeper, then its sibling at the same level. An
+        # empty tree has no lines.
+        stack = [(root, spaces)] if root is not None else []
+        while stack:
+            node, spaces = stack.pop()
+            if node.sibling is not None:
+                stack.append((node.sibling, spaces))
+            for child in reversed(node.children):
+                # Empty statements are kept as None children and print nothing.
+                if child is not None:
+                    stack.append((child, spaces + TreePrinter.spaceUnit))
+            yield node.to_string(spaces)
+        return None
 
-    def shrink_identation():
-        TreePrinter.spaces -= TreePrinter.spaceUnit
+    def write_tree(root, stream, chunkSize=None, encoding='utf-8'):
+        # Accepts any text or binary stream with a write method; lines are
+        # joined and written in chunks of about chunkSize characters.
+        chunkSize = TreePrinter.chunkSize if chunkSize is None else chunkSize
+        binary = is_binary_stream(stream)
+        chunk = []
+        size = 0
+        for line in TreePrinter.iter_lines(root):
+            chunk.append(line)
+            size += len(line) + 1
+            if size >= chunkSize:
+                chunk.append('')
+                text = '\n'.join(chunk)
+                stream.write(text.encode(encoding) if binary else text)
+                chunk = []
+                size = 0
+        if chunk:
+            chunk.append('')
+            text = '\n'.join(chunk)
+            stream.write(text.encode(encoding) if binary else text)
+        return None
 
-    def show_node(node):
-        print(node.to_string(TreePrinter.spaces))
+    def show_node(node, spaces=0):
+        print(node.to_string(spaces))
         return None
 
     def show_tree(root):
-        p = root
-        while p is not None:
-            TreePrinter.show_node(p)
-            TreePrinter.grow_identation()
-            for child in p.children:
-                TreePrinter.show_tree(child)
-            p = p.sibling
-            TreePrinter.shrink_identation()
+        TreePrinter.write_tree(root, sys.stdout)
         return None
 
-    def save_node(node, file):
-        file.write(node.to_string(TreePrinter.spaces) + '\n')
-        return None    
+    def save_node(node, file, spaces=0):
+        file.write(node.to_string(spaces) + '\n')
+        return None
 
     def print_expand(node, file):
-        p = node
-        while p is not None:
-            TreePrinter.save_node(p, file)
-            TreePrinter.grow_identation()
-            for child in p.children:
-                TreePrinter.print_expand(child, file)
-            p = p.sibling
-            TreePrinter.shrink_identation()
+        TreePrinter.write_tree(node, file)
         return None
 
     def save_tree(root, filename='output.tree'):
         with open(filename, 'w') as file:
-            TreePrinter.print_expand(root, file)
+            TreePrinter.write_tree(root, file)
         return None
-
-
-
-
-
-
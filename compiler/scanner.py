@@ -1,5 +1,10 @@
+import re
+from sys import intern
+
 from .globals import *
 from .util import *
+from .trace import TRACE_MODES, TRACE_WRITERS
+from .tokens import TokenBuffer
 
 
 class State(Enum):
@@ -17,37 +22,115 @@ class State(Enum):
     DONE = 11
 
 
-RESERVED_WORDS = {
-    'if': TokenType.IF,
-    'else': TokenType.ELSE,
-    'int': TokenType.INT,
-    'return': TokenType.RETURN,
-    'void': TokenType.VOID,
-    'while': TokenType.WHILE
+SYMBOLS = {
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.TIMES,
+    '/': TokenType.OVER,
+    '<': TokenType.LT,
+    '<=': TokenType.LTEQ,
+    '>': TokenType.GT,
+    '>=': TokenType.GTEQ,
+    '==': TokenType.COMP,
+    '!=': TokenType.DIFF,
+    '=': TokenType.ASSIGN,
+    ';': TokenType.SEMI,
+    ',': TokenType.COMMA,
+    '(': TokenType.LPAREN,
+    ')': TokenType.RPAREN,
+    '[': TokenType.LBRACKETS,
+    ']': TokenType.RBRACKETS,
+    '{': TokenType.LCBRACES,
+    '}': TokenType.RCBRACES
 }
 
+# Whitespace and comments between tokens. An unterminated comment runs to the end of the text.
+SKIP_PATTERN = re.compile(r'(?:[ \t\n\r]+|/\*.*?(?:\*/|\Z))*', re.DOTALL)
+
+# One token per match: NUM, ID (is_alphabetic also accepts the few non-ASCII letters whose
+# upper case is an ASCII letter), a special symbol, or any other single character.
+TOKEN_PATTERN = re.compile(
+    r'([0-9]+)|([A-Za-z\u0131\u017f\ufb05\ufb06]+)|(==|!=|<=|>=|[-+*/<>=;,()\[\]{}])|(.)',
+    re.DOTALL
+)
+
 
 class Scanner():
 
-    def __init__(self, sourceFile, traceFile=None, verbose=None):
-        self.text = sourceFile.read()
+    ENGINES = ('fsm', 'regex')
+
+    def __init__(self, sourceFile, traceFile=None, verbose=None, engine='fsm', record=False, blockSize=None, traceMode='text'):
+        if engine not in Scanner.ENGINES:
+            raise ValueError(f"""Unknown scanner engine "{engine}". Expected one of {Scanner.ENGINES}.""")
+        if traceMode not in TRACE_MODES:
+            raise ValueError(f"""Unknown trace mode "{traceMode}". Expected one of {TRACE_MODES}.""")
+        # With a blockSize, the source is read block by block and self.text only
+        # holds a window of it starting at absolute offset self._base; this
+        # works for pipes and stdin and keeps memory bounded by the block size
+        # and the longest token or comment. Otherwise the whole text is read.
+        self.source = None if blockSize is None else sourceFile
+        self.blockSize = blockSize
+        self.text = sourceFile.read() if blockSize is None else ''
         self.EOF = len(self.text)
+        self._base = 0
+        self._lineStart = 0
+        self._tokenColumn = 1
         self.traceFile = traceFile
         self.lineIndex = 1
         self.tokenString = None
         self._pointer = 0
         self.verbose = traceFile is not None if verbose is None else verbose
-        
+        self.engine = engine
+        self.token = None
+        self.scan = self.scan_regex if engine == 'regex' else self.scan_fsm
+        # Everything done with a token once it is read (recording, tracing,
+        # printing) is a consumer called with its record.
+        self.consumers = []
+        self.tokens = None
+        if record:
+            self.tokens = []
+            self.consumers.append(self.tokens.append)
+        # The trace writer buffers; flush() once scanning stops early.
+        self.traceWriter = None
+        if traceFile and traceMode != 'off':
+            self.traceWriter = TRACE_WRITERS[traceMode](traceFile)
+            self.consumers.append(self.traceWriter.write)
+        if self.verbose:
+            self.consumers.append(self.show)
+
     def check_reserve(self, tokenString: str):
         return RESERVED_WORDS.get(tokenString, TokenType.ID)
 
+    def fill(self):
+        # Reads the next block into the window, dropping consumed text except
+        # for the last character, which move_cursor_back may step back over.
+        # Reads at least as much as is still unconsumed, so a token or comment
+        # spanning many blocks is rescanned a logarithmic number of times.
+        if self.source is None:
+            return False
+        block = self.source.read(max(self.blockSize, self.EOF - self._pointer))
+        if not block:
+            self.source = None
+            return False
+        keep = max(self._pointer - 1, 0)
+        self.text = self.text[keep:] + block
+        self._base += keep
+        self._pointer -= keep
+        self.EOF = len(self.text)
+        return True
+
+    def mark_token(self, position):
+        self._tokenColumn = self._base + position - self._lineStart + 1
+        return None
+
     def get_next_char(self):
-        if self._pointer >= self.EOF:
+        if self._pointer >= self.EOF and not self.fill():
             return None
         char = self.text[self._pointer]
+        self._pointer += 1
         if char == '\n':
             self.lineIndex += 1
-        self._pointer += 1
+            self._lineStart = self._base + self._pointer
         return char
 
     def move_cursor_back(self):
@@ -56,10 +139,113 @@ class Scanner():
             self.lineIndex -= 1
         return
 
-    def save_token(self, currentToken: TokenType, tokenString: str = ''):
-        self.traceFile.write(format_token(currentToken, tokenString, self.lineIndex)+"\n")
+    def show(self, token: Token):
+        show_token(token.type, trace_lexeme(token), token.line)
+        return None
+
+    def next_token(self) -> Token:
+        currentToken = self.scan()
+        if self.tokenString:
+            # Tree nodes keep lexemes as names and attributes; share one copy per spelling.
+            self.tokenString = intern(self.tokenString)
+        self.token = Token(currentToken, self.tokenString, self.lineIndex, self._tokenColumn)
+        for consumer in self.consumers:
+            consumer(self.token)
+        if currentToken == TokenType.ENDOFFILE:
+            self.flush()
+        return self.token
+
+    def flush(self):
+        if self.traceWriter is not None:
+            self.traceWriter.flush()
+        return None
 
     def get_token(self):
+        return self.next_token().type
+
+    def token_stream(self):
+        # Yields token records up to and including ENDOFFILE.
+        while True:
+            token = self.next_token()
+            yield token
+            if token.type == TokenType.ENDOFFILE:
+                return None
+
+    def __iter__(self):
+        return self.token_stream()
+
+    def start_at(self, line, column):
+        # Numbers lines and columns as if the rest of the source began at
+        # line and column of a larger text, for scanning a piece of it.
+        self.lineIndex = line
+        self._lineStart = self._base + self._pointer - column + 1
+        return None
+
+    def scan_all(self):
+        # Scans the rest of the source into a TokenBuffer, up to and
+        # including ENDOFFILE. The regex engine, when nothing else consumes
+        # tokens, writes the buffer's columns directly without making Token
+        # records; otherwise every token goes through next_token.
+        buffer = TokenBuffer()
+        if self.engine != 'regex' or self.consumers:
+            for token in self:
+                buffer.append(token)
+            return buffer
+        while self.fill():
+            pass
+        text = self.text
+        end = self.EOF
+        skip = SKIP_PATTERN.match
+        match = TOKEN_PATTERN.match
+        stringId = buffer.string_id
+        types, lines, columns, lexemes = buffer.types, buffer.lines, buffer.columns, buffer.lexemes
+        symbols = {symbol: token.value for symbol, token in SYMBOLS.items()}
+        reserved = {word: token.value for word, token in RESERVED_WORDS.items()}
+        number, identifier, error = TokenType.NUM.value, TokenType.ID.value, TokenType.ERROR.value
+        empty = stringId('')
+        line = self.lineIndex
+        # Offset in text of the first character of the current line.
+        lineStart = self._lineStart - self._base
+        pointer = self._pointer
+        while True:
+            start = skip(text, pointer).end()
+            newlines = text.count('\n', pointer, start)
+            if newlines:
+                line += newlines
+                lineStart = text.rfind('\n', pointer, start) + 1
+            if start >= end:
+                break
+            found = match(text, start)
+            pointer = found.end()
+            group = found.lastindex
+            if group == 3:
+                types.append(symbols[found.group()])
+                lexemes.append(empty)
+            else:
+                lexeme = found.group()
+                if group == 1:
+                    types.append(number)
+                elif group == 2:
+                    types.append(reserved.get(lexeme, identifier))
+                else:
+                    types.append(error)
+                    if lexeme == '!':
+                        lexeme = text[start:pointer + 1] if pointer < end else ''
+                lexemes.append(stringId(lexeme))
+            lines.append(line)
+            columns.append(start - lineStart + 1)
+        types.append(TokenType.ENDOFFILE.value)
+        lexemes.append(empty)
+        lines.append(line)
+        columns.append(start - lineStart + 1)
+        self.lineIndex = line
+        self._lineStart = self._base + lineStart
+        self._pointer = start
+        self.tokenString = ''
+        self.token = buffer.token(len(buffer) - 1)
+        return buffer
+
+    def scan_fsm(self):
 
         self.tokenString = ''
         state = State.START
@@ -68,11 +254,14 @@ class Scanner():
             save = True
             if state == State.START:
                 if is_digit(char):
+                    self.mark_token(self._pointer - 1)
                     state = State.INNUM
                 elif is_alphabetic(char):
+                    self.mark_token(self._pointer - 1)
                     state = State.INID
                 else:
                     save = False
+                    self.mark_token(self._pointer if char is None else self._pointer - 1)
                     if char == '=':
                         state = State.INASSIGN
                     elif char == '!':
@@ -194,10 +383,53 @@ class Scanner():
                 self.tokenString += char
             if state == State.DONE and currentToken == TokenType.ID:
                 currentToken = self.check_reserve(self.tokenString)
-        if self.traceFile:
-            if self.tokenString in RESERVED_WORDS.keys():
-                self.tokenString = None
-            self.save_token(currentToken, self.tokenString)
-        if self.verbose:
-            show_token(currentToken, self.tokenString, self.lineIndex)
         return currentToken
+
+    def scan_regex(self):
+        # Same token stream as the state machine, but each token is a single
+        # match over the text and its lexeme a slice of it.
+        while True:
+            text = self.text
+            start = SKIP_PATTERN.match(text, self._pointer).end()
+            if start >= self.EOF:
+                if self.fill():
+                    continue
+                self.skip_to(start)
+                self.mark_token(start)
+                self.tokenString = ''
+                return TokenType.ENDOFFILE
+            match = TOKEN_PATTERN.match(text, start)
+            end = match.end()
+            # A match reaching the end of the window may go on in the next block.
+            if end < self.EOF or not self.fill():
+                break
+        lexeme = match.group()
+        group = match.lastindex
+        if group == 1:
+            currentToken = TokenType.NUM
+        elif group == 2:
+            currentToken = self.check_reserve(lexeme)
+        elif group == 3:
+            currentToken = SYMBOLS[lexeme]
+            lexeme = ''
+        else:
+            currentToken = TokenType.ERROR
+            if lexeme == '!':
+                # The state machine keeps the character following a lone "!".
+                lexeme = text[start:end + 1] if end < self.EOF else ''
+        self.skip_to(start)
+        self.mark_token(start)
+        self._pointer = end
+        self.tokenString = lexeme
+        return currentToken
+
+    def skip_to(self, position):
+        # Moves past whitespace and comments, which hold every newline the
+        # regex engine sees.
+        newlines = self.text.count('\n', self._pointer, position)
+        if newlines:
+            # Keep the same int object within a line; tree nodes hold on to it.
+            self.lineIndex += newlines
+            self._lineStart = self._base + self.text.rfind('\n', self._pointer, position) + 1
+        self._pointer = position
+        return None
@@ -3,24 +3,27 @@ class ScopeStack():
     class Scope():
 
         def __init__(self):
-            self.symbols = []
+            self.symbols = set()
 
         def check_symbol(self, symbol):
             return symbol in self.symbols
 
         def add_symbol(self, symbol):
-            self.symbols.append(symbol)
+            self.symbols.add(symbol)
             return None
 
         def add_symbols(self, symbols):
             for symbol in symbols:
-                self.symbols.append(symbols)
+                self.symbols.add(symbol)
             return None
 
     def __init__(self):
         self.stack = [self.Scope()]
         self.promiseSymbols = None
         self.topIndex = 0
+        # Symbol -> number of open scopes declaring it, so that a lookup
+        # through every scope is a single dict access.
+        self.visible = {}
 
     def push_scope(self):
         self.stack.append(self.Scope())
@@ -33,15 +36,24 @@ class ScopeStack():
     def pop_scope(self):
         aux = self.stack.pop(-1)
         self.topIndex -= 1
+        visible = self.visible
+        for symbol in aux.symbols:
+            if visible[symbol] == 1:
+                del visible[symbol]
+            else:
+                visible[symbol] -= 1
         return aux
 
     def add_symbol(self, symbol):
-        self.stack[-1].add_symbol(symbol)
+        scope = self.stack[-1]
+        if not scope.check_symbol(symbol):
+            scope.add_symbol(symbol)
+            self.visible[symbol] = self.visible.get(symbol, 0) + 1
         return None
 
     def add_symbols(self, symbols):
         for symbol in symbols:
-            self.stack[-1].add_symbol(symbol)
+            self.add_symbol(symbol)
         return None
 
     def add_promise(self, symbol):
@@ -53,7 +65,4 @@ class ScopeStack():
     def check_symbol(self, symbol, currentScopeOnly=False):
         if currentScopeOnly:
             return self.stack[-1].check_symbol(symbol)
-        for i in range(self.topIndex, -1, -1):
-            if self.stack[i].check_symbol(symbol):
-                return True
-        return False
+        return symbol in self.visible
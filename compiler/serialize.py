@@ -0,0 +1,317 @@
+import mmap
+import struct
+from array import array
+from sys import byteorder
+
+from .globals import TokenType, NodeKind, Token
+from .util import dumps_strings, loads_strings, array_from
+from .parser import TreeNode
+
+# Binary syntax tree layout, all integers little-endian:
+#
+#   header   magic "CMTR", version (u16), flags (u16), node count (u32), string count (u32)
+#   nodes    one record of 9 int32 per node, in pre-order (index 0 is the root)
+#   offsets  string count + 1 uint32 offsets into the string blob
+#   strings  UTF-8 blob of every distinct name and string attribute
+#
+# Node record: number, lineno, kind | attribute tag << 8 | empty mask << 16,
+# attribute, name, sibling, first child, next child, array size. Links are
+# node indexes, strings are string table indexes and NONE (-1) stands for
+# None. A kind of NO_KIND (0xFF) stands for a node without one, which the
+# parser builds for some declarations it accepts. Bit i of the empty mask marks a None child (an empty statement) at
+# position i; the child chain links the other children only.
+#
+# Token streams use the same header with magic "CMTK" and token/string
+# counts, then columns of token types (u8), lines (u32), columns (u32) and
+# lexeme string indexes (int32), then the string table.
+
+MAGIC = b'CMTR'
+TOKENS_MAGIC = b'CMTK'
+VERSION = 4
+TOKENS_VERSION = 3
+HEADER = struct.Struct('<4sHHII')
+RECORD_FIELDS = 9
+RECORD_SIZE = 4 * RECORD_FIELDS
+NONE = -1
+NO_KIND = 0xFF
+
+ATT_NONE = 0
+ATT_TOKEN = 1
+ATT_STRING = 2
+
+NUMBER, LINENO, KIND, ATTRIBUTE, NAME, SIBLING, CHILD, NEXT, SIZE = range(RECORD_FIELDS)
+
+KINDS = {kind.value: kind for kind in NodeKind}
+KINDS[NO_KIND] = None
+TOKENS = {token.value: token for token in TokenType}
+
+
+class TreeFormatError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+def flatten_tree(root):
+    # Pre-order, the same order TreePrinter writes nodes in.
+    nodes = []
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if node.sibling is not None:
+            stack.append(node.sibling)
+        stack.extend(child for child in reversed(node.children) if child is not None)
+    return nodes
+
+
+def dumps_tree(root) -> bytes:
+    nodes = flatten_tree(root)
+    index = {id(node): i for i, node in enumerate(nodes)}
+    strings = {}
+
+    def string_id(text):
+        if text is None:
+            return NONE
+        return strings.setdefault(text, len(strings))
+
+    records = array('i', [NONE]) * (len(nodes) * RECORD_FIELDS)
+    for i, node in enumerate(nodes):
+        attribute = node.attribute
+        if attribute is None:
+            tag, value = ATT_NONE, NONE
+        elif isinstance(attribute, TokenType):
+            tag, value = ATT_TOKEN, attribute.value
+        else:
+            tag, value = ATT_STRING, string_id(str(attribute))
+        children = [child for child in node.children if child is not None]
+        emptyMask = 0
+        if len(children) != len(node.children):
+            for position, child in enumerate(node.children):
+                if child is None:
+                    emptyMask |= 1 << position
+        base = i * RECORD_FIELDS
+        records[base + NUMBER] = NONE if node.number is None else node.number
+        records[base + LINENO] = NONE if node.lineno is None else node.lineno
+        records[base + KIND] = (NO_KIND if node.kind is None else node.kind.value) | tag << 8 | emptyMask << 16
+        records[base + ATTRIBUTE] = value
+        records[base + NAME] = string_id(node.name)
+        if node.size is not None:
+            records[base + SIZE] = node.size
+        if node.sibling is not None:
+            records[base + SIBLING] = index[id(node.sibling)]
+        if children:
+            records[base + CHILD] = index[id(children[0])]
+        for previous, child in zip(children, children[1:]):
+            records[index[id(previous)] * RECORD_FIELDS + NEXT] = index[id(child)]
+    if byteorder != 'little':
+        records.byteswap()
+    header = HEADER.pack(MAGIC, VERSION, 0, len(nodes), len(strings))
+    return b''.join((header, records.tobytes(), dumps_strings(strings)))
+
+
+def dumps_tokens(tokens) -> bytes:
+    types = array('B', [token.type.value for token in tokens])
+    lines = array('I', [token.line for token in tokens])
+    columns = array('I', [token.column for token in tokens])
+    strings = {}
+    lexemes = array('i', [NONE if token.lexeme is None else strings.setdefault(token.lexeme, len(strings)) for token in tokens])
+    if byteorder != 'little':
+        lines.byteswap()
+        columns.byteswap()
+        lexemes.byteswap()
+    header = HEADER.pack(TOKENS_MAGIC, TOKENS_VERSION, 0, len(tokens), len(strings))
+    return b''.join((header, types.tobytes(), lines.tobytes(), columns.tobytes(), lexemes.tobytes(), dumps_strings(strings)))
+
+
+def loads_tokens(buffer):
+    buffer = memoryview(buffer)
+    magic, version, _, count, stringCount = HEADER.unpack_from(buffer)
+    if magic != TOKENS_MAGIC:
+        raise TreeFormatError('ERROR: Not a binary token stream.')
+    if version != TOKENS_VERSION:
+        raise TreeFormatError(f"""ERROR: Unsupported binary token stream version {version}.""")
+    offset = HEADER.size
+    types = bytes(buffer[offset:offset + count])
+    offset += count
+    lines = array_from('I', buffer[offset:offset + 4 * count])
+    offset += 4 * count
+    columns = array_from('I', buffer[offset:offset + 4 * count])
+    offset += 4 * count
+    lexemes = array_from('i', buffer[offset:offset + 4 * count])
+    offset += 4 * count
+    strings = loads_strings(buffer[offset:], stringCount)
+    return [
+        Token(TOKENS[token], None if lexeme == NONE else strings[lexeme], lineno, column)
+        for token, lexeme, lineno, column in zip(types, lexemes, lines, columns)
+    ]
+
+
+def dump_tree(root, file) -> None:
+    file.write(dumps_tree(root))
+    return None
+
+
+def save_binary_tree(root, filename='output.ast') -> None:
+    with open(filename, 'wb') as file:
+        dump_tree(root, file)
+    return None
+
+
+class TreeReader():
+
+    # Reads node fields straight out of a bytes-like buffer (bytes, mmap, ...)
+    # without copying it; strings are decoded once, on first access.
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if len(self.buffer) < HEADER.size:
+            raise TreeFormatError('ERROR: Binary tree is truncated.')
+        magic, version, _, self.nodeCount, self.stringCount = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise TreeFormatError('ERROR: Not a binary tree file.')
+        if version != VERSION:
+            raise TreeFormatError(f"""ERROR: Unsupported binary tree version {version}.""")
+        nodesEnd = HEADER.size + self.nodeCount * RECORD_SIZE
+        offsetsEnd = nodesEnd + 4 * (self.stringCount + 1)
+        if len(self.buffer) < offsetsEnd:
+            raise TreeFormatError('ERROR: Binary tree is truncated.')
+        self.records = self._int_view(self.buffer[HEADER.size:nodesEnd], 'i')
+        self.offsets = self._int_view(self.buffer[nodesEnd:offsetsEnd], 'I')
+        self.blob = self.buffer[offsetsEnd:]
+        self.strings = [None] * self.stringCount
+        self._mmap = None
+        self._file = None
+
+    def _int_view(self, view, typecode):
+        if byteorder == 'little':
+            return view.cast(typecode)
+        return array_from(typecode, view)
+
+    @classmethod
+    def open(cls, filename):
+        file = open(filename, 'rb')
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            file.close()
+            raise
+        reader = cls(mapped)
+        reader._mmap, reader._file = mapped, file
+        return reader
+
+    def close(self):
+        # Every view must be released before the underlying mmap can be closed.
+        for view in (self.records, self.offsets, self.blob, self.buffer):
+            if isinstance(view, memoryview):
+                view.release()
+        self.records = self.offsets = self.blob = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def string(self, stringId):
+        if stringId == NONE:
+            return None
+        text = self.strings[stringId]
+        if text is None:
+            text = str(self.blob[self.offsets[stringId]:self.offsets[stringId + 1]], 'utf-8')
+            self.strings[stringId] = text
+        return text
+
+    def field(self, index, field):
+        value = self.records[index * RECORD_FIELDS + field]
+        return None if value == NONE else value
+
+    def kind(self, index):
+        return KINDS[self.records[index * RECORD_FIELDS + KIND] & 0xFF]
+
+    def attribute(self, index):
+        base = index * RECORD_FIELDS
+        tag = self.records[base + KIND] >> 8 & 0xFF
+        value = self.records[base + ATTRIBUTE]
+        if tag == ATT_TOKEN:
+            return TOKENS[value]
+        if tag == ATT_STRING:
+            return self.string(value)
+        return None
+
+    def name(self, index):
+        return self.string(self.records[index * RECORD_FIELDS + NAME])
+
+    def children(self, index):
+        # Indexes of the node's children, without empty (None) ones.
+        child = self.records[index * RECORD_FIELDS + CHILD]
+        while child != NONE:
+            yield child
+            child = self.records[child * RECORD_FIELDS + NEXT]
+        return None
+
+    def node(self, index):
+        return TreeNode(
+            name=self.name(index),
+            kind=self.kind(index),
+            lineno=self.field(index, LINENO),
+            attribute=self.attribute(index),
+            number=self.field(index, NUMBER),
+            size=self.field(index, SIZE)
+        )
+
+    def to_tree(self):
+        if self.nodeCount == 0:
+            return None
+        # One bulk conversion of the records, then plain list lookups per node.
+        fields = self.records.tolist()
+        strings = [self.string(i) for i in range(self.stringCount)]
+        nodes = []
+        for base in range(0, len(fields), RECORD_FIELDS):
+            number, lineno, kindTag, value, name = fields[base:base + SIBLING]
+            tag = kindTag >> 8 & 0xFF
+            if tag == ATT_TOKEN:
+                attribute = TOKENS[value]
+            elif tag == ATT_STRING:
+                attribute = strings[value]
+            else:
+                attribute = None
+            nodes.append(TreeNode(
+                name=None if name == NONE else strings[name],
+                kind=KINDS[kindTag & 0xFF],
+                lineno=None if lineno == NONE else lineno,
+                attribute=attribute,
+                number=None if number == NONE else number,
+                size=None if fields[base + SIZE] == NONE else fields[base + SIZE]
+            ))
+        for i, node in enumerate(nodes):
+            base = i * RECORD_FIELDS
+            sibling, child = fields[base + SIBLING], fields[base + CHILD]
+            emptyMask = fields[base + KIND] >> 16
+            if sibling != NONE:
+                node.sibling = nodes[sibling]
+            if child != NONE or emptyMask:
+                children = node.children = []
+                while child != NONE or emptyMask:
+                    if emptyMask & 1:
+                        children.append(None)
+                    else:
+                        children.append(nodes[child])
+                        child = fields[child * RECORD_FIELDS + NEXT]
+                    emptyMask >>= 1
+        return nodes[0]
+
+
+def load_tree(buffer):
+    with TreeReader(buffer) as reader:
+        return reader.to_tree()
+
+
+def load_binary_tree(filename='output.ast'):
+    with TreeReader.open(filename) as reader:
+        return reader.to_tree()
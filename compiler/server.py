@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .globals import COMPILER_VERSION
+from .cache import parse_source
+from .parser import ParseErrors
+from .print import TreePrinter
+
+# A long-running compile server on a Unix domain socket, so that editors and
+# build tools pay for interpreter startup and imports once. Requests and
+# responses are JSON objects, one per line; a connection may send several
+# requests without waiting, and every response carries its request's id.
+#
+#   {"id": 1, "op": "compile", "path": "/abs/file.cm", "tree": true, "engine": "fsm"}
+#   {"id": 2, "op": "compile", "source": "void main(void) { }"}
+#   {"id": 3, "op": "stats"}
+#   {"id": 4, "op": "shutdown"}
+#
+# A compile response has "ok", "nodes", "errors" (every diagnostic), "cached"
+# and, when asked for, "tree". Results are kept in memory by a hash of the
+# source and the options, and files by their mtime and size, so an unchanged
+# file is answered without reading it. Sources up to inlineBytes are parsed
+# on the event loop, which is faster than a round trip to a worker; larger
+# ones go to a pool of worker processes, at most one job per worker at once.
+
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), f'cminus-{os.getuid()}.sock')
+INLINE_BYTES = 8192
+# Longest request line accepted.
+MAX_REQUEST_BYTES = 64 * 2**20
+
+
+def compile_request(source: bytes, engine='fsm', tree=False):
+    # Runs on the event loop or in a worker process. Never raises: failures
+    # are reported in the result.
+    result = {'nodes': 0, 'errors': []}
+    try:
+        entry = parse_source(source, engine=engine, recover=True)
+        result['nodes'] = entry.nodeCount
+        if tree:
+            text = io.StringIO()
+            TreePrinter.write_tree(entry.root, text)
+            result['tree'] = text.getvalue()
+    except ParseErrors as exc:
+        result['errors'] = [str(diagnostic) for diagnostic in exc.diagnostics]
+    except Exception as exc:
+        result['errors'] = [str(exc) or type(exc).__name__]
+    return result
+
+
+class CompileServer():
+
+    def __init__(self, socketPath=SOCKET_PATH, workers=None, maxEntries=1024, inlineBytes=INLINE_BYTES):
+        self.socketPath = socketPath
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.maxEntries = maxEntries
+        self.inlineBytes = inlineBytes
+        # key -> result, least recently used first.
+        self.results = OrderedDict()
+        # path -> (mtime_ns, size, key) of the last compile of that file.
+        self.files = {}
+        # key -> future of a compile running in the pool.
+        self.pending = {}
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.executor = None
+        self.slots = None
+        self.stopped = None
+
+    async def serve(self):
+        self.stopped = asyncio.Event()
+        if self.workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.slots = asyncio.Semaphore(self.workers)
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        server = await asyncio.start_unix_server(self.handle, path=self.socketPath, limit=MAX_REQUEST_BYTES)
+        try:
+            async with server:
+                await self.stopped.wait()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+        return None
+
+    async def handle(self, reader, writer):
+        # Requests on one connection run concurrently; writes are serialized.
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line):
+            response = await self.dispatch(line)
+            async with lock:
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than MAX_REQUEST_BYTES: the rest of the stream
+                    # cannot be split into requests any more.
+                    await respond(b'{"op": "overlong"}')
+                    break
+                if not line:
+                    break
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping with the connection still open.
+            pass
+        finally:
+            writer.close()
+        return None
+
+    async def dispatch(self, line):
+        self.requests += 1
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {'id': None, 'ok': False, 'error': 'ERROR: Request is not JSON.'}
+        if not isinstance(request, dict):
+            return {'id': None, 'ok': False, 'error': 'ERROR: Request is not a JSON object.'}
+        op = request.get('op', 'compile')
+        if op == 'compile':
+            response = await self.compile(request)
+        elif op == 'stats':
+            response = {'ok': True, 'stats': self.stats()}
+        elif op == 'shutdown':
+            self.stopped.set()
+            response = {'ok': True}
+        elif op == 'overlong':
+            response = {'ok': False, 'error': f"""ERROR: Request is longer than {MAX_REQUEST_BYTES} bytes."""}
+        else:
+            response = {'ok': False, 'error': f"""ERROR: Unknown operation "{op}"."""}
+        response['id'] = request.get('id')
+        return response
+
+    async def compile(self, request):
+        engine = request.get('engine', 'fsm')
+        tree = bool(request.get('tree', False))
+        if engine not in ('fsm', 'regex'):
+            return {'ok': False, 'error': f"""ERROR: Unknown engine "{engine}"."""}
+        options = f'{engine}:{int(tree)}'
+        path = request.get('path')
+        source = request.get('source')
+        if path is not None:
+            try:
+                stat = os.stat(path)
+                known = self.files.get(path)
+                if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size) and known[2] + options in self.results:
+                    # Unchanged file, compiled before with these options.
+                    return self.cached(known[2] + options)
+                with open(path, 'rb') as sourceFile:
+                    data = sourceFile.read()
+            except OSError:
+                return {'ok': False, 'error': f"""ERROR: File {path} not found."""}
+            digest = self.digest(data)
+            self.files[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        elif isinstance(source, str):
+            data = source.encode('utf-8')
+            digest = self.digest(data)
+        else:
+            return {'ok': False, 'error': 'ERROR: A compile request needs a path or a source.'}
+        key = digest + options
+        if key in self.results:
+            return self.cached(key)
+        pending = self.pending.get(key)
+        if pending is not None:
+            # The same source is compiling for another request, whose miss
+            # it shares; a failure there is reported here too.
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    # This request itself is being cancelled.
+                    raise
+                return {'ok': False, 'error': 'ERROR: The compile of this source was cancelled.'}
+            except Exception as exc:
+                return self.failure(exc)
+            self.hits += 1
+            return dict(result, ok=True, cached=True)
+        self.misses += 1
+        if self.executor is None or len(data) <= self.inlineBytes:
+            result = compile_request(data, engine, tree)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            try:
+                async with self.slots:
+                    result = await asyncio.get_running_loop().run_in_executor(self.executor, compile_request, data, engine, tree)
+                future.set_result(result)
+            except Exception as exc:
+                future.set_exception(exc)
+                # Retrieved here, so that no waiter is needed.
+                future.exception()
+                return self.failure(exc)
+            finally:
+                # Cancelled with this request: waiters get an error response.
+                if not future.done():
+                    future.cancel()
+                del self.pending[key]
+        self.store(key, result)
+        return dict(result, ok=True, cached=False)
+
+    def failure(self, exc):
+        return {'ok': False, 'error': f"""ERROR: The compile of this source failed: {str(exc) or type(exc).__name__}."""}
+
+    def digest(self, data):
+        digest = hashlib.sha256()
+        digest.update(f'{COMPILER_VERSION}:'.encode())
+        digest.update(data)
+        return digest.hexdigest() + ':'
+
+    def cached(self, key):
+        self.hits += 1
+        self.results.move_to_end(key)
+        return dict(self.results[key], ok=True, cached=True)
+
+    def store(self, key, result):
+        self.results[key] = result
+        while len(self.results) > self.maxEntries:
+            self.results.popitem(last=False)
+        return None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.results),
+            'workers': self.workers
+        }
+
+
+def serve(socketPath=SOCKET_PATH, workers=None, maxEntries=1024):
+    return asyncio.run(CompileServer(socketPath, workers, maxEntries).serve())
+
+
+def start(args=None):
+    # python -m compiler.server [--socket PATH] [--workers N] [--max-entries N]
+    argumentParser = argparse.ArgumentParser(prog='python -m compiler.server', description='Serve compile requests on a Unix socket.')
+    argumentParser.add_argument('--socket', default=SOCKET_PATH, help=f'socket path (default: {SOCKET_PATH})')
+    argumentParser.add_argument('--workers', type=int, default=None, help='worker processes for large files, 0 for none (default: one per CPU)')
+    argumentParser.add_argument('--max-entries', type=int, default=1024, help='compile results kept in memory')
+    options = argumentParser.parse_args(args)
+    started = time.perf_counter()
+    print(f"""Serving on {options.socket}.""", flush=True)
+    try:
+        serve(options.socket, options.workers, options.max_entries)
+    except KeyboardInterrupt:
+        pass
+    print(f"""Stopped after {time.perf_counter() - started:.1f}s.""")
+    return None
+
+
+if __name__ == '__main__':
+    start()
@@ -0,0 +1,263 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+from .globals import COMPILER_VERSION, NodeKind
+from .scanner import Scanner
+from .parser import Parser, ParseErrors
+from .scope import ScopeStack
+from .print import TreePrinter
+
+# Pipeline phases in run order. Scope checking happens during parsing: its
+# time is measured around every scope operation and left out of 'parse'.
+PHASES = ('read', 'scan', 'parse', 'scope', 'output')
+
+
+class PhaseStats():
+
+    def __init__(self, name, seconds=0.0, peakBytes=None):
+        self.name = name
+        self.seconds = seconds
+        # Peak traced allocation above the phase's starting point, or None
+        # when memory was not traced.
+        self.peakBytes = peakBytes
+
+
+class CompileStats():
+
+    def __init__(self, source=None, engine='fsm'):
+        self.source = source
+        self.engine = engine
+        self.phases = {name: PhaseStats(name) for name in PHASES}
+        self.tokens = 0
+        self.nodes = 0
+        self.maxScopeDepth = 0
+        self.maxRecursionDepth = 0
+        self.error = None
+
+    @property
+    def seconds(self):
+        return sum(phase.seconds for phase in self.phases.values())
+
+    @property
+    def tokensPerSecond(self):
+        seconds = self.phases['scan'].seconds
+        return self.tokens / seconds if seconds > 0 else 0.0
+
+    @property
+    def nodesPerSecond(self):
+        seconds = self.phases['parse'].seconds + self.phases['scope'].seconds
+        return self.nodes / seconds if seconds > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'version': COMPILER_VERSION,
+            'source': self.source,
+            'engine': self.engine,
+            'error': self.error,
+            'seconds': self.seconds,
+            'phases': {
+                phase.name: {'seconds': phase.seconds, 'peakBytes': phase.peakBytes}
+                for phase in self.phases.values()
+            },
+            'tokens': self.tokens,
+            'nodes': self.nodes,
+            'tokensPerSecond': self.tokensPerSecond,
+            'nodesPerSecond': self.nodesPerSecond,
+            'maxScopeDepth': self.maxScopeDepth,
+            'maxRecursionDepth': self.maxRecursionDepth
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format(self):
+        lines = [f"""{'phase':<8}{'seconds':>12}{'peak KiB':>12}"""]
+        for phase in self.phases.values():
+            peak = '-' if phase.peakBytes is None else f'{phase.peakBytes / 1024:.1f}'
+            lines.append(f"""{phase.name:<8}{phase.seconds:>12.6f}{peak:>12}""")
+        lines.append(f"""{'total':<8}{self.seconds:>12.6f}""")
+        lines.append(f"""Tokens: {self.tokens} ({self.tokensPerSecond:.0f}/s). Nodes: {self.nodes} ({self.nodesPerSecond:.0f}/s).""")
+        lines.append(f"""Max scope depth: {self.maxScopeDepth}. Max recursion depth: {self.maxRecursionDepth}.""")
+        return '\n'.join(lines)
+
+
+class MeasuredScopeStack(ScopeStack):
+
+    # Adds the time spent in scope operations and tracks the deepest scope.
+    # Operations nested in another one (push_scope adding promised symbols)
+    # are only counted once.
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.active = False
+        super().__init__()
+        self.maxDepth = len(self.stack)
+
+    def measure(self, operation, *args):
+        if self.active:
+            return operation(self, *args)
+        self.active = True
+        start = perf_counter()
+        try:
+            return operation(self, *args)
+        finally:
+            self.seconds += perf_counter() - start
+            self.active = False
+
+    def push_scope(self):
+        self.measure(ScopeStack.push_scope)
+        self.maxDepth = max(self.maxDepth, len(self.stack))
+        return None
+
+    def pop_scope(self):
+        return self.measure(ScopeStack.pop_scope)
+
+    def add_symbol(self, symbol):
+        return self.measure(ScopeStack.add_symbol, symbol)
+
+    def add_promise(self, symbol):
+        return self.measure(ScopeStack.add_promise, symbol)
+
+    def check_symbol(self, symbol, currentScopeOnly=False):
+        return self.measure(ScopeStack.check_symbol, symbol, currentScopeOnly)
+
+
+def frame_depth():
+    # Number of frames on the caller's stack, counting the caller, probed
+    # with sys._getframe instead of walking the frames in Python.
+    depth = 1
+    while True:
+        try:
+            sys._getframe(depth * 2)
+        except ValueError:
+            break
+        depth *= 2
+    low, high = depth, depth * 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        try:
+            sys._getframe(middle)
+            low = middle
+        except ValueError:
+            high = middle
+    return low
+
+
+class MeasuredParser(Parser):
+
+    # Tracks the deepest interpreter stack seen when creating a node. A
+    # single frame probe per node finds out whether the maximum grew.
+
+    def __init__(self, scanner, recover=False):
+        super().__init__(scanner, recover=recover)
+        self.scopeStack = MeasuredScopeStack()
+        self.scopeStack.add_symbols(['input', 'output'])
+        self.baseDepth = self.maxDepth = 0
+
+    def new_node(self, name : str = None, kind : NodeKind = None, attribute=None):
+        try:
+            # Only succeeds when this frame is deeper than any seen before.
+            sys._getframe(self.maxDepth)
+        except ValueError:
+            pass
+        else:
+            self.maxDepth = frame_depth()
+        return Parser.new_node(self, name, kind, attribute)
+
+    def parse(self):
+        self.baseDepth = self.maxDepth = frame_depth()
+        return Parser.parse(self)
+
+    @property
+    def maxRecursionDepth(self):
+        return self.maxDepth - self.baseDepth
+
+
+@contextmanager
+def measure_phase(stats, name, memory):
+    phase = stats.phases[name]
+    if memory:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    start = perf_counter()
+    try:
+        yield phase
+    finally:
+        phase.seconds += perf_counter() - start
+        if memory:
+            phase.peakBytes = max(0, tracemalloc.get_traced_memory()[1] - base)
+
+
+def compile_with_stats(sourceName, traceFile=None, treeFile=None, engine='fsm', memory=True, recover=False):
+    # Runs the pipeline one phase at a time and returns a CompileStats. The
+    # whole token stream is scanned before parsing so that the two phases are
+    # timed apart. Compile errors are recorded in stats.error, not raised;
+    # with recover, that is every error found, as from parse_source.
+    # Tracing memory (tracemalloc) makes every phase noticeably slower.
+    stats = CompileStats(sourceName, engine)
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    parser = None
+    try:
+        with measure_phase(stats, 'read', memory):
+            with open(sourceName, 'rb') as sourceFile:
+                data = sourceFile.read()
+        with measure_phase(stats, 'scan', memory):
+            scanner = Scanner(io.TextIOWrapper(io.BytesIO(data)), traceFile=traceFile, verbose=False, engine=engine)
+            tokens = list(scanner)
+            scanner.flush()
+        stats.tokens = len(tokens)
+        with measure_phase(stats, 'parse', memory):
+            parser = MeasuredParser(tokens, recover=recover)
+            parser.parse()
+        if parser.diagnostics:
+            raise ParseErrors(parser.diagnostics)
+        with measure_phase(stats, 'output', memory):
+            TreePrinter.write_tree(parser.root, io.StringIO() if treeFile is None else treeFile)
+    except Exception as exc:
+        stats.error = str(exc) or type(exc).__name__
+    finally:
+        if parser is not None:
+            scope = parser.scopeStack
+            stats.nodes = parser.nodeCount
+            stats.maxScopeDepth = scope.maxDepth
+            stats.maxRecursionDepth = parser.maxRecursionDepth
+            # Scope operations ran inside the parse phase.
+            stats.phases['scope'].seconds = scope.seconds
+            stats.phases['parse'].seconds -= scope.seconds
+        if started:
+            tracemalloc.stop()
+    return stats
+
+
+def profile_call(prefix, function, *args, **kwargs):
+    # Opt-in hook: runs function under cProfile and tracemalloc, then writes
+    # prefix.prof (pstats data), prefix.profile.txt (slowest functions) and
+    # prefix.memory.txt (allocation sites holding the most memory
+    # when function returns). Returns function's result.
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(16)
+    profile = cProfile.Profile()
+    try:
+        result = profile.runcall(function, *args, **kwargs)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    profile.dump_stats(prefix + '.prof')
+    with open(prefix + '.profile.txt', 'w') as file:
+        pstats.Stats(profile, stream=file).sort_stats('cumulative').print_stats(40)
+    with open(prefix + '.memory.txt', 'w') as file:
+        for statistic in snapshot.statistics('traceback')[:20]:
+            file.write(f'{statistic}\n')
+            for line in statistic.traceback.format(limit=8):
+                file.write(f'    {line}\n')
+    return result
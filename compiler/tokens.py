@@ -0,0 +1,92 @@
+from array import array
+from sys import intern
+
+from .globals import TokenType, Token
+
+# A scanned token stream held in columns, as serialize.dumps_tokens writes
+# it: one array('B') of TokenType values, array('I') of lines and columns,
+# and array('I') of lexeme IDs into a table of distinct lexemes. Tokens are
+# addressed by index, so looking ahead or going back is reading another
+# index, and no per-token object is made unless asked for with token().
+# Positions past the end read the last token, ENDOFFILE once complete.
+#
+# Buffers pickle as their arrays and lexeme table, to be sent to or from
+# worker processes.
+
+TOKENS = list(TokenType)
+
+
+class TokenBuffer():
+
+    def __init__(self):
+        self.types = array('B')
+        self.lines = array('I')
+        self.columns = array('I')
+        self.lexemes = array('I')
+        self.strings = []
+        self.stringIds = {}
+
+    def __getstate__(self):
+        return self.types, self.lines, self.columns, self.lexemes, self.strings
+
+    def __setstate__(self, state):
+        self.types, self.lines, self.columns, self.lexemes, self.strings = state
+        self.stringIds = {string: index for index, string in enumerate(self.strings)}
+        return None
+
+    def string_id(self, lexeme):
+        # One copy of each spelling; tree nodes keep them as names.
+        stringId = self.stringIds.get(lexeme)
+        if stringId is None:
+            stringId = self.stringIds[lexeme] = len(self.strings)
+            self.strings.append(lexeme if lexeme is None else intern(lexeme))
+        return stringId
+
+    def append(self, token):
+        self.types.append(token.type.value)
+        self.lines.append(token.line)
+        self.columns.append(token.column)
+        self.lexemes.append(self.string_id(token.lexeme))
+        return None
+
+    def extend(self, other):
+        # Appends the tokens of another buffer, whose lexeme IDs index its
+        # own table.
+        ids = [self.string_id(lexeme) for lexeme in other.strings]
+        self.types.extend(other.types)
+        self.lines.extend(other.lines)
+        self.columns.extend(other.columns)
+        self.lexemes.extend(map(ids.__getitem__, other.lexemes))
+        return None
+
+    def from_tokens(tokens):
+        buffer = TokenBuffer()
+        for token in tokens:
+            buffer.append(token)
+        return buffer
+
+    def __len__(self):
+        return len(self.types)
+
+    def last(self, index):
+        # index, or the last position when index is past the end.
+        return min(index, len(self.types) - 1)
+
+    def type(self, index):
+        return TOKENS[self.types[self.last(index)]]
+
+    def line(self, index):
+        return self.lines[self.last(index)]
+
+    def lexeme(self, index):
+        return self.strings[self.lexemes[self.last(index)]]
+
+    def token(self, index):
+        index = self.last(index)
+        return Token(TOKENS[self.types[index]], self.strings[self.lexemes[index]], self.lines[index], self.columns[index])
+
+    def __iter__(self):
+        strings = self.strings
+        for token, lexeme, line, column in zip(self.types, self.lexemes, self.lines, self.columns):
+            yield Token(TOKENS[token], strings[lexeme], line, column)
+        return None
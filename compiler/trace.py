@@ -0,0 +1,189 @@
+import struct
+from array import array
+from sys import argv, byteorder, stdout
+
+from .globals import TokenType, Token, RESERVED_TOKENS
+from .util import format_token, trace_lexeme, is_binary_stream, dumps_strings, loads_strings, array_from
+
+# Token trace modes: 'off' writes nothing and adds no per-token work,
+# 'text' writes the human-readable .trace lines in chunks, and 'binary'
+# writes the compact format below.
+#
+# Binary trace layout, all integers little-endian:
+#
+#   header   magic "CMTT", version (u16), flags (u16)
+#   chunks   token count (u32), new string count (u32), long delta count (u32), then
+#            token types      token count u8
+#            line deltas      token count u8, 255 meaning "next long delta"
+#            long deltas      long delta count u32
+#            lexeme ids       u32 per ID, NUM or ERROR token
+#            new strings      string table (see util.dumps_strings)
+#
+# Lexemes are interned across the whole file: ids count up from 0 in order
+# of first appearance, and each chunk defines the strings it introduces.
+
+BINARY_MAGIC = b'CMTT'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHH')
+CHUNK_HEADER = struct.Struct('<III')
+LONG_DELTA = 255
+LEXEME_TOKENS = frozenset((TokenType.ID, TokenType.NUM, TokenType.ERROR))
+TOKENS = {token.value: token for token in TokenType}
+NAMES = {token: token.name for token in TokenType}
+CODES = {token: token.value for token in TokenType}
+
+
+class TraceFormatError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+def format_trace(tokens) -> str:
+    # Trace text for recorded tokens, as Scanner writes it.
+    return ''.join(format_token(token.type, trace_lexeme(token), token.line) + '\n' for token in tokens)
+
+
+class TextTraceWriter():
+
+    # Keeps token records and turns a whole chunk of them into the same
+    # lines as format_token at once, with a single write.
+
+    def __init__(self, file, chunkTokens=1 << 14):
+        self.file = file
+        self.binary = is_binary_stream(file)
+        self.chunkTokens = chunkTokens
+        self.tokens = []
+
+    def write(self, token: Token):
+        self.tokens.append(token)
+        if len(self.tokens) >= self.chunkTokens:
+            self.flush()
+        return None
+
+    def flush(self):
+        if self.tokens:
+            text = ''.join([
+                f'Line {line}: <{NAMES[token]}, "{lexeme}">\n' if lexeme and token not in RESERVED_TOKENS else f'Line {line}: <{NAMES[token]}>\n'
+                for token, lexeme, line, _ in self.tokens
+            ])
+            self.file.write(text.encode('utf-8') if self.binary else text)
+            self.tokens = []
+        return None
+
+
+class BinaryTraceWriter():
+
+    def __init__(self, file, chunkTokens=1 << 16):
+        self.file = file
+        self.chunkTokens = chunkTokens
+        self.strings = {}
+        self.lastLine = 0
+        self.tokens = []
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0))
+
+    def write(self, token: Token):
+        self.tokens.append(token)
+        if len(self.tokens) >= self.chunkTokens:
+            self.flush()
+        return None
+
+    def flush(self):
+        if not self.tokens:
+            return None
+        tokens, strings = self.tokens, self.strings
+        lines = [token.line for token in tokens]
+        deltas = bytearray()
+        longDeltas = array('I')
+        previous = self.lastLine
+        for line in lines:
+            delta = line - previous
+            previous = line
+            if delta < LONG_DELTA:
+                deltas.append(delta)
+            else:
+                deltas.append(LONG_DELTA)
+                longDeltas.append(delta)
+        self.lastLine = previous
+        known = len(strings)
+        lexemes = array('I', [
+            strings.setdefault(lexeme, len(strings))
+            for token, lexeme, _, _ in tokens if token in LEXEME_TOKENS
+        ])
+        newStrings = list(strings)[known:]
+        if byteorder != 'little':
+            longDeltas.byteswap()
+            lexemes.byteswap()
+        self.file.write(b''.join((
+            CHUNK_HEADER.pack(len(tokens), len(newStrings), len(longDeltas)),
+            bytes([CODES[token.type] for token in tokens]),
+            bytes(deltas),
+            longDeltas.tobytes(),
+            lexemes.tobytes(),
+            dumps_strings(newStrings)
+        )))
+        self.tokens = []
+        return None
+
+
+TRACE_MODES = ('off', 'text', 'binary')
+TRACE_WRITERS = {'text': TextTraceWriter, 'binary': BinaryTraceWriter}
+
+
+def read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise TraceFormatError('ERROR: Binary trace is truncated.')
+    return data
+
+
+def read_binary_trace(file):
+    # Yields Token records (without columns) from a binary trace opened in 'rb' mode.
+    magic, version, _ = BINARY_HEADER.unpack(read_exactly(file, BINARY_HEADER.size))
+    if magic != BINARY_MAGIC:
+        raise TraceFormatError('ERROR: Not a binary trace file.')
+    if version != BINARY_VERSION:
+        raise TraceFormatError(f"""ERROR: Unsupported binary trace version {version}.""")
+    strings = []
+    line = 0
+    while True:
+        header = file.read(CHUNK_HEADER.size)
+        if not header:
+            return None
+        if len(header) != CHUNK_HEADER.size:
+            raise TraceFormatError('ERROR: Binary trace is truncated.')
+        count, stringCount, longCount = CHUNK_HEADER.unpack(header)
+        types = read_exactly(file, count)
+        deltas = read_exactly(file, count)
+        longDeltas = iter(array_from('I', read_exactly(file, 4 * longCount)))
+        lexemeCount = sum(1 for token in types if TOKENS[token] in LEXEME_TOKENS)
+        lexemes = iter(array_from('I', read_exactly(file, 4 * lexemeCount)))
+        offsets = read_exactly(file, 4 * (stringCount + 1))
+        blob = read_exactly(file, array_from('I', offsets)[-1])
+        strings.extend(loads_strings(offsets + blob, stringCount))
+        for code, delta in zip(types, deltas):
+            token = TOKENS[code]
+            line += next(longDeltas) if delta == LONG_DELTA else delta
+            if token in LEXEME_TOKENS:
+                yield Token(token, strings[next(lexemes)], line, None)
+            else:
+                yield Token(token, '', line, None)
+
+
+def binary_trace_to_text(binaryFile, textFile):
+    writer = TextTraceWriter(textFile)
+    for token in read_binary_trace(binaryFile):
+        writer.write(token)
+    writer.flush()
+    return None
+
+
+if __name__ == '__main__':
+    # python -m compiler.trace input.btrace [output.trace]
+    if len(argv) not in (2, 3):
+        print('Usage: python -m compiler.trace input.btrace [output.trace]')
+    elif len(argv) == 2:
+        with open(argv[1], 'rb') as binaryFile:
+            binary_trace_to_text(binaryFile, stdout)
+    else:
+        with open(argv[1], 'rb') as binaryFile, open(argv[2], 'w') as textFile:
+            binary_trace_to_text(binaryFile, textFile)
@@ -0,0 +1,457 @@
+import builtins
+import hashlib
+import marshal
+import os
+import struct
+import sys
+from importlib.util import MAGIC_NUMBER
+
+from .globals import COMPILER_VERSION, TokenType, NodeKind
+from .cache import ParseCache, parse_source
+from .interpreter import ExecutionError, Console
+from .optimize import PassManager
+
+# Translates the syntax tree to Python source and compiles it to a code
+# object, so that programs run as ordinary Python functions. Names get a
+# prefix (g_ globals, f_ functions, v_ locals and parameters, numbered when
+# an inner block redeclares one), global arrays are preallocated lists and
+# every local is bound to 0 on entry, as in the other backends.
+#
+# Division goes through _div, truncating toward zero. Indexes are checked
+# for being negative (a Python list would count from its end); the list
+# itself checks the upper bound. Errors are mapped back to the C-Minus line
+# through the line recorded for every generated line.
+
+FILENAME = '<c-minus>'
+TRANSLATE_VERSION = 2
+
+# Python precedence of generated expressions, loosest first.
+CONDITIONAL, COMPARISON, SUM, PRODUCT, ATOM = range(5)
+
+PYTHON_OPERATORS = {
+    TokenType.PLUS: ('+', SUM), TokenType.MINUS: ('-', SUM), TokenType.TIMES: ('*', PRODUCT),
+    TokenType.LT: ('<', COMPARISON), TokenType.LTEQ: ('<=', COMPARISON), TokenType.GT: ('>', COMPARISON),
+    TokenType.GTEQ: ('>=', COMPARISON), TokenType.COMP: ('==', COMPARISON), TokenType.DIFF: ('!=', COMPARISON)
+}
+
+
+def _div(a, b):
+    quotient = a // b
+    if quotient < 0 and quotient * b != a:
+        quotient += 1
+    return quotient
+
+
+def _negative(index):
+    raise IndexError(index)
+
+
+def _store(array, index, value):
+    # Element assignment used as a value; evaluates like the other backends:
+    # array, index, then value.
+    if index < 0:
+        raise IndexError(index)
+    array[index] = value
+    return value
+
+
+class Translator():
+
+    def __init__(self):
+        self.lines = []
+        # C-Minus line of every generated line.
+        self.sourceLines = []
+        self.scopes = [{'input': ('builtin', '_input'), 'output': ('builtin', '_output')}]
+        self.lineno = 0
+        self.indent = 0
+        # Per function: every local's Python name, the globals it assigns
+        # and the depth of nested index temporaries.
+        self.locals = None
+        self.assignedGlobals = None
+        self.temps = 0
+
+    def emit(self, text):
+        self.lines.append('    ' * self.indent + text)
+        self.sourceLines.append(self.lineno)
+        return None
+
+    def lookup(self, name, lineno):
+        for scope in reversed(self.scopes):
+            symbol = scope.get(name)
+            if symbol is not None:
+                return symbol
+        raise ExecutionError(f"""ERROR: Runtime Error. Symbol "{name}" at line {lineno} has not been declared.""")
+
+    def declare_local(self, name, kind):
+        # A Python name not used yet in this function.
+        python = 'v_' + name
+        count = 1
+        while python in self.locals:
+            python = f'v_{name}_{count}'
+            count += 1
+        self.locals.append(python)
+        self.scopes[-1][name] = (kind, python)
+        return python
+
+    def translate(self, root) -> str:
+        node = root
+        while node is not None:
+            self.lineno = node.lineno
+            if node.kind == NodeKind.FUN_DECLARATION:
+                self.function(node)
+            elif node.size is not None:
+                self.scopes[0][node.name] = ('array', 'g_' + node.name)
+                self.emit(f'g_{node.name} = [0] * {node.size}')
+            else:
+                self.scopes[0][node.name] = ('global', 'g_' + node.name)
+                self.emit(f'g_{node.name} = 0')
+            node = node.sibling
+        if self.scopes[0].get('main', (None,))[0] != 'function':
+            raise ExecutionError('ERROR: Runtime Error. The program has no main function.')
+        return '\n'.join(self.lines) + '\n'
+
+    def function(self, node):
+        params = []
+        body = None
+        for child in node.children:
+            if child.kind == NodeKind.PARAM_LIST:
+                params = [param for param in child.children if param.attribute != TokenType.VOID]
+            elif child.kind == NodeKind.COMPOUND_STMT:
+                body = child
+        self.scopes[0][node.name] = ('function', 'f_' + node.name, len(params))
+        self.locals = []
+        self.assignedGlobals = set()
+        self.scopes.append({})
+        names = [self.declare_local(param.name, 'local') for param in params]
+        self.emit(f'def f_{node.name}({", ".join(names)}):')
+        self.indent += 1
+        start = len(self.lines)
+        self.compound(body, ownScope=False)
+        self.lineno = node.lineno
+        if not self.lines[-1].startswith('    ' * self.indent + 'return '):
+            self.emit('return 0')
+        # Locals and global declarations go first, now that they are known.
+        prologue = []
+        if self.assignedGlobals:
+            prologue.append('global ' + ', '.join(sorted(self.assignedGlobals)))
+        declared = self.locals[len(names):]
+        if declared:
+            prologue.append(' = '.join(declared) + ' = 0')
+        self.lines[start:start] = ['    ' * self.indent + line for line in prologue]
+        self.sourceLines[start:start] = [node.lineno] * len(prologue)
+        self.indent -= 1
+        self.scopes.pop()
+        self.emit('')
+        return None
+
+    # Statements
+
+    def compound(self, node, ownScope=True):
+        start = len(self.lines)
+        if ownScope:
+            self.scopes.append({})
+        for child in node.children:
+            if child is None:
+                continue
+            if child.kind == NodeKind.VAR_DECLARATION:
+                declaration = child
+                while declaration is not None:
+                    self.lineno = declaration.lineno
+                    if declaration.size is not None:
+                        # Local arrays have no length: an empty list.
+                        self.emit(f'{self.declare_local(declaration.name, "localArray")} = []')
+                    else:
+                        self.declare_local(declaration.name, 'local')
+                    declaration = declaration.sibling
+            else:
+                statement = child
+                while statement is not None:
+                    self.statement(statement)
+                    statement = statement.sibling
+        if ownScope:
+            self.scopes.pop()
+        if len(self.lines) == start:
+            self.emit('pass')
+        return None
+
+    def block(self, node):
+        self.indent += 1
+        if node is None:
+            self.emit('pass')
+        elif node.kind == NodeKind.COMPOUND_STMT:
+            self.compound(node)
+        else:
+            self.statement(node)
+        self.indent -= 1
+        return None
+
+    def statement(self, node):
+        self.lineno = node.lineno
+        kind = node.kind
+        if kind == NodeKind.COMPOUND_STMT:
+            self.compound(node)
+        elif kind == NodeKind.SELECTION_STMT:
+            self.emit(f'if {self.condition(node.children[0])}:')
+            self.block(node.children[1])
+            if len(node.children) > 2 and node.children[2] is not None:
+                self.lineno = node.lineno
+                self.emit('else:')
+                self.block(node.children[2])
+        elif kind == NodeKind.ITERATION_STMT:
+            self.emit(f'while {self.condition(node.children[0])}:')
+            self.block(node.children[1])
+        elif kind == NodeKind.RETURN_STMT:
+            self.emit(f'return {self.value(node.children[0], CONDITIONAL) if node.children else 0}')
+        elif kind == NodeKind.ASSIGN:
+            self.assignment_statement(node)
+        else:
+            self.emit(self.value(node, CONDITIONAL))
+        return None
+
+    def assignment_statement(self, node):
+        kind, python = self.variable(node)
+        if len(node.children) == 1:
+            value = node.children[0]
+            targets = [python]
+            # a = b = c: a chain of scalar assignments is one Python statement.
+            while value.kind == NodeKind.ASSIGN and len(value.children) == 1:
+                targets.append(self.variable(value)[1])
+                value = value.children[0]
+            self.emit(' = '.join(targets) + ' = ' + self.value(value, CONDITIONAL))
+            return None
+        indexNode, valueNode = node.children
+        if indexNode.kind != NodeKind.NUM and (self.writes(indexNode) or self.writes(valueNode)):
+            # Python evaluates the value before the target's index, and
+            # either may change what the other reads.
+            self.emit(f'_t = {self.value(indexNode, CONDITIONAL)}')
+            self.emit(f'{python}[{self.checked("_t")}] = {self.value(valueNode, CONDITIONAL)}')
+        else:
+            self.emit(f'{python}[{self.index(indexNode)}] = {self.value(valueNode, CONDITIONAL)}')
+        return None
+
+    # Expressions
+
+    def variable(self, node):
+        kind, python = self.lookup(node.name, node.lineno)[:2]
+        if kind == 'global':
+            self.assignedGlobals.add(python)
+        elif kind in ('function', 'builtin'):
+            raise ExecutionError(f"""ERROR: Runtime Error. Cannot assign to "{node.name}" at line {node.lineno}.""")
+        return kind, python
+
+    def writes(self, node):
+        # Whether evaluating node may assign variables: an assignment or a
+        # call of a declared function (input and output do not).
+        if node.kind == NodeKind.ASSIGN:
+            return True
+        if node.kind in (NodeKind.VAR_REF, NodeKind.CALL) and self.lookup(node.name, node.lineno)[0] == 'function':
+            return True
+        return any(child is not None and self.writes(child) for child in node.children)
+
+    def temp(self):
+        self.temps += 1
+        return f'_i{self.temps}'
+
+    def checked(self, name):
+        return f'{name} if {name} >= 0 else _negative({name})'
+
+    def index(self, node):
+        # An index expression that fails when negative.
+        if node.kind == NodeKind.NUM and int(node.attribute) >= 0:
+            return node.attribute
+        if node.kind == NodeKind.VAR_REF and not node.children and self.lookup(node.name, node.lineno)[0] in ('local', 'global'):
+            return self.checked(self.value(node, ATOM))
+        temp = self.temp()
+        text = f'{temp} if ({temp} := {self.value(node, CONDITIONAL)}) >= 0 else _negative({temp})'
+        self.temps -= 1
+        return text
+
+    def condition(self, node):
+        # Comparisons are used as they are; anything else by its truth.
+        if node.kind == NodeKind.RELOP:
+            return self.binary(node, CONDITIONAL)
+        return self.value(node, CONDITIONAL)
+
+    def value(self, node, context):
+        # Python text for node's value, parenthesized when it binds more
+        # loosely than context requires.
+        text, precedence = self.expression(node)
+        return f'({text})' if precedence < context else text
+
+    def expression(self, node):
+        kind = node.kind
+        if kind == NodeKind.NUM:
+            return node.attribute, ATOM if int(node.attribute) >= 0 else PRODUCT
+        if kind == NodeKind.RELOP:
+            return f'1 if {self.binary(node, CONDITIONAL)} else 0', CONDITIONAL
+        if kind == NodeKind.ADDOP or kind == NodeKind.MULOP:
+            if node.attribute == TokenType.OVER:
+                return f'_div({self.value(node.children[0], CONDITIONAL)}, {self.value(node.children[1], CONDITIONAL)})', ATOM
+            return self.binary(node, CONDITIONAL), PYTHON_OPERATORS[node.attribute][1]
+        if kind == NodeKind.ASSIGN:
+            return self.assignment(node)
+        return self.reference(node)
+
+    def binary(self, node, context):
+        operator, precedence = PYTHON_OPERATORS[node.attribute]
+        # Operators are left-associative: the right operand needs parentheses
+        # at the same precedence, and comparisons never chain.
+        left = self.value(node.children[0], precedence + (precedence == COMPARISON))
+        right = self.value(node.children[1], precedence + 1)
+        return f'{left} {operator} {right}'
+
+    def assignment(self, node):
+        kind, python = self.variable(node)
+        if len(node.children) == 1:
+            return f'({python} := {self.value(node.children[0], CONDITIONAL)})', ATOM
+        index = self.value(node.children[0], CONDITIONAL)
+        return f'_store({python}, {index}, {self.value(node.children[1], CONDITIONAL)})', ATOM
+
+    def reference(self, node):
+        symbol = self.lookup(node.name, node.lineno)
+        kind, python = symbol[:2]
+        if kind in ('function', 'builtin'):
+            # The parser makes a call without arguments inside an expression
+            # a plain VAR_REF, so calls are told apart by what the name is.
+            args = node.children[0].children if node.children else []
+            if kind == 'function' and len(args) != symbol[2]:
+                raise ExecutionError(f"""ERROR: Runtime Error. Function "{node.name}" at line {node.lineno} takes {symbol[2]} arguments, not {len(args)}.""")
+            if kind == 'builtin' and len(args) != (0 if node.name == 'input' else 1):
+                raise ExecutionError(f"""ERROR: Runtime Error. {node.name}() takes {0 if node.name == 'input' else 1} arguments at line {node.lineno}.""")
+            return f'{python}({", ".join(self.value(arg, CONDITIONAL) for arg in args)})', ATOM
+        if node.children:
+            return f'{python}[{self.index(node.children[0])}]', ATOM
+        return python, ATOM
+
+
+class PythonProgram():
+
+    def __init__(self, code, sourceLines):
+        self.code = code
+        self.sourceLines = sourceLines
+
+    def run(self, inputs=None, write=None, recursionLimit=20000):
+        # inputs: numbers for input() (default: stdin); write: called with
+        # every output() value (default: print). Returns main's result.
+        console = Console(inputs, write)
+        read, output = console.read, console.write
+
+        def _output(value):
+            output(value)
+            return 0
+
+        namespace = {
+            '__builtins__': builtins,
+            '_input': read,
+            '_output': _output,
+            '_div': _div,
+            '_negative': _negative,
+            '_store': _store
+        }
+        previousLimit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previousLimit, recursionLimit))
+        try:
+            exec(self.code, namespace)
+            return namespace['f_main']()
+        except (IndexError, TypeError) as exc:
+            raise ExecutionError(f"""ERROR: Runtime Error. Index out of bounds at line {self.line(exc)}.""") from None
+        except ZeroDivisionError as exc:
+            raise ExecutionError(f"""ERROR: Runtime Error. Division by zero at line {self.line(exc)}.""") from None
+        except RecursionError:
+            raise ExecutionError('ERROR: Runtime Error. Too many nested calls.') from None
+        except StopIteration:
+            raise ExecutionError('ERROR: Runtime Error. input() reached the end of the input.') from None
+        finally:
+            sys.setrecursionlimit(previousLimit)
+
+    def line(self, exc):
+        # C-Minus line of the innermost generated frame in the traceback.
+        line = 0
+        traceback = exc.__traceback__
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == FILENAME:
+                line = self.sourceLines[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+        return line
+
+
+def translate(root) -> str:
+    return Translator().translate(root)
+
+
+def compile_python(root) -> PythonProgram:
+    translator = Translator()
+    source = translator.translate(root)
+    try:
+        code = compile(source, FILENAME, 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        # Python limits how deeply blocks and expressions nest.
+        raise ExecutionError('ERROR: Runtime Error. The program nests too deeply to translate to Python.') from None
+    return PythonProgram(code, translator.sourceLines)
+
+
+# Cache entry file: magic "CMPY", then the marshaled (code, source lines).
+# marshal data only loads in the Python version that wrote it, which is
+# part of the key.
+CODE_MAGIC = b'CMPY'
+CODE_HEADER = struct.Struct('<4s')
+
+
+class CodeCache(ParseCache):
+
+    # Compiled programs on disk, keyed by a hash of the source bytes, the
+    # optimization level and the compiler and Python versions.
+
+    suffix = '.cmpy'
+
+    def key(self, source: bytes, level=1) -> str:
+        digest = hashlib.sha256()
+        digest.update(f'{COMPILER_VERSION}:{TRANSLATE_VERSION}:{MAGIC_NUMBER.hex()}:{level}:'.encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, source: bytes, level=1):
+        key = self.key(source, level)
+        if key in self.entries:
+            try:
+                with open(self.path(key), 'rb') as file:
+                    data = file.read()
+                if data[:CODE_HEADER.size] == CODE_MAGIC:
+                    code, sourceLines = marshal.loads(data[CODE_HEADER.size:])
+                    self.entries.move_to_end(key)
+                    os.utime(self.path(key))
+                    self.hits += 1
+                    return PythonProgram(code, sourceLines)
+            except Exception:
+                pass
+            self.remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, source: bytes, program: PythonProgram, level=1):
+        data = CODE_HEADER.pack(CODE_MAGIC) + marshal.dumps((program.code, tuple(program.sourceLines)))
+        return self.store(self.key(source, level), data)
+
+
+def compile_source(source: bytes, cache=None, level=1) -> PythonProgram:
+    # Parses, optimizes and translates source, or loads the result from a
+    # CodeCache. Parse errors propagate, as from parse_source.
+    if cache is not None:
+        program = cache.get(source, level)
+        if program is not None:
+            return program
+    root = PassManager(level).run(parse_source(source, recover=True).root)
+    program = compile_python(root)
+    if cache is not None:
+        cache.put(source, program, level)
+    return program
+
+
+if __name__ == '__main__':
+    # python -m compiler.translate input.cm
+    # Prints the generated Python source.
+    if len(sys.argv) != 2:
+        print('Usage: python -m compiler.translate input.cm')
+    else:
+        with open(sys.argv[1], 'rb') as sourceFile:
+            print(translate(parse_source(sourceFile.read()).root), end='')
@@ -1,4 +1,8 @@
-from .globals import TokenType, NodeKind
+import io
+from array import array
+from sys import byteorder
+
+from .globals import TokenType, NodeKind, RESERVED_TOKENS
 
 
 def is_digit(char: str) -> bool:
@@ -18,16 +22,48 @@ def format_token(currentToken: TokenType, tokenString: str = '', lineno: int = N
         return f'''Line {lineno}: <{currentToken.name}>'''
     return f'''<{currentToken.name}>'''
 
+def trace_lexeme(token) -> str:
+    # Reserved words are traced, and named in the tree, by their type only.
+    return None if token.type in RESERVED_TOKENS else token.lexeme
+
 def show_token(currentToken: TokenType, tokenString: str = '', lineno: int = None) -> None:
     print(format_token(currentToken, tokenString, lineno))
     return
 
-def IDGenerator(max_id=10**3):
+def IDGenerator(max_id=None):
     counter = 0
-    while counter < max_id:
+    while max_id is None or counter < max_id:
         counter += 1
         yield counter
     return None
 
+def is_binary_stream(stream) -> bool:
+    if isinstance(stream, io.TextIOBase):
+        return False
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return 'b' in getattr(stream, 'mode', '')
+
+def dumps_strings(strings) -> bytes:
+    blob = bytearray()
+    offsets = array('I', [0])
+    for text in strings:
+        blob += text.encode('utf-8')
+        offsets.append(len(blob))
+    if byteorder != 'little':
+        offsets.byteswap()
+    return offsets.tobytes() + bytes(blob)
+
+def array_from(typecode, buffer):
+    values = array(typecode)
+    values.frombytes(buffer)
+    if byteorder != 'little':
+        values.byteswap()
+    return values
+
+def loads_strings(buffer, count):
+    offsets = array_from('I', buffer[:4 * (count + 1)])
+    blob = bytes(buffer[4 * (count + 1):4 * (count + 1) + offsets[-1]])
+    return [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(count)]
 
 
@@ -0,0 +1,199 @@
+from sys import argv
+
+from .interpreter import ExecutionError, Console
+from .bytecode import (
+    MOVE, LOADI, LOADK, GETG, SETG, GETE, SETE, ADD, SUB, MUL, DIV, ADDI,
+    LT, LTEQ, GT, GTEQ, COMP, DIFF, JUMP, JUMPT, JUMPF,
+    JLT, JLTEQ, JGT, JGTEQ, JCOMP, JDIFF, CALL, RET, RET0, INPUT, OUTPUT,
+    BytecodeFormatError, load_bytecode
+)
+
+# Runs Bytecode in one loop. The packed code is turned once into a list of
+# (op, a, b, c) tuples, so that decoding an instruction is a single tuple
+# unpack that creates no objects. Calls push the caller's (pc, registers,
+# result register) on a frame stack instead of recursing in Python.
+#
+# Dispatch compares op against the opcodes, most frequent first; a table of
+# handler functions would add a Python call to every instruction.
+
+MAX_FRAMES = 1 << 16
+
+
+class CountingInstructions(list):
+
+    # Stands in for the instruction list to count executed instructions,
+    # so that the normal loop pays nothing for counting.
+
+    def __init__(self, instructions):
+        super().__init__(instructions)
+        self.count = 0
+
+    def __getitem__(self, index):
+        self.count += 1
+        return list.__getitem__(self, index)
+
+
+class VM():
+
+    def __init__(self, program):
+        self.program = program
+        code = program.code
+        self.instructions = [tuple(code[i:i + 4]) for i in range(0, len(code), 4)]
+        self.functions = [(info.entry, info.params, info.registers) for info in program.functions]
+        # Cells per address: an array's length at its first cell, 0 elsewhere.
+        self.lengths = [0] * program.memorySize
+        for address, length in program.arrays:
+            self.lengths[address] = length
+
+    def run(self, inputs=None, write=None, maxFrames=MAX_FRAMES):
+        # inputs: numbers for input() (default: stdin); write: called with
+        # every output() value (default: print). Returns main's result.
+        console = Console(inputs, write)
+        read, write = console.read, console.write
+        instructions = self.instructions
+        functions = self.functions
+        constants = self.program.constants
+        lengths = self.lengths
+        memory = [0] * self.program.memorySize
+        frames = []
+        pc, _, size = functions[self.program.main]
+        registers = [0] * size
+        try:
+            while True:
+                op, a, b, c = instructions[pc]
+                pc += 1
+                if op == GETE:
+                    base = registers[b]
+                    index = registers[c]
+                    if index < 0 or index >= lengths[base]:
+                        raise ExecutionError(f"""ERROR: Runtime Error. Index out of bounds at line {self.line(pc)}.""")
+                    registers[a] = memory[base + index]
+                elif op == ADDI:
+                    registers[a] = registers[b] + c
+                elif op == JLT:
+                    if registers[a] < registers[b]:
+                        pc = c
+                elif op == MOVE:
+                    registers[a] = registers[b]
+                elif op == JGTEQ:
+                    if registers[a] >= registers[b]:
+                        pc = c
+                elif op == SETE:
+                    base = registers[a]
+                    index = registers[b]
+                    if index < 0 or index >= lengths[base]:
+                        raise ExecutionError(f"""ERROR: Runtime Error. Index out of bounds at line {self.line(pc)}.""")
+                    memory[base + index] = registers[c]
+                elif op == LOADI:
+                    registers[a] = b
+                elif op == ADD:
+                    registers[a] = registers[b] + registers[c]
+                elif op == SUB:
+                    registers[a] = registers[b] - registers[c]
+                elif op == MUL:
+                    registers[a] = registers[b] * registers[c]
+                elif op == JUMP:
+                    pc = a
+                elif op == JLTEQ:
+                    if registers[a] <= registers[b]:
+                        pc = c
+                elif op == JGT:
+                    if registers[a] > registers[b]:
+                        pc = c
+                elif op == JCOMP:
+                    if registers[a] == registers[b]:
+                        pc = c
+                elif op == JDIFF:
+                    if registers[a] != registers[b]:
+                        pc = c
+                elif op == GETG:
+                    registers[a] = memory[b]
+                elif op == SETG:
+                    memory[a] = registers[b]
+                elif op == CALL:
+                    if len(frames) >= maxFrames:
+                        raise RecursionError
+                    frames.append((pc, registers, a))
+                    pc, params, size = functions[b]
+                    callee = [0] * size
+                    callee[:params] = registers[c:c + params]
+                    registers = callee
+                elif op == RET or op == RET0:
+                    result = registers[a] if op == RET else 0
+                    if not frames:
+                        return result
+                    pc, registers, target = frames.pop()
+                    registers[target] = result
+                elif op == DIV:
+                    dividend, divisor = registers[b], registers[c]
+                    if divisor == 0:
+                        raise ZeroDivisionError
+                    quotient = dividend // divisor
+                    if quotient < 0 and quotient * divisor != dividend:
+                        quotient += 1
+                    registers[a] = quotient
+                elif op == JUMPT:
+                    if registers[a]:
+                        pc = b
+                elif op == JUMPF:
+                    if not registers[a]:
+                        pc = b
+                elif op == LT:
+                    registers[a] = 1 if registers[b] < registers[c] else 0
+                elif op == LTEQ:
+                    registers[a] = 1 if registers[b] <= registers[c] else 0
+                elif op == GT:
+                    registers[a] = 1 if registers[b] > registers[c] else 0
+                elif op == GTEQ:
+                    registers[a] = 1 if registers[b] >= registers[c] else 0
+                elif op == COMP:
+                    registers[a] = 1 if registers[b] == registers[c] else 0
+                elif op == DIFF:
+                    registers[a] = 1 if registers[b] != registers[c] else 0
+                elif op == LOADK:
+                    registers[a] = constants[b]
+                elif op == INPUT:
+                    registers[a] = read()
+                elif op == OUTPUT:
+                    write(registers[a])
+                else:
+                    raise ExecutionError(f"""ERROR: Runtime Error. Unknown opcode {op} at instruction {pc - 1}.""")
+        except IndexError:
+            # Array bounds are checked above: this is a register, constant,
+            # function, memory or jump operand out of range.
+            raise BytecodeFormatError(f"""ERROR: Malformed bytecode at instruction {pc - 1}.""") from None
+        except ZeroDivisionError:
+            raise ExecutionError(f"""ERROR: Runtime Error. Division by zero at line {self.line(pc)}.""") from None
+        except RecursionError:
+            raise ExecutionError(f"""ERROR: Runtime Error. Too many nested calls at line {self.line(pc)}.""") from None
+        except StopIteration:
+            raise ExecutionError('ERROR: Runtime Error. input() reached the end of the input.') from None
+
+    def count(self, inputs=None, write=None):
+        # Runs the program once more and returns how many instructions ran.
+        instructions = self.instructions
+        self.instructions = counting = CountingInstructions(instructions)
+        try:
+            self.run(inputs, write)
+        finally:
+            self.instructions = instructions
+        return counting.count
+
+    def line(self, pc):
+        # Source line of the instruction before pc, the one that failed.
+        return self.program.lines[pc - 1]
+
+
+def run_bytecode(program, inputs=None, write=None):
+    return VM(program).run(inputs, write)
+
+
+if __name__ == '__main__':
+    # python -m compiler.vm program.cmbc
+    if len(argv) != 2:
+        print('Usage: python -m compiler.vm program.cmbc')
+    else:
+        try:
+            run_bytecode(load_bytecode(argv[1]))
+        except (ExecutionError, BytecodeFormatError) as exc:
+            print(exc.message)
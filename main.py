@@ -1,45 +1,158 @@
-from compiler.scanner import Scanner
-from compiler.parser import Parser
+from compiler.trace import format_trace
 from compiler.print import TreePrinter
+from compiler.cache import ParseCache, parse_source
+from compiler.batch import collect_sources, compile_batch, format_summary
+from compiler.stats import compile_with_stats, profile_call
+from compiler.interpreter import compile_program, ExecutionError
+from compiler.bytecode import compile_bytecode
+from compiler.vm import run_bytecode
+from compiler.optimize import PassManager
+from compiler.translate import CodeCache, compile_python
+from compiler.server import start as start_server
 from sys import argv
 
+import argparse
+import io
 import os
 
 OUT_DIR = os.path.join(os.getcwd(), 'examples')
 CM_DIR = os.path.join(OUT_DIR, 'cms')
 TRACE_DIR = os.path.join(OUT_DIR, 'traces')
 TREE_DIR = os.path.join(OUT_DIR, 'trees')
+CACHE_DIR = os.path.join(os.getcwd(), '.cmcache')
+
+def write_if_changed(filename, text):
+    try:
+        with open(filename, 'r') as file:
+            if file.read() == text:
+                return False
+    except OSError:
+        pass
+    with open(filename, 'w') as file:
+        file.write(text)
+    return True
+
+def batch(args):
+    # main.py --batch [--workers N] [--out DIR] [--engine fsm|regex] [--trace off|text|binary] PATH|DIR|GLOB|@LIST ...
+    argumentParser = argparse.ArgumentParser(prog='main.py --batch', description='Compile many cm files in a process pool.')
+    argumentParser.add_argument('sources', nargs='+', help='cm files, directories, glob patterns or @files listing them')
+    argumentParser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    argumentParser.add_argument('--out', default=None, help='directory for trace and tree files (default: next to each source)')
+    argumentParser.add_argument('--engine', choices=('fsm', 'regex'), default='fsm', help='scanner engine')
+    argumentParser.add_argument('--trace', choices=('off', 'text', 'binary'), default='text', help='token trace output (binary traces are .btrace files)')
+    options = argumentParser.parse_args(args)
+    sources = collect_sources(options.sources)
+    if not sources:
+        print('ERROR: File not found.')
+        return None
+    summary = compile_batch(sources, workers=options.workers, outDir=options.out, engine=options.engine, traceMode=options.trace)
+    print(format_summary(summary))
+    return summary
+
+def compile_stats(source, traceName, treeName, options):
+    # Uncached run, one phase at a time, reporting what each phase cost. The
+    # source is scanned to the end before parsing, so the trace is complete
+    # even when parsing fails.
+    tree = io.StringIO()
+    with open(traceName, 'w') as traceFile:
+        if options.profile:
+            stats = profile_call(options.profile, compile_with_stats, source, traceFile=traceFile, treeFile=tree, recover=True)
+        else:
+            stats = compile_with_stats(source, traceFile=traceFile, treeFile=tree, recover=True)
+    if stats.error is None:
+        write_if_changed(treeName, tree.getvalue())
+    if options.stats_json:
+        # Nothing but the JSON document, which also holds any error.
+        print(stats.to_json())
+        return stats
+    if stats.error is not None:
+        print(stats.error)
+    else:
+        print(f"""Number of created nodes: {stats.nodes}.""")
+    if options.stats:
+        print(stats.format())
+    return stats
+
+def run(root, data, options):
+    # Prints each output() value; input() reads one number per line. The
+    # tree is optimized in place, after its tree file has been written.
+    passes = PassManager(options.level)
+    root = passes.run(root)
+    if options.opt_report:
+        print(passes.format())
+    try:
+        if options.backend == 'vm':
+            run_bytecode(compile_bytecode(root))
+        elif options.backend == 'python':
+            # Compiled code objects are cached next to the parse cache.
+            codeCache = CodeCache(CACHE_DIR)
+            program = codeCache.get(data, options.level)
+            if program is None:
+                program = compile_python(root)
+                codeCache.put(data, program, options.level)
+            program.run()
+        else:
+            compile_program(root).run()
+    except ExecutionError as exc:
+        print(exc.message)
+    return None
 
 def start():
-    if len(argv) == 2:
-        source = argv[1]
+    if len(argv) > 1 and argv[1] == '--batch':
+        return batch(argv[2:])
+    if len(argv) > 1 and argv[1] == '--serve':
+        # main.py --serve [--socket PATH] [--workers N] [--max-entries N]
+        return start_server(argv[2:])
+    # main.py [--stats | --stats-json] [--profile PREFIX] [--run [--backend NAME] [-O LEVEL] [--opt-report]] [file.cm]
+    argumentParser = argparse.ArgumentParser(prog='main.py', description='Compile a cm file from examples/cms.')
+    argumentParser.add_argument('source', nargs='?', help='cm file name, relative to examples/cms')
+    argumentParser.add_argument('--stats', action='store_true', help='print time and peak memory per phase')
+    argumentParser.add_argument('--stats-json', action='store_true', help='print the stats as a JSON document only')
+    argumentParser.add_argument('--profile', default=None, metavar='PREFIX', help='run under cProfile and tracemalloc, writing PREFIX.prof, PREFIX.profile.txt and PREFIX.memory.txt')
+    argumentParser.add_argument('--run', action='store_true', help='run the program after compiling it, reading input() from stdin')
+    argumentParser.add_argument('--backend', choices=('closures', 'vm', 'python'), default='closures', help='with --run, run the program as closures, as bytecode on the VM or translated to Python (default: closures)')
+    argumentParser.add_argument('--vm', dest='backend', action='store_const', const='vm', help='same as --backend vm')
+    argumentParser.add_argument('-O', dest='level', type=int, choices=(0, 1, 2), default=1, help='with --run, optimization level (default: 1)')
+    argumentParser.add_argument('--opt-report', action='store_true', help='with --run, print the nodes each optimization pass removed')
+    options = argumentParser.parse_args(argv[1:])
+    if options.source is not None:
+        source = options.source
     else:
         source = input('Enter a cm file [filename.cm]: ')
     try:
         path = os.path.join(CM_DIR, source)
-        sourceFile = open(path, 'r')
+        with open(path, 'rb') as sourceFile:
+            data = sourceFile.read()
     except Exception:
         print('ERROR: File not found.')
         return
-    traceFile = open(os.path.join(TRACE_DIR, source[:-3]) + '.trace', 'w')
-    scanner = Scanner(sourceFile=sourceFile, traceFile=traceFile, verbose=False)
-    parser = Parser(scanner)
-    try:
-        parser.parse()
-        # TreePrinter.show_tree(parser.root)
-        TreePrinter.save_tree(parser.root, filename=os.path.join(TREE_DIR, source[:-3])+'.tree')
-        print(f"""Number of created nodes: {parser.nodeCount}.""")
-    except Exception as exc:
-        print(exc)
-    finally:
-        sourceFile.close()
-        traceFile.close()
+    traceName = os.path.join(TRACE_DIR, source[:-3]) + '.trace'
+    treeName = os.path.join(TREE_DIR, source[:-3]) + '.tree'
+    if options.stats or options.stats_json or options.profile:
+        return compile_stats(path, traceName, treeName, options)
+    cache = ParseCache(CACHE_DIR)
+    entry = cache.get(data)
+    if entry is None:
+        traceFile = open(traceName, 'w')
+        try:
+            entry = parse_source(data, traceFile=traceFile, recover=True)
+            cache.put(data, entry)
+        except Exception as exc:
+            print(exc)
+            return None
+        finally:
+            traceFile.close()
+    else:
+        # Unchanged source: outputs are only rewritten if they differ from the cached result.
+        write_if_changed(traceName, format_trace(entry.tokens))
+    tree = io.StringIO()
+    TreePrinter.write_tree(entry.root, tree)
+    write_if_changed(treeName, tree.getvalue())
+    # TreePrinter.show_tree(entry.root)
+    if options.run:
+        return run(entry.root, data, options)
+    print(f"""Number of created nodes: {entry.nodeCount}.""")
     return None
 
 if __name__ == "__main__":
     start()
-
-
-
-
-
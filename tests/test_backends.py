@@ -0,0 +1,51 @@
+import unittest
+
+from compiler.cache import parse_source
+from compiler.interpreter import compile_program
+from compiler.bytecode import compile_bytecode
+from compiler.vm import VM
+from compiler.translate import compile_python
+from compiler.optimize import PassManager
+
+BACKENDS = {
+    'closures': lambda root: compile_program(root).run,
+    'vm': lambda root: VM(compile_bytecode(root)).run,
+    'python': lambda root: compile_python(root).run
+}
+
+# Programs and what they print; every backend at every optimization level
+# must print the same.
+PROGRAMS = {
+    'block locals': (
+        'void main(void){ int i; i = 0; { int a; a = 5; } { int b; output(b); }\n'
+        'while (i < 3) { int c; output(c); c = 7; i = i + 1; } }',
+        [0, 0, 7, 7]
+    ),
+    'index before value': (
+        'int x[3]; int g; int f(void){ g = 2; return 0; }\n'
+        'void main(void){ int a; a = 4; x[a = 1] = a + 1; output(x[1]);\n'
+        'x[f()] = g; output(x[0]); x[a] = a = 2; output(x[1]); }',
+        [2, 2, 2]
+    ),
+}
+
+
+def run(source, backend, level):
+    root = PassManager(level).run(parse_source(source.encode('utf-8')).root)
+    output = []
+    BACKENDS[backend](root)([], output.append)
+    return output
+
+
+class TestBackends(unittest.TestCase):
+
+    def test_programs(self):
+        for name, (source, expected) in PROGRAMS.items():
+            for backend in BACKENDS:
+                for level in (0, 1, 2):
+                    with self.subTest(program=name, backend=backend, level=level):
+                        self.assertEqual(run(source, backend, level), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
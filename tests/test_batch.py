@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from compiler.batch import collect_sources, compile_batch
+
+CM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'cms')
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_same_name_in_different_directories(self):
+        sources = os.path.join(self.directory, 'src')
+        for folder, example in (('a', 'factorial.cm'), ('b', 'parity.cm')):
+            os.makedirs(os.path.join(sources, folder))
+            shutil.copy(os.path.join(CM_DIR, example), os.path.join(sources, folder, 'x.cm'))
+        out = os.path.join(self.directory, 'out')
+        summary = compile_batch(collect_sources([sources]), workers=1, outDir=out)
+        self.assertEqual(summary['failed'], 0)
+        trees = []
+        for folder in ('a', 'b'):
+            with open(os.path.join(out, folder, 'x.tree')) as file:
+                trees.append(file.read())
+            self.assertTrue(os.path.exists(os.path.join(out, folder, 'x.trace')))
+        self.assertNotEqual(trees[0], trees[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import random
+import unittest
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser, ParseErrors
+from compiler.incremental import IncrementalParse
+from benchmarks.workload import generate
+
+PROGRAMS = 15
+EDITS = 20
+
+# Replacements for the random edits, valid and not.
+PIECES = ('', ' ', '\n', 'int', 'void', 'x', 'input', 'output', '7', '(', ')', '{', '}', ';', '=', '+', '@', '!',
+          '/*', '*/', 'int y;\n', 'int g(void) { return 1; }\n', 'output(x);', '{ int z; z = 1; }')
+
+
+def full_parse(text):
+    parser = Parser(Scanner(io.StringIO(text), verbose=False), recover=True)
+    return parser.parse(), parser.nodeCount, [str(diagnostic) for diagnostic in parser.diagnostics]
+
+
+def shape(root):
+    # Every node's fields but its ID, which reused nodes keep, in pre-order.
+    result = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            result.append(None)
+            continue
+        result.append((node.kind, node.attribute, node.name, node.lineno, node.size, len(node.children)))
+        stack.append(node.sibling)
+        stack.extend(reversed(node.children))
+    return result
+
+
+class TestIncrementalParse(unittest.TestCase):
+
+    def assertSameAsFull(self, parse, message=''):
+        root, nodeCount, diagnostics = full_parse(parse.text)
+        self.assertEqual([str(diagnostic) for diagnostic in parse.diagnostics], diagnostics, message)
+        self.assertEqual(shape(parse.root), shape(root), message)
+        self.assertEqual(parse.nodeCount, nodeCount, message)
+
+    def test_error_before_first_declaration(self):
+        parse = IncrementalParse('@ int b;')
+        self.assertSameAsFull(parse)
+        self.assertEqual(len(parse.diagnostics), 1)
+        with self.assertRaises(ParseErrors):
+            parse.check()
+        parse.edit(0, 0, 'int a; ')
+        self.assertSameAsFull(parse)
+        parse.edit(0, 7, '')
+        self.assertSameAsFull(parse)
+
+    def test_random_edits(self):
+        rng = random.Random(0)
+        for seed in range(PROGRAMS):
+            parse = IncrementalParse(generate(seed=seed, functions=4, statements=4, depth=2, globals_=4, expression=2))
+            self.assertSameAsFull(parse)
+            for edit in range(EDITS):
+                offset = rng.randrange(len(parse.text) + 1)
+                length = min(rng.randrange(4), len(parse.text) - offset)
+                replacement = rng.choice(PIECES)
+                parse.edit(offset, length, replacement)
+                with self.subTest(seed=seed, edit=edit):
+                    self.assertSameAsFull(parse, parse.text)
+
+    def test_declarations(self):
+        text = 'int a;\nint f(void) { return a; }\nvoid main(void) { output(f()); }\n'
+        parse = IncrementalParse(text)
+        ranges = [(start, end, node.name) for start, end, node in parse.declarations()]
+        self.assertEqual([name for _, _, name in ranges], ['a', 'f', 'main'])
+        self.assertEqual(''.join(text[start:end] for start, end, _ in ranges), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import io
+import unittest
+
+from compiler.scanner import Scanner
+from compiler.parser import IterativeParser
+from compiler.globals import NodeKind
+from compiler.optimize import PassManager
+
+DEPTH = 5000
+
+
+def parse(source):
+    return IterativeParser(Scanner(io.StringIO(source), verbose=False)).parse()
+
+
+class TestDeepTrees(unittest.TestCase):
+
+    # The iterative parser accepts nesting deeper than the recursion limit,
+    # and the passes must not recurse on it either.
+
+    def test_nested_blocks(self):
+        source = 'void main(void){ int x; x = 1; ' + 'if (x) { ' * DEPTH + 'output(1 - 1 + x); return; ' + '} ' * DEPTH + '}'
+        root = PassManager(2).run(parse(source))
+        self.assertEqual(root.kind, NodeKind.FUN_DECLARATION)
+
+    def test_nested_expression(self):
+        source = 'void main(void){ int x; x = ' + '(' * DEPTH + 'x + 0' + ')' * DEPTH + ' * 0; output(x); }'
+        root = PassManager(2).run(parse(source))
+        assignment = root.children[-1].children[-1]
+        self.assertEqual(assignment.children[0].kind, NodeKind.NUM)
+
+
+if __name__ == '__main__':
+    unittest.main()
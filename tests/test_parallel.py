@@ -0,0 +1,49 @@
+import unittest
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+
+from compiler.cache import parse_source
+from compiler.parallel import MIN_PARALLEL_CHARS, parse_parallel
+from compiler.serialize import dumps_tree
+
+FUNCTION = 'int f{name}(int a) {{ int b; b = a * 2; if (b > 3) {{ output(b); }} return b; }}\n'
+
+
+def program(head=''):
+    names = []
+    text = head
+    while len(text) < MIN_PARALLEL_CHARS:
+        name = ''.join(chr(ord('a') + int(digit)) for digit in str(len(names)))
+        names.append(name)
+        text += FUNCTION.format(name=name)
+    return (text + 'void main(void) { output(fa(1)); }\n').encode('utf-8')
+
+
+class BrokenPool():
+
+    def map(self, function, jobs):
+        raise BrokenExecutor('A worker died.')
+
+
+class TestParallelParse(unittest.TestCase):
+
+    def assertSerial(self, source, executor):
+        entry = parse_source(source)
+        root, nodeCount = parse_parallel(source, workers=2, executor=executor)
+        self.assertEqual(nodeCount, entry.nodeCount)
+        self.assertEqual(dumps_tree(root), dumps_tree(entry.root))
+
+    def test_chunks(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertSerial(program(), executor)
+
+    def test_node_without_kind(self):
+        # The parser accepts "int x gd;", leaving "int x" without a kind.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertSerial(program('int x gd;\n'), executor)
+
+    def test_broken_pool(self):
+        self.assertSerial(program(), BrokenPool())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import io
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from compiler import parallel_scan
+from compiler.scanner import Scanner
+
+TEXTS = {
+    'comments': 'int a; /* one two\nthree */ b = a;\n/* x */ /* y\n z */ c /* */ d;\n',
+    'delimiters in comments': 'a /* b /* c */ d */ e; /*/ f */ g /**/ h\n/* * / */ i',
+    'unterminated comment': 'int a;\nb = a + 1; /* never\n closed and long enough to cut \n more',
+    'lone bang': 'a ! b !\n= c != d ! \t e !',
+    'bang at end': 'x = y !',
+    'errors': '@ int $ a; 1b ! /* @ */ c',
+}
+
+
+def serial(text, engine):
+    return list(Scanner(io.StringIO(text), verbose=False, engine=engine).scan_all())
+
+
+class TestParallelScan(unittest.TestCase):
+
+    def test_against_serial(self):
+        # With the size limit lowered, small texts are cut into many chunks,
+        # which start inside comments or right after a lone '!'.
+        with mock.patch.object(parallel_scan, 'MIN_PARALLEL_CHARS', 0), ThreadPoolExecutor(4) as executor:
+            for name, text in TEXTS.items():
+                text = text * 3
+                for engine in ('fsm', 'regex'):
+                    expected = serial(text, engine)
+                    for chunks in (1, 2, 5, 16, len(text)):
+                        with self.subTest(text=name, engine=engine, chunks=chunks):
+                            buffer = parallel_scan.scan_parallel(text, executor=executor, engine=engine, chunks=chunks)
+                            self.assertEqual(list(buffer), expected)
+
+    def test_chunk_starts_in_comment(self):
+        # make_jobs cuts at whitespace inside a comment: the first chunk ends
+        # inside it, so the chunks after it have to be scanned again.
+        text = 'a /* b c d e f g h */ i'
+        jobs = parallel_scan.make_jobs(text, 8, 'regex')
+        self.assertGreater(len(jobs), 2)
+        self.assertTrue(parallel_scan.scan_chunk(jobs[0])[1][False])
+        with mock.patch.object(parallel_scan, 'MIN_PARALLEL_CHARS', 0), ThreadPoolExecutor(2) as executor:
+            for engine in ('fsm', 'regex'):
+                with self.subTest(engine=engine):
+                    buffer = parallel_scan.scan_parallel(text, executor=executor, engine=engine, chunks=8)
+                    self.assertEqual(list(buffer), serial(text, engine))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import random
+import unittest
+
+from compiler.scanner import Scanner
+from compiler.parser import Parser, TokenError
+from compiler.ll1 import TableParser
+from benchmarks.workload import generate
+
+# Generated programs, and variants of each with a word deleted, replaced or
+# inserted (mostly invalid), must give the same tree (node IDs, kinds,
+# attributes, names, lines and sizes) or the same error with both engines.
+SEEDS = 20
+VARIANTS = 10
+
+# Words inserted or substituted into the variants.
+WORDS = ('int', 'void', 'if', 'else', 'while', 'return', '(', ')', '[', ']', '{', '}', ';', ',', '=', '+', '-', '*', '/', '<', '==', '!=', 'x', 'input', 'output', '7', '@')
+
+
+def fields(node):
+    return node.number, node.kind, node.attribute, node.name, node.lineno, node.size, len(node.children)
+
+
+def tree_fields(root):
+    # Every node's fields, in pre-order, with None for empty children.
+    result = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            result.append(None)
+            continue
+        result.append(fields(node))
+        stack.append(node.sibling)
+        stack.extend(reversed(node.children))
+    return result
+
+
+def outcome(engine, tokens):
+    # (tree fields, node count) or the error message; None if the nesting
+    # is too deep for the recursive descent.
+    parser = engine(tokens)
+    try:
+        return tree_fields(parser.parse()), parser.nodeCount
+    except (SyntaxError, TokenError) as exc:
+        return str(exc)
+    except RecursionError:
+        return None
+
+
+def variants(seed, count, rng):
+    text = generate(seed=seed, functions=4, statements=6, depth=3, globals_=5, expression=3)
+    yield text
+    words = text.split(' ')
+    for _ in range(count):
+        changed = list(words)
+        index = rng.randrange(len(changed))
+        edit = rng.randrange(3)
+        if edit == 0:
+            del changed[index]
+        elif edit == 1:
+            changed[index] = rng.choice(WORDS)
+        else:
+            changed.insert(index, rng.choice(WORDS))
+        yield ' '.join(changed)
+
+
+class TestTableParser(unittest.TestCase):
+
+    def test_same_as_parser(self):
+        rng = random.Random(0)
+        for seed in range(SEEDS):
+            for variant, text in enumerate(variants(seed, VARIANTS, rng)):
+                tokens = list(Scanner(io.StringIO(text), verbose=False))
+                expected = outcome(Parser, tokens)
+                if expected is None:
+                    continue
+                with self.subTest(seed=seed, variant=variant):
+                    self.assertEqual(outcome(TableParser, tokens), expected, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
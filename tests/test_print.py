@@ -0,0 +1,38 @@
+import io
+import unittest
+
+from compiler.cache import parse_source
+from compiler.print import TreePrinter
+
+
+def printed(root, chunkSize=None):
+    tree = io.StringIO()
+    TreePrinter.write_tree(root, tree, chunkSize)
+    return tree.getvalue()
+
+
+class TestTreePrinter(unittest.TestCase):
+
+    def test_empty_tree(self):
+        self.assertEqual(printed(None), '')
+        self.assertEqual(list(TreePrinter.iter_lines(None)), [])
+
+    def test_empty_statements(self):
+        # An empty statement is a None child and prints nothing.
+        root = parse_source(b'void main(void){ int x; x = 1; if (x) ; else ; while (x) ; }').root
+        lines = printed(root).splitlines()
+        self.assertEqual(len(lines), 11)
+        self.assertIn('SELECTION_STMT', lines[7])
+        self.assertIn('ITERATION_STMT', lines[9])
+
+    def test_chunks(self):
+        root = parse_source(b'int a; int b[3]; void main(void){ a = b[1] + 2 * a; output(a); }').root
+        text = printed(root)
+        self.assertEqual(printed(root, chunkSize=1), text)
+        binary = io.BytesIO()
+        TreePrinter.write_tree(root, binary)
+        self.assertEqual(binary.getvalue().decode('utf-8'), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
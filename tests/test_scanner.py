@@ -0,0 +1,39 @@
+import glob
+import io
+import os
+import unittest
+
+from compiler.globals import TokenType
+from compiler.scanner import Scanner
+
+CM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'cms')
+
+
+def scan(text, engine, blockSize=None):
+    return list(Scanner(io.StringIO(text), verbose=False, engine=engine, blockSize=blockSize))
+
+
+class TestRegexEngine(unittest.TestCase):
+
+    def test_examples(self):
+        # The regex engine must give the state machine's tokens, lexemes,
+        # lines and columns on every example, erroneous ones included.
+        paths = sorted(glob.glob(os.path.join(CM_DIR, '*.cm')))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(path, 'r') as file:
+                text = file.read()
+            with self.subTest(path=os.path.basename(path)):
+                expected = scan(text, 'fsm')
+                self.assertEqual(scan(text, 'regex'), expected)
+                self.assertEqual(scan(text, 'regex', blockSize=7), expected)
+                self.assertEqual(expected[-1].type, TokenType.ENDOFFILE)
+
+    def test_edge_cases(self):
+        for text in ('', 'a!b', 'x !', '/* open', 'a /* c */ b', '1a2', 'x=\n=y', '<=>=!=', '@#$'):
+            with self.subTest(text=text):
+                self.assertEqual(scan(text, 'regex'), scan(text, 'fsm'))
+
+
+if __name__ == '__main__':
+    unittest.main()
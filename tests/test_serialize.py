@@ -0,0 +1,40 @@
+import glob
+import io
+import os
+import unittest
+
+from compiler.cache import parse_source
+from compiler.print import TreePrinter
+from compiler.serialize import dumps_tree, load_tree
+
+CM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'cms')
+
+
+def printed(root):
+    tree = io.StringIO()
+    TreePrinter.write_tree(root, tree)
+    return tree.getvalue()
+
+
+class TestBinaryTree(unittest.TestCase):
+
+    def assertRoundTrip(self, source):
+        root = parse_source(source).root
+        self.assertEqual(printed(load_tree(dumps_tree(root))), printed(root))
+
+    def test_examples(self):
+        for path in sorted(glob.glob(os.path.join(CM_DIR, '*.cm'))):
+            if '(error)' in path:
+                continue
+            with open(path, 'rb') as file:
+                source = file.read()
+            with self.subTest(path=os.path.basename(path)):
+                self.assertRoundTrip(source)
+
+    def test_node_without_kind(self):
+        # The parser accepts this declaration, leaving "int x" without a kind.
+        self.assertRoundTrip(b'int x gd;\nvoid main(void){}\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from compiler import server
+from compiler.server import CompileServer
+
+SOURCE = 'void main(void) { output(1); }'
+
+
+class TestSharedCompiles(unittest.TestCase):
+
+    # Requests for a source already compiling in the pool wait for that
+    # compile. The pool is a thread pool here, so the test can hold a
+    # compile until both requests have arrived.
+
+    def setUp(self):
+        self.server = CompileServer(workers=1, inlineBytes=0)
+        self.executor = self.server.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+        self.release = threading.Event()
+
+    def compile_request(self, compile):
+        def held(*args):
+            self.release.wait(5)
+            return compile(*args)
+        return mock.patch.object(server, 'compile_request', held)
+
+    async def two_requests(self, cancelOwner=False):
+        self.server.slots = asyncio.Semaphore(1)
+        owner = asyncio.create_task(self.server.compile({'source': SOURCE}))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(self.server.compile({'source': SOURCE}))
+        await asyncio.sleep(0.01)
+        if cancelOwner:
+            owner.cancel()
+        self.release.set()
+        return await asyncio.gather(owner, waiter, return_exceptions=True)
+
+    def test_counted_once(self):
+        with self.compile_request(server.compile_request):
+            owner, waiter = asyncio.run(self.two_requests())
+        self.assertEqual((owner['ok'], owner['cached']), (True, False))
+        self.assertEqual((waiter['ok'], waiter['cached']), (True, True))
+        self.assertEqual(owner['nodes'], waiter['nodes'])
+        self.assertEqual((self.server.misses, self.server.hits), (1, 1))
+
+    def test_failure(self):
+        def fail(*args):
+            raise RuntimeError('worker died')
+        with self.compile_request(fail):
+            owner, waiter = asyncio.run(self.two_requests())
+        self.assertFalse(owner['ok'])
+        self.assertFalse(waiter['ok'])
+        self.assertIn('worker died', waiter['error'])
+        self.assertEqual(self.server.misses, 1)
+
+    def test_cancelled_owner(self):
+        with self.compile_request(server.compile_request):
+            owner, waiter = asyncio.run(self.two_requests(cancelOwner=True))
+        self.assertIsInstance(owner, asyncio.CancelledError)
+        self.assertFalse(waiter['ok'])
+        self.assertIn('cancelled', waiter['error'])
+        self.assertEqual(self.server.pending, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import glob
+import io
+import os
+import pickle
+import unittest
+
+from compiler.scanner import Scanner
+from compiler.tokens import TokenBuffer
+
+CM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples', 'cms')
+TEXTS = ('', 'a!b', 'x !', '/* open', 'int x; x = x + 1;', '@#$ y', 'void main(void) { return; }')
+
+
+def scanner(text, engine, blockSize=None):
+    return Scanner(io.StringIO(text), verbose=False, engine=engine, blockSize=blockSize)
+
+
+def texts():
+    for path in sorted(glob.glob(os.path.join(CM_DIR, '*.cm'))):
+        with open(path, 'r') as file:
+            yield os.path.basename(path), file.read()
+    for text in TEXTS:
+        yield repr(text), text
+
+
+class TestTokenBuffer(unittest.TestCase):
+
+    def test_scan_all(self):
+        # scan_all must give the tokens iterating the scanner gives, on both
+        # engines, whole or read block by block.
+        for name, text in texts():
+            for engine in ('fsm', 'regex'):
+                for blockSize in (None, 7):
+                    with self.subTest(text=name, engine=engine, blockSize=blockSize):
+                        expected = list(scanner(text, engine, blockSize))
+                        buffer = scanner(text, engine, blockSize).scan_all()
+                        self.assertEqual(list(buffer), expected)
+                        self.assertEqual(len(buffer), len(expected))
+                        self.assertEqual([buffer.token(index) for index in range(len(buffer))], expected)
+
+    def test_pickle(self):
+        for name, text in texts():
+            with self.subTest(text=name):
+                buffer = scanner(text, 'regex').scan_all()
+                copy = pickle.loads(pickle.dumps(buffer))
+                self.assertEqual(list(copy), list(buffer))
+                self.assertEqual(copy.lexemes, buffer.lexemes)
+                self.assertEqual(copy.strings, buffer.strings)
+                # Lexemes added after the round trip reuse the old IDs.
+                for lexeme in buffer.strings:
+                    self.assertEqual(copy.string_id(lexeme), buffer.string_id(lexeme))
+                self.assertEqual(copy.string_id('unseen'), len(buffer.strings))
+
+    def test_extend(self):
+        first = scanner('int x; x = y;', 'fsm').scan_all()
+        second = scanner('y = z + x; w', 'regex').scan_all()
+        buffer = pickle.loads(pickle.dumps(first))
+        buffer.extend(second)
+        self.assertEqual(list(buffer), list(first) + list(second))
+        # Each lexeme is kept once, and lexeme IDs index it.
+        self.assertEqual(len(buffer.strings), len(set(buffer.strings)))
+        for index in range(len(buffer)):
+            self.assertEqual(buffer.strings[buffer.lexemes[index]], buffer.lexeme(index))
+            self.assertEqual(buffer.lexemes[index], buffer.string_id(buffer.lexeme(index)))
+        self.assertEqual(list(TokenBuffer.from_tokens(buffer)), list(buffer))
+
+
+if __name__ == '__main__':
+    unittest.main()
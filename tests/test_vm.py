@@ -0,0 +1,34 @@
+import unittest
+
+from compiler.cache import parse_source
+from compiler.bytecode import BytecodeFormatError, compile_bytecode, dumps_bytecode, loads_bytecode
+from compiler.interpreter import ExecutionError
+from compiler.vm import VM
+
+SOURCE = b'int x[3];\nvoid main(void){ int i; i = input();\nx[i] = 1; output(x[i]); }'
+
+
+class TestErrors(unittest.TestCase):
+
+    def setUp(self):
+        self.program = compile_bytecode(parse_source(SOURCE).root)
+
+    def test_index_out_of_bounds(self):
+        for index in (3, -1):
+            with self.subTest(index=index):
+                with self.assertRaises(ExecutionError) as raised:
+                    VM(self.program).run([index], lambda value: None)
+                self.assertIn('Index out of bounds at line 3', raised.exception.message)
+
+    def test_malformed_bytecode(self):
+        # A register operand far past the function's registers, as in a
+        # hand-edited file, is not reported as a C-Minus index error.
+        program = loads_bytecode(dumps_bytecode(self.program))
+        program.code[1] = 1000
+        with self.assertRaises(BytecodeFormatError) as raised:
+            VM(program).run([1], lambda value: None)
+        self.assertIn('Malformed bytecode at instruction 0', raised.exception.message)
+
+
+if __name__ == '__main__':
+    unittest.main()